@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+# Places the benchmark charts are cast for, as (latitude, longitude). They are given as
+# coordinates so no benchmark geocodes, and all lie between the polar circles, where
+# Placidus houses exist
+BENCHMARK_LOCATIONS = (
+    (40.7128, -74.0060),   # New York
+    (51.5074, -0.1278),    # London
+    (48.8566, 2.3522),     # Paris
+    (35.6762, 139.6503),   # Tokyo
+    (-33.8688, 151.2093),  # Sydney
+    (-23.5505, -46.6333),  # Sao Paulo
+    (19.4326, -99.1332),   # Mexico City
+    (30.0444, 31.2357),    # Cairo
+    (28.6139, 77.2090),    # New Delhi
+    (-12.0464, -77.0428),  # Lima
+    (55.7558, 37.6173),    # Moscow
+    (-26.2041, 28.0473),   # Johannesburg
+)
+
+# Local times of the benchmark charts are drawn from this range
+BENCHMARK_START = np.datetime64('1950-01-01T00:00:00')
+BENCHMARK_END = np.datetime64('2050-01-01T00:00:00')
+
+# Inputs of every benchmark at one size. Times and places are drawn from a seeded generator,
+# so a fixture of a given size and seed is the same on every run and machine
+BenchmarkFixture = namedtuple('BenchmarkFixture', [
+    'size', 'local_datetimes', 'local_times', 'latitudes', 'longitudes', 'jds',
+    'ecliptic_longitudes', 'planet_longitudes', 'day_charts', 'records'])
+
+
+def make_fixture(size, seed=0):
+    """
+    Builds the offline inputs of the benchmarks for a number of charts.
+
+    Parameters:
+    - size (int): Number of charts.
+    - seed (int): Seed of the random times and places.
+
+    Returns:
+    - BenchmarkFixture: The inputs:
+        - local_datetimes: datetime64[s] local times.
+        - local_times: The same times as (year, month, day, hour, minute, second) tuples.
+        - latitudes, longitudes: Coordinates from BENCHMARK_LOCATIONS.
+        - jds: The local times read as UT Julian Days, for benchmarks that skip timezones.
+        - ecliptic_longitudes: One random longitude per chart.
+        - planet_longitudes: Seven random longitudes per chart, for the dignity functions.
+        - day_charts: Whether each chart is a day chart.
+        - records: Question records as compute_charts takes them.
+    """
+    rng = np.random.default_rng(seed)
+    span = int((BENCHMARK_END - BENCHMARK_START) / np.timedelta64(1, 's'))
+    local_datetimes = BENCHMARK_START + rng.integers(0, span, size).astype('timedelta64[s]')
+    locations = np.array(BENCHMARK_LOCATIONS)[rng.integers(0, len(BENCHMARK_LOCATIONS), size)]
+    latitudes, longitudes = locations[:, 0].copy(), locations[:, 1].copy()
+
+    local_times = [(moment.year, moment.month, moment.day, moment.hour, moment.minute, moment.second)
+                   for moment in local_datetimes.tolist()]
+    # The Unix epoch is Julian Day 2440587.5
+    jds = local_datetimes.astype(np.int64) / 86400.0 + 2440587.5
+
+    records = [{'id': index, 'latitude': latitude, 'longitude': longitude,
+                'datetime': str(moment)}
+               for index, (latitude, longitude, moment) in enumerate(
+                   zip(latitudes.tolist(), longitudes.tolist(), local_datetimes))]
+
+    return BenchmarkFixture(
+        size=size,
+        local_datetimes=local_datetimes,
+        local_times=local_times,
+        latitudes=latitudes,
+        longitudes=longitudes,
+        jds=jds,
+        ecliptic_longitudes=rng.uniform(0, 360, size),
+        planet_longitudes=rng.uniform(0, 360, (size, 7)),
+        day_charts=rng.integers(0, 2, size).astype(bool),
+        records=records,
+    )
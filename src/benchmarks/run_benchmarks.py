@@ -0,0 +1,307 @@
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timezone
+
+import numpy as np
+import swisseph as swis_eph
+from benchmarks.fixtures import make_fixture
+from utilities.astro_calculations import (
+    _compute_houses, calculate_custom_julian_day, calculate_custom_julian_days,
+    calculate_ecliptic_longitude, calculate_ecliptic_positions, compute_houses)
+from utilities.astro_utils import TRADITIONAL_PLANETS, classify_longitude, classify_longitudes
+from utilities.chart import CHART_BODIES, ChartBatch
+from utilities.chart_pipeline import compute_charts
+from utilities.dignity_utils import (
+    is_planet_in_its_traditional_detriment, is_planet_in_its_traditional_domicile,
+    is_planet_in_its_traditional_exaltation, is_planet_in_its_traditional_fall,
+    is_planet_in_its_triplicity, score_dignities)
+from utilities.ephemeris_backend import get_ephemeris_backend
+
+
+DEFAULT_SIZES = (1, 1000, 100000)
+
+# Number of times each benchmark is timed; the best time is the result. Sizes above
+# SINGLE_RUN_SIZE are timed once, since they take long enough to be stable
+DEFAULT_REPEAT = 5
+SINGLE_RUN_SIZE = 10000
+
+# A benchmark is reported as a regression when it takes this many times longer than in the
+# results it is compared with
+DEFAULT_REGRESSION_THRESHOLD = 1.25
+
+# Benchmarks by name. Each builds, from a fixture, the function that is timed
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark under a name, as a decorator of a function that takes a
+    BenchmarkFixture and returns the function to time.
+
+    Parameters:
+    - name (str): The benchmark's name, '<function>.<scalar or vector>'.
+    """
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+@benchmark('julian_day.scalar')
+def _julian_day_scalar(fixture):
+    def run():
+        for local_time, latitude, longitude in zip(
+                fixture.local_times, fixture.latitudes.tolist(), fixture.longitudes.tolist()):
+            calculate_custom_julian_day(*local_time, latitude, longitude)
+    return run
+
+
+@benchmark('julian_day.vector')
+def _julian_day_vector(fixture):
+    return lambda: calculate_custom_julian_days(
+        fixture.local_datetimes, fixture.latitudes, fixture.longitudes)
+
+
+@benchmark('ecliptic_longitude.scalar')
+def _ecliptic_longitude_scalar(fixture):
+    def run():
+        for index, (jd, latitude, longitude) in enumerate(zip(
+                fixture.jds.tolist(), fixture.latitudes.tolist(), fixture.longitudes.tolist())):
+            calculate_ecliptic_longitude(
+                TRADITIONAL_PLANETS[index % len(TRADITIONAL_PLANETS)], jd, latitude, longitude)
+    return run
+
+
+@benchmark('ecliptic_positions.vector')
+def _ecliptic_positions_vector(fixture):
+    # All nine chart bodies, at one location
+    latitude, longitude = fixture.latitudes[0], fixture.longitudes[0]
+    return lambda: calculate_ecliptic_positions(fixture.jds, CHART_BODIES, latitude, longitude)
+
+
+@benchmark('houses.scalar')
+def _houses_scalar(fixture):
+    def run():
+        # Every chart is calculated, not taken from the previous run's cache
+        _compute_houses.cache_clear()
+        for jd, latitude, longitude in zip(
+                fixture.jds.tolist(), fixture.latitudes.tolist(), fixture.longitudes.tolist()):
+            compute_houses(jd, latitude, longitude, 'P')
+    return run
+
+
+@benchmark('sign_bound_decan.scalar')
+def _sign_bound_decan_scalar(fixture):
+    def run():
+        for ecliptic_longitude in fixture.ecliptic_longitudes.tolist():
+            classify_longitude(ecliptic_longitude)
+    return run
+
+
+@benchmark('sign_bound_decan.vector')
+def _sign_bound_decan_vector(fixture):
+    return lambda: classify_longitudes(fixture.ecliptic_longitudes)
+
+
+@benchmark('dignities.scalar')
+def _dignities_scalar(fixture):
+    # The sign of each of the seven planets of each chart
+    signs = [[classify_longitude(longitude)[0] for longitude in longitudes]
+             for longitudes in fixture.planet_longitudes.tolist()]
+
+    def run():
+        for chart_signs, day_chart in zip(signs, fixture.day_charts.tolist()):
+            for planet, sign in zip(TRADITIONAL_PLANETS, chart_signs):
+                is_planet_in_its_traditional_domicile(planet, sign)
+                is_planet_in_its_traditional_exaltation(planet, sign)
+                is_planet_in_its_triplicity(planet, sign, day_chart)
+                is_planet_in_its_traditional_detriment(planet, sign)
+                is_planet_in_its_traditional_fall(planet, sign)
+    return run
+
+
+@benchmark('dignities.vector')
+def _dignities_vector(fixture):
+    return lambda: score_dignities(fixture.planet_longitudes, fixture.day_charts)
+
+
+@benchmark('chart.batch')
+def _chart_batch(fixture):
+    def run():
+        _compute_houses.cache_clear()
+        ChartBatch.calculate(fixture.jds, fixture.latitudes, fixture.longitudes, 'P')
+    return run
+
+
+@benchmark('chart.pipeline')
+def _chart_pipeline(fixture):
+    def run():
+        _compute_houses.cache_clear()
+        compute_charts(fixture.records, offline=True)
+    return run
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, names=None, repeat=None, seed=0, report=None):
+    """
+    Times benchmarks at several sizes.
+
+    Parameters:
+    - sizes (iterable): Numbers of charts to time each benchmark with.
+    - names (list): Shell-style patterns of the benchmarks to run (e.g., 'chart.*'). Defaults
+                    to all of them.
+    - repeat (int): Number of times each benchmark is timed. Defaults to DEFAULT_REPEAT, or 1
+                    above SINGLE_RUN_SIZE.
+    - seed (int): Seed of the fixtures.
+    - report (callable): Optional function called with each result as soon as it is timed.
+
+    Returns:
+    - list: One dict per benchmark and size, with its name, size, repeat count, best and
+            median times in seconds, and best time per chart in microseconds.
+    """
+    selected = [name for name in BENCHMARKS
+                if names is None or any(fnmatch.fnmatch(name, pattern) for pattern in names)]
+
+    # Load the ephemeris, timezone data and lookup tables before anything is timed
+    warm_up = make_fixture(1, seed)
+    for name in selected:
+        BENCHMARKS[name](warm_up)()
+
+    results = []
+    for size in sizes:
+        fixture = make_fixture(size, seed)
+        runs = repeat or (DEFAULT_REPEAT if size <= SINGLE_RUN_SIZE else 1)
+        for name in selected:
+            times = timeit.Timer(BENCHMARKS[name](fixture)).repeat(runs, number=1)
+            result = {
+                'name': name,
+                'size': size,
+                'repeat': runs,
+                'best_s': min(times),
+                'median_s': statistics.median(times),
+                'per_chart_us': min(times) / size * 1e6,
+            }
+            results.append(result)
+            if report is not None:
+                report(result)
+    return results
+
+
+def compare_results(results, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compares benchmark results with earlier ones.
+
+    Parameters:
+    - results (list): Results from run_benchmarks.
+    - baseline (list): Earlier results, e.g. the 'results' of a saved JSON file.
+    - threshold (float): Ratio of the new to the old best time above which a benchmark counts
+                         as a regression.
+
+    Returns:
+    - list: (name, size, ratio) for each benchmark timed in both, with a ratio above 1 when
+            it got slower, and a list of those that are regressions.
+    """
+    earlier = {(result['name'], result['size']): result['best_s'] for result in baseline}
+    ratios = [(result['name'], result['size'], result['best_s'] / earlier[result['name'], result['size']])
+              for result in results if (result['name'], result['size']) in earlier]
+    return ratios, [ratio for ratio in ratios if ratio[2] > threshold]
+
+
+def benchmark_metadata(seed):
+    """
+    Describes the machine and software benchmarks are run on, to store with their results.
+
+    Parameters:
+    - seed (int): Seed of the fixtures.
+
+    Returns:
+    - dict: The time, Python, NumPy and Swiss Ephemeris versions, platform, CPU count,
+            ephemeris backend, fixture seed, and git commit when run from a checkout.
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'swisseph': swis_eph.version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ephemeris_backend': get_ephemeris_backend().name,
+        'seed': seed,
+        'commit': commit,
+    }
+
+
+def main(argv=None):
+    """
+    Entry point of the benchmark command line, run from src/, e.g.:
+
+        python -m benchmarks.run_benchmarks -o benchmarks.json
+        python -m benchmarks.run_benchmarks --sizes 1 1000 --compare benchmarks.json
+
+    Every input is generated offline by benchmarks.fixtures, so no benchmark touches the
+    network. With --compare, benchmarks that got slower than an earlier run's results by more
+    than the threshold are reported and the exit status is 1.
+
+    Parameters:
+    - argv (list): Command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+    - int: The exit status: 1 if a comparison found regressions, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run_benchmarks',
+        description="Times the chart calculations with offline fixtures and saves the results as JSON.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="Numbers of charts to time each benchmark with.")
+    parser.add_argument('--only', nargs='+', metavar='PATTERN',
+                        help=f"Benchmarks to run, as shell-style patterns. Available: "
+                             f"{', '.join(BENCHMARKS)}.")
+    parser.add_argument('--repeat', type=int,
+                        help=f"Times each benchmark is timed. Defaults to {DEFAULT_REPEAT}, "
+                             f"or 1 above {SINGLE_RUN_SIZE} charts.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the fixtures.")
+    parser.add_argument('-o', '--output', help="File to write the results to as JSON.")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="JSON results of an earlier run to check for regressions.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Slowdown ratio reported as a regression.")
+    args = parser.parse_args(argv)
+
+    def report(result):
+        print(f"{result['name']:<28} {result['size']:>8}  {result['best_s']:10.4f} s  "
+              f"{result['per_chart_us']:12.2f} us/chart", file=sys.stderr)
+
+    metadata = benchmark_metadata(args.seed)
+    results = run_benchmarks(args.sizes, args.only, args.repeat, args.seed, report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'metadata': metadata, 'results': results}, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        ratios, regressions = compare_results(results, baseline, args.threshold)
+        for name, size, ratio in ratios:
+            marker = '  REGRESSION' if ratio > args.threshold else ''
+            print(f"{name:<28} {size:>8}  {ratio:6.2f}x{marker}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
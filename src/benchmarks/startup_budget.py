@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+# Cold start budget, in milliseconds, of importing the chart code and calculating one chart
+# from raw coordinates and a Julian Day, measured in a fresh interpreter
+STARTUP_BUDGET_MS = 250
+
+# Dependencies a chart from raw coordinates must not import: they are only needed for
+# geocoding, local time conversion, the Skyfield backend or the HTTP service
+LAZY_DEPENDENCIES = ('aiohttp', 'flask', 'geopy', 'jplephem', 'pytz', 'skyfield', 'timezonefinder')
+
+# Number of fresh interpreters the startup is measured in; the fastest counts
+DEFAULT_RUNS = 5
+
+# Number of the slowest imports listed in the report
+REPORT_IMPORTS = 10
+
+# Run in the fresh interpreter: the chart a short-lived CLI or serverless call would calculate
+_STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+from utilities.chart import Chart
+imported = time.perf_counter()
+Chart.calculate(2460000.5, 40.7128, -74.006, 'P')
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'chart_ms': (done - imported) * 1000,
+                  'modules': sorted({name.split('.')[0] for name in sys.modules})}))
+'''
+
+
+def measure_startup(runs=DEFAULT_RUNS):
+    """
+    Measures the cold start of a chart calculated from raw coordinates, with no geocoding or
+    timezone lookup, in fresh interpreters run with -X importtime.
+
+    Parameters:
+    - runs (int): Number of fresh interpreters to measure; the fastest counts.
+
+    Returns:
+    - dict: The import and chart times in milliseconds and their total, the slowest
+            top-level and second-level imports as (module, milliseconds) pairs, and the
+            LAZY_DEPENDENCIES that were imported.
+    """
+    source_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _STARTUP_SCRIPT],
+            cwd=source_dir, capture_output=True, text=True, check=True)
+        measurement = json.loads(process.stdout)
+        measurement['total_ms'] = measurement['import_ms'] + measurement['chart_ms']
+        if best is None or measurement['total_ms'] < best['total_ms']:
+            best = measurement
+            import_lines = process.stderr
+
+    # Lines read 'import time: <self us> | <cumulative us> | <module>', with nested imports
+    # indented two spaces per level under the module that imported them. The top-level
+    # imports and the ones they make directly are listed
+    imports = []
+    for line in import_lines.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith('    '):
+            imports.append((fields[2].strip(), int(fields[1]) / 1000))
+    imports.sort(key=lambda item: item[1], reverse=True)
+
+    return {
+        'import_ms': round(best['import_ms'], 3),
+        'chart_ms': round(best['chart_ms'], 3),
+        'total_ms': round(best['total_ms'], 3),
+        'slowest_imports': [(module, round(ms, 3)) for module, ms in imports[:REPORT_IMPORTS]],
+        'lazy_dependencies_imported': sorted(set(best['modules']) & set(LAZY_DEPENDENCIES)),
+    }
+
+
+def main(argv=None):
+    """
+    Entry point of the startup budget check, run from src/, e.g.:
+
+        python -m benchmarks.startup_budget --budget-ms 250 -o startup.json
+
+    Parameters:
+    - argv (list): Command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+    - int: The exit status: 1 if the startup is over budget or imported a lazy dependency.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.startup_budget',
+        description="Checks the cold start of a chart from raw coordinates against a budget.")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help="Most milliseconds the imports and the first chart may take.")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help="Fresh interpreters to measure; the fastest counts.")
+    parser.add_argument('-o', '--output', help="File to write the measurement to as JSON.")
+    args = parser.parse_args(argv)
+
+    measurement = measure_startup(args.runs)
+    measurement['budget_ms'] = args.budget_ms
+
+    print(f"imports {measurement['import_ms']:.1f} ms + first chart {measurement['chart_ms']:.1f} ms "
+          f"= {measurement['total_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)", file=sys.stderr)
+    for module, ms in measurement['slowest_imports']:
+        print(f"  {module:<32} {ms:8.1f} ms", file=sys.stderr)
+    if measurement['lazy_dependencies_imported']:
+        print(f"Imported at startup: {', '.join(measurement['lazy_dependencies_imported'])}",
+              file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(measurement, output_file, indent=2)
+
+    over_budget = measurement['total_ms'] > args.budget_ms
+    return 1 if over_budget or measurement['lazy_dependencies_imported'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from utilities.chart import Chart
+from utilities.chart_pipeline import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_HOUSE_SYSTEM, compute_chart, compute_charts)
+from utilities.ephemeris import init_process_ephemeris
+from utilities.ephemeris_backend import configure_ephemeris_backend
+from utilities.geocode_cache import get_default_geocode_cache
+from utilities.instrumentation import configure_instrumentation, stage_metrics
+from utilities.timezone_utils import configure_timezone_lookup, get_timezone_finder
+
+
+# Number of most recent requests per endpoint that latency percentiles are calculated over
+METRICS_WINDOW = 10000
+
+
+class RequestMetrics:
+    """
+    Request counts and latencies per endpoint. Latency percentiles are calculated over the
+    last METRICS_WINDOW requests of each endpoint, so they follow the service's recent behavior.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        """
+        Parameters:
+        - window (int): Number of most recent latencies kept per endpoint.
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._counts = {}
+        self._errors = {}
+
+    def record(self, endpoint, seconds, failed=False):
+        """
+        Records one request.
+
+        Parameters:
+        - endpoint (str): The endpoint's name.
+        - seconds (float): How long the request took.
+        - failed (bool): Whether the request ended with an error status.
+        """
+        with self._lock:
+            if endpoint not in self._latencies:
+                self._latencies[endpoint] = deque(maxlen=self.window)
+                self._counts[endpoint] = 0
+                self._errors[endpoint] = 0
+            self._latencies[endpoint].append(seconds)
+            self._counts[endpoint] += 1
+            self._errors[endpoint] += failed
+
+    def summary(self):
+        """
+        Returns:
+        - dict: For each endpoint, the number of requests and errors, and the p50 and p99
+                latencies in milliseconds.
+        """
+        with self._lock:
+            snapshot = {endpoint: (np.array(latencies), self._counts[endpoint], self._errors[endpoint])
+                        for endpoint, latencies in self._latencies.items()}
+
+        summary = {}
+        for endpoint, (latencies, count, errors) in snapshot.items():
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            summary[endpoint] = {
+                'requests': count,
+                'errors': errors,
+                'p50_ms': round(float(p50), 3),
+                'p99_ms': round(float(p99), 3),
+            }
+        return summary
+
+
+def create_app(ephe_path=None, timezone_in_memory=True, offline=False,
+               house_system=DEFAULT_HOUSE_SYSTEM, chunk_size=DEFAULT_CHUNK_SIZE, chart_cache=None,
+               ephemeris_backend=None, instrument=False):
+    """
+    Creates the chart HTTP service. The ephemeris, the timezone data and the geocoding cache
+    are loaded once here and stay resident, so requests only pay for their own calculations.
+
+    Endpoints:
+    - POST /chart: One question record as a JSON object (as described in compute_charts);
+                   returns the chart as JSON.
+    - POST /charts:batch: Question records as a JSON array, or as JSON lines with the
+                          application/x-ndjson content type; streams the charts back as JSON
+                          lines in the same order.
+    - GET /metrics: Request counts and p50/p99 latencies per endpoint, the chart cache's
+                    hit and miss counts, and with instrument, the calculation stage timings.
+    - GET /metrics/prometheus: The calculation stage timings in the Prometheus text format.
+    - GET /health: Returns {"status": "ok"} once the service is ready.
+
+    Parameters:
+    - ephe_path (str): Directory of the Swiss Ephemeris data files.
+    - timezone_in_memory (bool): If True, the timezone data is loaded into memory up front.
+    - offline (bool): If True, cities are only looked up in the geocoding cache.
+    - house_system (str): House system name for records that do not give one.
+    - chunk_size (int): Number of records of a batch request calculated at a time.
+    - chart_cache (ChartCache): Optional cache of calculated charts, so recasting a chart
+                                does not calculate it again.
+    - ephemeris_backend (str): Name of the EphemerisBackend positions are calculated with.
+                               Defaults to the PTOLEMY_EPHEMERIS_BACKEND environment variable,
+                               or 'swisseph'.
+    - instrument (bool): If True, the time spent in geocoding, timezone lookups, the
+                         ephemeris, houses, dignities and formatting is recorded per stage.
+
+    Returns:
+    - flask.Flask: The application.
+    """
+    app = Flask(__name__)
+    metrics = RequestMetrics()
+    app.extensions['chart_metrics'] = metrics
+
+    # Load everything a chart needs before the first request
+    init_process_ephemeris(ephe_path)
+    configure_ephemeris_backend(ephemeris_backend)
+    if instrument:
+        configure_instrumentation(True)
+    configure_timezone_lookup(in_memory=timezone_in_memory)
+    get_timezone_finder()
+    get_default_geocode_cache()
+    Chart.calculate(2451545.0, 0.0, 0.0, 'P')
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        # Streamed responses are recorded when their last line has been sent
+        if not response.is_streamed and request.endpoint is not None:
+            metrics.record(request.endpoint, time.perf_counter() - g.request_start,
+                           response.status_code >= 400)
+        return response
+
+    @app.post('/chart')
+    def chart():
+        record = request.get_json(silent=True)
+        if not isinstance(record, dict):
+            return jsonify(error="Expected a JSON object question record."), 400
+
+        result = compute_chart(record, house_system, offline, chart_cache)
+        return jsonify(result), 400 if 'error' in result else 200
+
+    @app.post('/charts:batch')
+    def charts_batch():
+        if request.mimetype == 'application/x-ndjson':
+            records = _read_json_lines(request.stream)
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                return jsonify(error="Expected a JSON array of question records."), 400
+
+        endpoint = request.endpoint
+        request_start = g.request_start
+
+        def generate():
+            try:
+                chunk = []
+                for record in records:
+                    if isinstance(record, dict):
+                        chunk.append(record)
+                        if len(chunk) < chunk_size:
+                            continue
+                    # Charts come out in the order of the records, so a record that is not a
+                    # JSON object is reported after the charts before it
+                    for result in compute_charts(chunk, house_system, offline, chart_cache):
+                        yield json.dumps(result) + '\n'
+                    chunk = []
+                    if not isinstance(record, dict):
+                        yield json.dumps(
+                            {'id': None, 'error': f"Invalid question record: {record}"}) + '\n'
+                for result in compute_charts(chunk, house_system, offline, chart_cache):
+                    yield json.dumps(result) + '\n'
+            finally:
+                metrics.record(endpoint, time.perf_counter() - request_start)
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    @app.get('/metrics')
+    def request_metrics():
+        summary = metrics.summary()
+        if chart_cache is not None:
+            summary['chart_cache'] = dict(chart_cache.statistics)
+        if instrument:
+            summary['stages'] = stage_metrics.summary()
+        return jsonify(summary)
+
+    @app.get('/metrics/prometheus')
+    def prometheus_metrics():
+        return Response(stage_metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @app.get('/health')
+    def health():
+        return jsonify(status='ok')
+
+    return app
+
+
+def _read_json_lines(stream):
+    # Yields the question records of a JSON lines request body. A line that is not valid JSON
+    # is yielded as its error message, so the rest of the body is still calculated
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                yield str(error)
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from utilities.chart_pipeline import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_HOUSE_SYSTEM, merge_chunk_profiles, stream_chart_json)
+from utilities.ephemeris_backend import EPHEMERIS_BACKENDS
+
+
+# Number of functions listed in the --profile report of the batch command
+PROFILE_REPORT_LINES = 30
+
+
+def main(argv=None):
+    """
+    Entry point of the non-interactive Ptolemy command line, e.g.:
+
+        python ptolemy.py batch questions.jsonl -o charts.jsonl --offline
+
+    Parameters:
+    - argv (list): Command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+    - int: The exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog='ptolemy', description="Ptolemy: an horary astrology software.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser(
+        'batch', help="Calculate the charts of a file of horary questions.",
+        description="Reads question records as JSONL or CSV, each with 'city' and 'country' or "
+                    "'latitude' and 'longitude', and the local 'datetime' (or 'year', 'month', "
+                    "'day', 'hour', 'minute' and 'second'), and writes one JSON chart per line.")
+    batch_parser.add_argument('input', help="JSONL or CSV file of question records, or - for stdin.")
+    batch_parser.add_argument('-o', '--output', default='-',
+                              help="JSONL file to write the charts to. Defaults to stdout.")
+    batch_parser.add_argument('--format', choices=('jsonl', 'csv'),
+                              help="Input format. Defaults to the input file's extension, or jsonl.")
+    batch_parser.add_argument('--workers', type=int,
+                              help="Number of worker processes (0 to calculate in this process). "
+                                   "Defaults to the number of CPUs.")
+    batch_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                              help="Number of records sent to a worker at a time.")
+    batch_parser.add_argument('--max-pending', type=int,
+                              help="Maximum number of chunks in flight. Defaults to four per worker.")
+    batch_parser.add_argument('--unordered', action='store_true',
+                              help="Write charts as soon as they are done instead of in input order.")
+    batch_parser.add_argument('--house-system', default=DEFAULT_HOUSE_SYSTEM,
+                              help="House system for records that do not give one.")
+    batch_parser.add_argument('--offline', action='store_true',
+                              help="Only look up cities in the geocoding cache, never in Nominatim.")
+    batch_parser.add_argument('--ephe-path', help="Directory of the Swiss Ephemeris data files.")
+    batch_parser.add_argument('--ephemeris-backend', choices=sorted(EPHEMERIS_BACKENDS),
+                              help="Where planetary positions come from. Defaults to the "
+                                   "PTOLEMY_EPHEMERIS_BACKEND environment variable, or swisseph.")
+    batch_parser.add_argument('--timezone-in-memory', action='store_true',
+                              help="Load the timezone data into memory in every worker.")
+    batch_parser.add_argument('--profile', metavar='DIR',
+                              help="Profile every chunk with cProfile, write the pstats files to "
+                                   "DIR, and print the slowest functions of the whole batch.")
+    batch_parser.add_argument('--archive', metavar='PATH',
+                              help="Also append the calculated charts to the binary chart archive "
+                                   "at PATH, which is created if it does not exist.")
+    batch_parser.set_defaults(handler=run_batch)
+
+    serve_parser = subparsers.add_parser(
+        'serve', help="Run the chart HTTP service.",
+        description="Serves POST /chart, POST /charts:batch, GET /metrics and GET /health, "
+                    "with the ephemeris, timezone data and geocoding cache kept in memory.")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="Address to listen on.")
+    serve_parser.add_argument('--port', type=int, default=8000, help="Port to listen on.")
+    serve_parser.add_argument('--house-system', default=DEFAULT_HOUSE_SYSTEM,
+                              help="House system for records that do not give one.")
+    serve_parser.add_argument('--offline', action='store_true',
+                              help="Only look up cities in the geocoding cache, never in Nominatim.")
+    serve_parser.add_argument('--ephe-path', help="Directory of the Swiss Ephemeris data files.")
+    serve_parser.add_argument('--ephemeris-backend', choices=sorted(EPHEMERIS_BACKENDS),
+                              help="Where planetary positions come from. Defaults to the "
+                                   "PTOLEMY_EPHEMERIS_BACKEND environment variable, or swisseph.")
+    serve_parser.add_argument('--timezone-on-demand', action='store_true',
+                              help="Read the timezone data from disk as needed instead of "
+                                   "loading it into memory at startup.")
+    serve_parser.add_argument('--chart-cache', metavar='PATH',
+                              help="SQLite file to cache calculated charts in across restarts.")
+    serve_parser.add_argument('--instrument', action='store_true',
+                              help="Time each calculation stage, for GET /metrics and "
+                                   "GET /metrics/prometheus.")
+    serve_parser.set_defaults(handler=run_serve)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+def run_batch(args):
+    """
+    Runs the 'batch' command: streams the question records through the chart pipeline's
+    process pool and writes the charts as JSON lines.
+
+    Parameters:
+    - args (argparse.Namespace): The parsed 'batch' arguments.
+
+    Returns:
+    - int: The exit status. Records that cannot be calculated are written as errors and do not
+           stop the batch.
+    """
+    input_format = args.format
+    if input_format is None:
+        input_format = 'csv' if os.path.splitext(args.input)[1].lower() == '.csv' else 'jsonl'
+
+    input_file = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+
+    try:
+        records = read_csv_records(input_file) if input_format == 'csv' else read_jsonl_records(input_file)
+        for line in stream_chart_json(
+                records, workers=args.workers, chunk_size=args.chunk_size,
+                ordered=not args.unordered, max_pending=args.max_pending,
+                house_system=args.house_system, offline=args.offline,
+                ephe_path=args.ephe_path, timezone_in_memory=args.timezone_in_memory,
+                ephemeris_backend=args.ephemeris_backend, profile_dir=args.profile,
+                archive_path=args.archive):
+            output_file.write(line)
+            output_file.write('\n')
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    if args.profile:
+        stats = merge_chunk_profiles(args.profile)
+        if stats is not None:
+            stats.dump_stats(os.path.join(args.profile, 'batch.pstats'))
+            stats.stream = sys.stderr
+            stats.sort_stats('cumulative').print_stats(PROFILE_REPORT_LINES)
+
+    return 0
+
+
+def run_serve(args):
+    """
+    Runs the 'serve' command: the chart HTTP service from chart_service.
+
+    Parameters:
+    - args (argparse.Namespace): The parsed 'serve' arguments.
+
+    Returns:
+    - int: The exit status.
+    """
+    # Flask is only needed by this command
+    from chart_service import create_app
+    from utilities.chart_cache import ChartCache
+
+    app = create_app(ephe_path=args.ephe_path, timezone_in_memory=not args.timezone_on_demand,
+                     offline=args.offline, house_system=args.house_system,
+                     chart_cache=ChartCache(args.chart_cache) if args.chart_cache else None,
+                     ephemeris_backend=args.ephemeris_backend, instrument=args.instrument)
+    app.run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+def read_jsonl_records(lines):
+    """
+    Reads question records from JSON lines, skipping blank lines.
+
+    Parameters:
+    - lines (iterable): Lines of text, e.g. an open file.
+
+    Yields:
+    - dict: One question record per line.
+    """
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv_records(lines):
+    """
+    Reads question records from CSV with a header row naming the record fields.
+
+    Parameters:
+    - lines (iterable): Lines of text, e.g. an open file.
+
+    Yields:
+    - dict: One question record per row.
+    """
+    yield from csv.DictReader(lines)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
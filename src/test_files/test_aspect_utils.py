@@ -0,0 +1,18 @@
+import swisseph as swis_eph
+from utilities.aspect_utils import find_aspect_perfection
+from utilities.astro_calculations import calculate_ecliptic_positions
+
+# Dallas, on the path of the total solar eclipse of 2024 April 8
+DALLAS = (32.78, -96.8)
+
+
+def test_new_moon_perfection():
+    # The Moon covered the Sun at Dallas at about 18:42 UT, the topocentric new moon there
+    perfection = find_aspect_perfection('Moon', 'Sun', 'Conjunction',
+                                        swis_eph.julday(2024, 4, 7, 0.0), *DALLAS)
+    assert abs(perfection.jd - swis_eph.julday(2024, 4, 8, 18.7)) < 0.005
+    assert perfection.sign_changes == [('Moon', 'Pisces', 'Aries')]
+    assert perfection.stations == []
+
+    positions = calculate_ecliptic_positions(perfection.jd, ['Moon', 'Sun'], *DALLAS)[0]
+    assert abs(positions[0, 0] - positions[1, 0]) < 1e-4
@@ -0,0 +1,13 @@
+from utilities.astro_utils import ZODIAC_SIGNS, classify_longitude, classify_longitudes
+
+
+def test_classify_longitude_tiny_negative():
+    # -1e-15 % 360 rounds up to exactly 360.0
+    assert classify_longitude(-1e-15) == ('Aries', 0.0, 'Jupiter', 'Mars')
+
+
+def test_classify_longitude_boundaries():
+    for longitude in (0.0, 29.999999, 30.0, 359.999999, 360.0, -30.0, 720.5):
+        sign, sign_degrees, _, _ = classify_longitude(longitude)
+        assert 0 <= sign_degrees < 30
+        assert sign == ZODIAC_SIGNS[classify_longitudes(longitude)[0]]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from utilities.chart import CHART_RECORD_VERSION, Chart, ChartBatch, Planet
+from utilities.chart_archive import ChartArchive, read_chart_archive
+
+
+@pytest.fixture(scope='module')
+def batch():
+    return ChartBatch.calculate(2460000.5 + np.arange(4) * 0.37, 40.7128, -74.006, 'P')
+
+
+def test_chart_bytes_round_trip(batch):
+    chart = batch[1]
+    data = chart.to_bytes()
+    assert int.from_bytes(data[:2], 'little') == CHART_RECORD_VERSION
+
+    copy = Chart.from_bytes(data)
+    assert copy.record.tobytes() == chart.record.tobytes()
+    assert copy.to_dict() == chart.to_dict()
+
+    with pytest.raises(ValueError):
+        Chart.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        Chart.from_bytes((CHART_RECORD_VERSION + 1).to_bytes(2, 'little') + data[2:])
+
+
+def test_archive_append_and_memory_map(tmp_path, batch):
+    path = str(tmp_path / 'charts.ptca')
+    with ChartArchive(path) as archive:
+        assert len(archive) == 0
+        assert archive.append(batch[0]) == 1
+        assert archive.append(batch[1:]) == 3
+        assert len(archive) == 4
+
+        records = archive.records()
+        assert isinstance(records, np.memmap)
+        assert not records.flags.writeable
+        assert records.tobytes() == batch.records.tobytes()
+        assert archive.batch()[2].to_dict() == batch[2].to_dict()
+
+    records = read_chart_archive(path)
+    assert np.array_equal(records['signs'][:, Planet.MOON], batch.records['signs'][:, Planet.MOON])
+
+
+def test_archive_cuts_off_torn_record(tmp_path, batch):
+    path = str(tmp_path / 'charts.ptca')
+    with ChartArchive(path) as archive:
+        archive.append(batch[:3])
+    # What an append interrupted partway through would leave
+    with open(path, 'ab') as archive_file:
+        archive_file.write(b'\xff' * 10)
+    assert len(read_chart_archive(path)) == 3
+
+    with ChartArchive(path) as archive:
+        archive.append(batch[3])
+        assert len(archive) == 4
+        assert archive.records().tobytes() == batch.records.tobytes()
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a chart archive')
+    with pytest.raises(ValueError):
+        ChartArchive(str(path))
@@ -0,0 +1,79 @@
+from itertools import count
+
+import numpy as np
+import pytest
+from utilities import chart_cache
+from utilities.chart import ChartBatch
+from utilities.chart_cache import ChartCache, chart_cache_key
+
+
+@pytest.fixture(scope='module')
+def charts():
+    batch = ChartBatch.calculate(2460000.5 + np.arange(12) * 0.37, 40.7128, -74.006, 'P')
+    return [(chart_cache_key(chart.jd, 40.7128, -74.006, 'P'), chart) for chart in batch]
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Every store and disk hit gets a later time, so the least recently used order is exact
+    ticks = count(1)
+    monkeypatch.setattr(chart_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def test_memory_tier_is_lru(charts):
+    cache = ChartCache(None, memory_size=2)
+    (key_a, chart_a), (key_b, chart_b), (key_c, chart_c) = charts[:3]
+    cache.store(key_a, chart_a)
+    cache.store(key_b, chart_b)
+    assert cache.lookup(key_a) is not None
+    cache.store(key_c, chart_c)
+
+    assert cache.lookup(key_b) is None
+    assert cache.lookup(key_a).record.tobytes() == chart_a.record.tobytes()
+    assert cache.statistics['memory_hits'] == 2
+    assert cache.statistics['misses'] == 1
+
+
+def test_disk_round_trip(tmp_path, charts):
+    path = str(tmp_path / 'charts.sqlite')
+    cache = ChartCache(path)
+    for key, chart in charts[:3]:
+        cache.store(key, chart)
+    cache.close()
+
+    cache = ChartCache(path)
+    key, chart = charts[1]
+    cached = cache.lookup(key)
+    assert cached.record.tobytes() == chart.record.tobytes()
+    assert not cached.record.flags.writeable
+    assert cache.statistics == {'memory_hits': 0, 'disk_hits': 1, 'misses': 0, 'evictions': 0}
+    assert cache.lookup(key) is cached
+    cache.close()
+
+
+def test_replacing_a_chart_does_not_grow_the_count(charts):
+    cache = ChartCache(':memory:')
+    key, chart = charts[0]
+    cache.store(key, chart)
+    cache.store(key, chart)
+    assert cache._disk_count == 1
+
+
+def test_eviction_keeps_recently_read_charts(charts):
+    # Ten charts fill the disk tier; the eleventh evicts the two least recently used
+    cache = ChartCache(':memory:', memory_size=1, disk_size=10)
+    for key, chart in charts[:10]:
+        cache.store(key, chart)
+    # Read from disk, since only the last chart stored is in memory
+    assert cache.lookup(charts[0][0]) is not None
+    assert cache.statistics['disk_hits'] == 1
+
+    cache.store(*charts[10])
+    assert cache.statistics['evictions'] == 2
+    assert cache._disk_count == 9
+
+    cache._memory.clear()
+    assert cache.lookup(charts[0][0]) is not None
+    assert cache.lookup(charts[1][0]) is None
+    assert cache.lookup(charts[2][0]) is None
+    assert cache.lookup(charts[3][0]) is not None
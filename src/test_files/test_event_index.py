@@ -0,0 +1,17 @@
+import os
+
+import swisseph as swis_eph
+from utilities.event_index import build_event_index
+
+
+def test_build_event_index_without_extension(tmp_path):
+    # np.savez writes idx.npz; the index must be loaded from there, not from idx
+    index = build_event_index(str(tmp_path / 'idx'), 2024, 2024, workers=1)
+    assert os.path.exists(tmp_path / 'idx.npz')
+
+    # The March equinox of 2024 is on March 20 at about 03:06 UT
+    ingress = index.next_ingress('Sun', swis_eph.julday(2024, 1, 1, 0.0), 'Aries')
+    assert abs(ingress.jd - swis_eph.julday(2024, 3, 20, 3.1)) < 0.01
+    # The index holds geocentric events
+    longitude = swis_eph.calc_ut(ingress.jd, swis_eph.SUN)[0][0]
+    assert min(longitude, 360 - longitude) < 0.001
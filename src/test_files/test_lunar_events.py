@@ -0,0 +1,33 @@
+import swisseph as swis_eph
+from utilities.astro_calculations import calculate_ecliptic_positions
+from utilities.lunar_events import calculate_moon_events
+
+# Dallas, on the path of the total solar eclipse of 2024 April 8
+DALLAS = (32.78, -96.8)
+
+
+def test_moon_aspects_before_sign_change():
+    events = calculate_moon_events(swis_eph.julday(2024, 4, 8, 0.0), *DALLAS)
+    assert [(aspect.planet, aspect.aspect) for aspect in events.aspects] == [
+        ('Sun', 'Conjunction'), ('Mercury', 'Conjunction')]
+    # The eclipse new moon, at about 18:42 UT in Dallas
+    assert abs(events.aspects[0].jd - swis_eph.julday(2024, 4, 8, 18.7)) < 0.005
+    assert events.next_sign == 'Taurus'
+    assert not events.void_of_course
+    assert events.void_of_course_interval == (events.aspects[-1].jd, events.sign_exit_jd)
+
+    # The exact times agree with the ephemeris
+    moon_sun = calculate_ecliptic_positions(events.aspects[0].jd, ['Moon', 'Sun'], *DALLAS)[0]
+    assert abs(moon_sun[0, 0] - moon_sun[1, 0]) < 1e-3
+    moon = calculate_ecliptic_positions(events.sign_exit_jd, ['Moon'], *DALLAS)[0]
+    assert abs(moon[0, 0] - 30) < 1e-3
+
+
+def test_void_of_course_after_last_aspect():
+    # After the conjunction with Mercury the Moon makes no aspect before entering Taurus
+    jd = swis_eph.julday(2024, 4, 9, 6.0)
+    events = calculate_moon_events(jd, *DALLAS)
+    assert events.aspects == []
+    assert events.void_of_course
+    assert events.void_of_course_interval == (jd, events.sign_exit_jd)
+    assert jd < events.sign_exit_jd < swis_eph.julday(2024, 4, 9, 12.0)
@@ -0,0 +1,53 @@
+import importlib
+
+
+# The public API of the package, by the module each name lives in. Names are imported from
+# their module on first access (PEP 562), so `from utilities import Chart` only loads what a
+# chart needs, and geocoding, timezone, Skyfield and HTTP dependencies load when first used
+_PUBLIC_API = {
+    'utilities.astro_calculations': (
+        'PLANETS', 'POSITION_FLAGS', 'calculate_custom_julian_day', 'calculate_custom_julian_days',
+        'calculate_ecliptic_longitude', 'calculate_ecliptic_positions', 'compute_houses',
+        'get_coordinates', 'set_ephemeris_path', 'set_topocentric_location'),
+    'utilities.astro_utils': (
+        'TRADITIONAL_PLANETS', 'ZODIAC_SIGNS', 'classify_longitude', 'classify_longitudes',
+        'get_house_system_code', 'get_planetary_ruler_of_the_day', 'get_sign_degrees',
+        'get_zodiac_sign', 'is_day_chart'),
+    'utilities.async_geocoder': ('AsyncGeocoder', 'geocode_places'),
+    'utilities.chart': (
+        'CHART_BODIES', 'CHART_DTYPE', 'CHART_RECORD_DTYPE', 'CHART_RECORD_VERSION', 'Chart',
+        'ChartBatch', 'Planet'),
+    'utilities.chart_archive': ('ChartArchive', 'read_chart_archive'),
+    'utilities.chart_cache': ('ChartCache', 'get_default_chart_cache'),
+    'utilities.chart_pipeline': ('compute_chart', 'compute_charts', 'stream_chart_json'),
+    'utilities.chebyshev_ephemeris': (
+        'ChebyshevEphemeris', 'build_chebyshev_ephemeris', 'use_chebyshev_ephemeris'),
+    'utilities.dignity_utils': ('calculate_motion_states', 'score_dignities'),
+    'utilities.electional': ('chart_signature', 'find_elections'),
+    'utilities.ephemeris': ('Ephemeris', 'ephemeris_process_pool', 'get_thread_ephemeris'),
+    'utilities.ephemeris_backend': (
+        'EphemerisBackend', 'SkyfieldBackend', 'SwissEphemerisBackend',
+        'configure_ephemeris_backend', 'get_ephemeris_backend'),
+    'utilities.geocode_cache': ('GeocodeCache', 'get_default_geocode_cache'),
+    'utilities.instrumentation': ('configure_instrumentation', 'stage_metrics'),
+    'utilities.timezone_utils': (
+        'configure_timezone_lookup', 'get_timezone_cache_precision', 'get_timezone_name'),
+}
+
+_MODULE_OF = {name: module for module, names in _PUBLIC_API.items() for name in names}
+
+__all__ = sorted(_MODULE_OF)
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module 'utilities' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module), name)
+    # Later lookups find the name directly, without calling __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
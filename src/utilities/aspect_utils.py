@@ -0,0 +1,305 @@
+from collections import namedtuple
+
+import numpy as np
+from utilities.astro_calculations import calculate_ecliptic_positions, compute_houses
+from utilities.astro_utils import get_zodiac_sign
+
+
+# The Ptolemaic aspects and their angles in degrees, coded by their index in this tuple
+PTOLEMAIC_ASPECTS = (
+    ('Conjunction', 0),
+    ('Sextile', 60),
+    ('Square', 90),
+    ('Trine', 120),
+    ('Opposition', 180),
+)
+
+# Code used in aspect matrices for pairs that are not in aspect
+NO_ASPECT = -1
+
+# Moieties (half orbs) in degrees, from William Lilly's orbs in Christian Astrology. Two bodies
+# are in aspect when their distance from the exact aspect is within the sum of their moieties.
+# Angles and Lunar Nodes have no orb of their own, so only the planet's moiety applies to them
+MOIETIES = {
+    'Sun': 7.5,
+    'Moon': 6.0,
+    'Mercury': 3.5,
+    'Venus': 3.5,
+    'Mars': 3.75,
+    'Jupiter': 4.5,
+    'Saturn': 4.5,
+    'North Node': 0.0,
+    'South Node': 0.0,
+    'Ascendant': 0.0,
+    'Midheaven': 0.0,
+}
+
+# The bodies and points included in a chart's aspects by calculate_chart_aspects
+CHART_ASPECT_BODIES = ('Sun', 'Moon', 'Mercury', 'Venus', 'Mars', 'Jupiter', 'Saturn',
+                       'North Node', 'South Node', 'Ascendant', 'Midheaven')
+
+# How far ahead find_aspect_perfection searches, and its largest step, in days
+MAX_PERFECTION_SEARCH_DAYS = 400
+MAX_PERFECTION_STEP_DAYS = 10
+
+# Precision of the perfection time found by find_aspect_perfection, in days (about one second)
+PERFECTION_TOLERANCE_DAYS = 1e-5
+
+# Result of calculate_aspect_matrix
+AspectMatrix = namedtuple('AspectMatrix', ['aspect', 'orb', 'applying'])
+
+# A single aspect between two bodies, as returned by find_aspects
+Aspect = namedtuple('Aspect', ['first', 'second', 'aspect', 'orb', 'applying'])
+
+# Result of find_aspect_perfection
+Perfection = namedtuple('Perfection', ['jd', 'days', 'sign_changes', 'stations', 'ephemeris_calls'])
+
+
+def calculate_aspect_matrix(longitudes, speeds, moieties):
+    """
+    Finds the Ptolemaic aspects between every pair of bodies of one or many charts in a single
+    vectorized pass over the matrix of angular distances. An aspect is applying when the bodies
+    are moving towards its exact angle, and separating when they are moving away from it.
+
+    Parameters:
+    - longitudes (array-like): Ecliptic longitudes in degrees, with bodies on the last axis.
+                               Leading axes index charts.
+    - speeds (array-like): Daily speeds in longitude in degrees per day, with the same shape.
+                           Use 0 for points, such as the angles, treated as fixed.
+    - moieties (array-like): The moiety of each body in degrees, with bodies on the last axis.
+
+    Returns:
+    - AspectMatrix: A namedtuple of three arrays of shape (..., n_body, n_body):
+        - aspect: int8 index into PTOLEMAIC_ASPECTS, or NO_ASPECT.
+        - orb: Distance in degrees from the exact aspect (NaN when there is no aspect).
+        - applying: Whether the aspect is applying.
+    """
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    speeds = np.asarray(speeds, dtype=np.float64)
+    moieties = np.asarray(moieties, dtype=np.float64)
+
+    # Angular distance from each body (rows) to every other body (columns), and how fast it changes
+    difference = (longitudes[..., np.newaxis, :] - longitudes[..., :, np.newaxis]) % 360
+    relative_speed = speeds[..., np.newaxis, :] - speeds[..., :, np.newaxis]
+    past_opposition = difference > 180
+    separation = np.where(past_opposition, 360 - difference, difference)
+    separation_speed = np.where(past_opposition, -relative_speed, relative_speed)
+
+    # Pairs of points without an orb of their own (e.g., the two Lunar Nodes) are never in aspect
+    allowed_orb = moieties[..., np.newaxis, :] + moieties[..., :, np.newaxis]
+    allowed_orb = np.where(allowed_orb > 0, allowed_orb, -1.0)
+
+    # Keep, for each pair, the aspect closest to exact that is within orb
+    aspect = np.full(separation.shape, NO_ASPECT, dtype=np.int8)
+    deviation = np.full(separation.shape, np.nan)
+    for aspect_index, (_, angle) in enumerate(PTOLEMAIC_ASPECTS):
+        aspect_deviation = separation - angle
+        closer = (np.abs(aspect_deviation) <= allowed_orb) & (
+            np.isnan(deviation) | (np.abs(aspect_deviation) < np.abs(deviation)))
+        aspect[closer] = aspect_index
+        deviation[closer] = aspect_deviation[closer]
+
+    # A body is never in aspect with itself
+    diagonal = np.arange(longitudes.shape[-1])
+    aspect[..., diagonal, diagonal] = NO_ASPECT
+    deviation[..., diagonal, diagonal] = np.nan
+
+    # The aspect applies while the deviation from exact is shrinking
+    applying = (aspect != NO_ASPECT) & (deviation * separation_speed < 0)
+
+    return AspectMatrix(aspect=aspect, orb=np.abs(deviation), applying=applying)
+
+
+def find_aspects(body_names, longitudes, speeds, moieties=None):
+    """
+    Lists the Ptolemaic aspects between the bodies of a single chart.
+
+    Parameters:
+    - body_names (list): Names of the bodies (e.g., ['Sun', 'Moon', 'Ascendant']).
+    - longitudes (array-like): The ecliptic longitude of each body in degrees.
+    - speeds (array-like): The daily speed in longitude of each body in degrees per day.
+    - moieties (dict): Moiety of each body by name. Defaults to MOIETIES.
+
+    Returns:
+    - list: A list of Aspect namedtuples (first body, second body, aspect name, orb, applying),
+            tightest orb first.
+    """
+    if moieties is None:
+        moieties = MOIETIES
+
+    matrix = calculate_aspect_matrix(
+        longitudes, speeds, [moieties[body_name] for body_name in body_names])
+
+    aspects = []
+    first_indices, second_indices = np.nonzero(np.triu(matrix.aspect != NO_ASPECT))
+    for first, second in zip(first_indices.tolist(), second_indices.tolist()):
+        aspects.append(Aspect(
+            first=body_names[first],
+            second=body_names[second],
+            aspect=PTOLEMAIC_ASPECTS[matrix.aspect[first, second]][0],
+            orb=float(matrix.orb[first, second]),
+            applying=bool(matrix.applying[first, second]),
+        ))
+
+    return sorted(aspects, key=lambda aspect: aspect.orb)
+
+
+def calculate_chart_aspects(jd, location_latitude, location_longitude, house_system_code, moieties=None):
+    """
+    Calculates the Ptolemaic aspects between the seven planets, the Lunar Nodes, the Ascendant
+    and the Midheaven of a chart. The angles are treated as fixed points, so aspects to them
+    apply or separate according to the planet's own motion.
+
+    Parameters:
+    - jd (float): The Julian Day of the chart.
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+    - house_system_code (str): The code for the house system to use.
+    - moieties (dict): Moiety of each body by name. Defaults to MOIETIES.
+
+    Returns:
+    - list: A list of Aspect namedtuples, tightest orb first.
+    """
+    planet_names = list(CHART_ASPECT_BODIES[:-2])
+    positions = calculate_ecliptic_positions(
+        jd, planet_names, location_latitude, location_longitude)[0]
+    chart_angles = compute_houses(
+        jd, location_latitude, location_longitude, house_system_code)
+
+    longitudes = np.concatenate(
+        [positions[:, 0], [chart_angles.ascendant, chart_angles.midheaven]])
+    speeds = np.concatenate([positions[:, 3], [0.0, 0.0]])
+
+    return find_aspects(list(CHART_ASPECT_BODIES), longitudes, speeds, moieties)
+
+
+def find_aspect_perfection(first, second, aspect_name, jd, location_latitude, location_longitude,
+                           max_days=MAX_PERFECTION_SEARCH_DAYS, tolerance=PERFECTION_TOLERANCE_DAYS):
+    """
+    Finds when an aspect between two bodies next perfects (becomes exact), as needed to judge
+    whether and when a horary matter comes to pass. The search steps forward with adaptive
+    step sizes estimated from the bodies' speeds, and the exact time is found with a
+    Newton-Raphson iteration safeguarded by bisection. Retrograde stations are accounted for:
+    when the bodies' relative motion reverses within a step, that step is searched for a
+    perfection that comes and goes before the step ends.
+
+    Parameters:
+    - first (str): Name of the first planet or Lunar Node (e.g., 'Moon').
+    - second (str): Name of the second planet or Lunar Node (e.g., 'Saturn').
+    - aspect_name (str): The Ptolemaic aspect (e.g., 'Trine').
+    - jd (float): Julian Day from which to search.
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+    - max_days (float): How many days ahead to search before giving up.
+    - tolerance (float): Precision of the perfection time in days.
+
+    Returns:
+    - Perfection: A namedtuple with the Julian Day of perfection, the days until perfection,
+                  the bodies that change sign before perfection as (body, from sign, to sign)
+                  tuples, the stations on the way as (body, approximate Julian Day) tuples,
+                  and the number of ephemeris evaluations used. Returns None if the aspect
+                  does not perfect within max_days.
+    """
+    angles = dict(PTOLEMAIC_ASPECTS)
+    if aspect_name not in angles:
+        raise ValueError(f"'{aspect_name}' is not a Ptolemaic aspect.")
+
+    # An aspect perfects when the second body is the aspect's angle ahead of or behind the first
+    targets = sorted({angles[aspect_name] % 360, -angles[aspect_name] % 360})
+    evaluations = 0
+
+    def evaluate(time):
+        nonlocal evaluations
+        evaluations += 1
+        positions = calculate_ecliptic_positions(
+            time, [first, second], location_latitude, location_longitude)[0]
+        # Distance from each exact aspect, wrapped to [-180, 180), and its daily rate of change
+        distance = (positions[1, 0] - positions[0, 0] - np.array(targets) + 180) % 360 - 180
+        return distance, positions[1, 3] - positions[0, 3], positions[:, [0, 3]]
+
+    start_distance, start_rate, start_bodies = evaluate(jd)
+    if np.any(start_distance == 0):
+        return Perfection(jd, 0.0, [], [], evaluations)
+
+    stations = []
+    time, distance, rate, bodies = jd, start_distance, start_rate, start_bodies
+    while time - jd < max_days:
+        # Never move more than 30 degrees of relative motion per step, so that no crossing is skipped
+        step = min(MAX_PERFECTION_STEP_DAYS, 30 / max(abs(rate), 1e-9))
+        approaching = distance * rate < 0
+        if approaching.any():
+            # Newton's estimate of the time left, overshooting slightly to bracket the perfection
+            step = min(step, np.min(-distance[approaching] / rate) * 1.05 + tolerance)
+        step = max(step, tolerance)
+
+        next_time = time + step
+        next_distance, next_rate, next_bodies = evaluate(next_time)
+
+        # Stations of either body within the step, where its speed changes sign
+        for body_index, body_name in enumerate((first, second)):
+            speed, next_speed = bodies[body_index, 1], next_bodies[body_index, 1]
+            if (speed < 0) != (next_speed < 0):
+                stations.append((body_name, float(time + step * speed / (speed - next_speed))))
+
+        # A sign change in the distance from exact brackets a perfection. Distances near 180
+        # only flip sign because of the wrap-around, not because of a perfection
+        crossed = (np.sign(distance) != np.sign(next_distance)) & (
+            np.abs(distance) < 90) & (np.abs(next_distance) < 90)
+
+        if not crossed.any() and (rate < 0) != (next_rate < 0):
+            # The relative motion reversed within the step, so the distance may have touched zero
+            # and come back. Check where the speeds say it came closest to exact
+            target_index = int(np.argmin(np.abs(distance)))
+            turn_time = time + step * rate / (rate - next_rate)
+            turn_distance, turn_rate, turn_bodies = evaluate(turn_time)
+            if np.sign(turn_distance[target_index]) != np.sign(distance[target_index]) and abs(
+                    turn_distance[target_index]) < 90:
+                next_time, next_distance, next_rate, next_bodies = (
+                    turn_time, turn_distance, turn_rate, turn_bodies)
+                crossed = np.zeros(len(targets), dtype=bool)
+                crossed[target_index] = True
+
+        if crossed.any():
+            target_index = int(np.flatnonzero(crossed)[0])
+            perfection_jd, perfection_bodies = _refine_perfection(
+                evaluate, target_index, time, distance[target_index], next_time,
+                next_distance[target_index], tolerance)
+
+            sign_changes = []
+            for body_index, body_name in enumerate((first, second)):
+                from_sign = get_zodiac_sign(start_bodies[body_index, 0])
+                to_sign = get_zodiac_sign(perfection_bodies[body_index, 0])
+                if from_sign != to_sign:
+                    sign_changes.append((body_name, from_sign, to_sign))
+
+            perfection_jd = float(perfection_jd)
+            return Perfection(perfection_jd, perfection_jd - jd, sign_changes,
+                              [station for station in stations if station[1] < perfection_jd],
+                              evaluations)
+
+        time, distance, rate, bodies = next_time, next_distance, next_rate, next_bodies
+
+    return None
+
+
+def _refine_perfection(evaluate, target_index, low, low_distance, high, high_distance, tolerance):
+    # Safeguarded Newton-Raphson iteration inside the bracket [low, high]: take the Newton step
+    # when it stays inside the bracket, and bisect otherwise
+    time = low - low_distance * (high - low) / (high_distance - low_distance)
+    bodies = None
+    for _ in range(60):
+        distance, rate, bodies = evaluate(time)
+        distance = distance[target_index]
+        if np.sign(distance) == np.sign(low_distance):
+            low, low_distance = time, distance
+        else:
+            high = time
+
+        newton_time = time - distance / rate if rate else None
+        if newton_time is not None and low < newton_time < high and abs(newton_time - time) < tolerance:
+            return newton_time, bodies
+        if high - low < tolerance:
+            return time, bodies
+        time = newton_time if newton_time is not None and low < newton_time < high else (low + high) / 2
+
+    return time, bodies
@@ -1,26 +1,94 @@
-from geopy.geocoders import Nominatim
+import numpy as np
 import swisseph as swis_eph
 from datetime import datetime, timezone, timedelta
-from timezonefinder import TimezoneFinder
-import pytz
-
-
-def get_coordinates(city, country):
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from utilities.geocode_cache import get_default_geocode_cache
+from utilities.instrumentation import instrumented
+from utilities.timezone_utils import (
+    get_timezone_name, get_pytz_timezone, localize_local_times, get_timezone_cache_precision,
+    LOCAL_TIME_UNKNOWN_TIMEZONE)
+
+
+# Swiss Ephemeris body identifiers for the planets and Lunar Nodes used in this software.
+# The South Node has no identifier of its own; it is derived from the North Node
+PLANETS = {
+    'Sun': swis_eph.SUN,
+    'Moon': swis_eph.MOON,
+    'Mercury': swis_eph.MERCURY,
+    'Venus': swis_eph.VENUS,
+    'Mars': swis_eph.MARS,
+    'Jupiter': swis_eph.JUPITER,
+    'Saturn': swis_eph.SATURN,
+    'North Node': swis_eph.MEAN_NODE  # or swis_eph.TRUE_NODE
+}
+
+# Nominatim client shared by get_coordinates, created on first use
+_geolocator = None
+
+# Any calculation that depends on the observer location or ephemeris path must hold this lock
+# from setting them until it is done. Depending on how it was built, the Swiss Ephemeris keeps
+# them per thread or per process, and where it keeps them per process, concurrent threads
+# could otherwise calculate with each other's location
+SWISSEPH_LOCK = threading.RLock()
+
+# Swiss Ephemeris flags of calculate_ecliptic_positions: topocentric positions with speeds
+POSITION_FLAGS = swis_eph.FLG_TOPOCTR | swis_eph.FLG_SPEED
+
+# Precomputed ChebyshevEphemeris that positions are taken from where it covers the time and
+# location, installed with chebyshev_ephemeris.use_chebyshev_ephemeris
+_chebyshev_ephemeris = None
+
+# Number of distinct (jd, location, house system) results kept by compute_houses
+HOUSES_CACHE_SIZE = 1024
+
+# Immutable result of compute_houses: the twelve cusps plus the chart angles
+ChartAngles = namedtuple(
+    'ChartAngles', ['cusps', 'ascendant', 'midheaven', 'descendant', 'ic', 'vertex', 'armc'])
+
+
+@instrumented('geocode')
+def get_coordinates(city, country, cache=None, offline=False):
     """
+    Looks up the coordinates of a city. The local geocoding cache is checked first, and
+    Nominatim is only queried on a cache miss; its results are then written to the cache.
+
     Parameters:
     - city (str): The city's name.
     - country (str): The country's name.
+    - cache (GeocodeCache): The geocoding cache to use. Defaults to the shared on-disk cache.
+    - offline (bool): If True, never query Nominatim and only use the cache.
 
     Returns:
     - list: A list of namedtuples or None. Each namedtuple contains attributes like latitude,
             longitude, and address. If no matches are found, returns None.
     """
-    geolocator = Nominatim(user_agent="AstrologyAppProject")
-    locations = geolocator.geocode(
+    if cache is None:
+        cache = get_default_geocode_cache()
+
+    locations = cache.lookup(city, country)
+    if locations is not None or offline:
+        return locations
+
+    locations = _get_geolocator().geocode(
         f"{city}, {country}", exactly_one=False, language='en')
+    if locations:
+        cache.store(city, country, locations)
     return locations
 
 
+def _get_geolocator():
+    # A single Nominatim client is shared by every lookup. geopy is only imported here, since
+    # it is slow to import and most charts are cast for known coordinates
+    global _geolocator
+
+    if _geolocator is None:
+        from geopy.geocoders import Nominatim
+        _geolocator = Nominatim(user_agent="AstrologyAppProject")
+    return _geolocator
+
+
 def calculate_current_julian_day():
     """
     Calculates the current Julian Day Number (JDN) based on the UTC time.
@@ -44,6 +112,7 @@ def calculate_current_julian_day():
     return jd, now
 
 
+@instrumented('julian_day')
 def calculate_custom_julian_day(year, month, day, hour, minute, second, lat, lon):
     """
     Calculates the Julian Day Number (JDN) for a custom date and time, adjusted for a specific location's timezone.
@@ -66,20 +135,19 @@ def calculate_custom_julian_day(year, month, day, hour, minute, second, lat, lon
     custom_datetime = datetime(year, month, day, hour, minute, second)
 
     # Find the timezone of the given location
-    tf = TimezoneFinder()
-    tz_str = tf.timezone_at(lat=lat, lng=lon)  # Get the timezone string
+    tz_str = get_timezone_name(lat, lon)  # Get the timezone string
     if tz_str is None:
         raise ValueError(
             f"Could not determine the timezone for the location: {lat}, {lon}")
 
     # Use the timezone string to get a timezone object
-    timezone_location = pytz.timezone(tz_str)
+    timezone_location = get_pytz_timezone(tz_str)
 
     # Make the datetime object timezone aware
     custom_datetime = timezone_location.localize(custom_datetime)
 
     # Convert the timezone aware datetime to UTC
-    custom_datetime_utc = custom_datetime.astimezone(pytz.utc)
+    custom_datetime_utc = custom_datetime.astimezone(timezone.utc)
 
     # Use the adjusted hour value directly
     ut = custom_datetime_utc.hour + custom_datetime_utc.minute / \
@@ -91,6 +159,52 @@ def calculate_custom_julian_day(year, month, day, hour, minute, second, lat, lon
     return jd, custom_datetime_utc
 
 
+@instrumented('julian_day')
+def calculate_custom_julian_days(local_datetimes, lats, lons):
+    """
+    Calculates the Julian Day Numbers (JDN) for many local dates and times at once, each adjusted
+    for its location's timezone. This is the bulk counterpart of calculate_custom_julian_day:
+    rows are grouped by timezone and converted to UTC with NumPy instead of one datetime at a time.
+
+    Parameters:
+    - local_datetimes (array-like): Naive local dates and times, as numpy datetime64 values or
+                                    ISO 8601 strings (e.g., '2023-11-05T01:30:00').
+    - lats (float or array-like): The latitude of each location, or one latitude for all rows.
+    - lons (float or array-like): The longitude of each location, or one longitude for all rows.
+
+    Returns:
+    - tuple: A float64 array of Julian Day Numbers in UTC, and an int8 array of LOCAL_TIME_* flags
+             from timezone_utils marking ambiguous and nonexistent local times. Rows whose
+             timezone cannot be determined get a Julian Day of NaN and the
+             LOCAL_TIME_UNKNOWN_TIMEZONE flag.
+    """
+    local_seconds = np.atleast_1d(np.asarray(
+        local_datetimes, dtype='datetime64[s]')).astype(np.int64)
+    lats = np.broadcast_to(np.asarray(lats, dtype=np.float64), local_seconds.shape)
+    lons = np.broadcast_to(np.asarray(lons, dtype=np.float64), local_seconds.shape)
+
+    # Only look up the timezone once per distinct location
+    locations, location_index = np.unique(
+        np.round(np.stack([lats, lons], axis=-1), get_timezone_cache_precision()),
+        axis=0, return_inverse=True)
+    location_index = location_index.reshape(-1)
+    tz_names = [get_timezone_name(lat, lon) for lat, lon in locations.tolist()]
+
+    utc_seconds = np.zeros(len(local_seconds), dtype=np.int64)
+    flags = np.full(len(local_seconds), LOCAL_TIME_UNKNOWN_TIMEZONE, dtype=np.int8)
+    # Group the rows by timezone, so each timezone's offset table is used once
+    for tz_str in set(tz_names) - {None}:
+        tz_locations = [index for index, name in enumerate(tz_names) if name == tz_str]
+        rows = np.isin(location_index, tz_locations)
+        utc_seconds[rows], flags[rows] = localize_local_times(local_seconds[rows], tz_str)
+
+    # The Unix epoch, 1970-01-01 00:00 UTC, is Julian Day 2440587.5
+    jds = utc_seconds / 86400.0 + 2440587.5
+    jds[flags == LOCAL_TIME_UNKNOWN_TIMEZONE] = np.nan
+
+    return jds, flags
+
+
 def convert_to_dms(decimal_degrees):
     """
     This function converts a decimal degree value to degrees, minutes, and seconds (DMS). This is a more traditional format used in astronomy and astrology.
@@ -110,6 +224,35 @@ def convert_to_dms(decimal_degrees):
     return degrees, minutes, seconds
 
 
+def set_topocentric_location(location_latitude, location_longitude, altitude=0):
+    """
+    Sets the observer location used by topocentric Swiss Ephemeris calculations. The Swiss
+    Ephemeris keeps this as global state, so callers hold SWISSEPH_LOCK from this call until
+    their calculations are done. The location is set on every call: remembering the last one
+    set would go stale where the state is per process and another thread has set its own.
+
+    Parameters:
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+    - altitude (float): Altitude of the observation point in meters above sea level.
+    """
+    with SWISSEPH_LOCK:
+        swis_eph.set_topo(float(location_longitude), float(location_latitude), float(altitude))
+
+
+def set_ephemeris_path(ephe_path):
+    """
+    Sets the directory the Swiss Ephemeris reads its data files from. Like the observer location,
+    this is global state, set on every call.
+
+    Parameters:
+    - ephe_path (str): Directory of the Swiss Ephemeris data files (e.g., sepl_18.se1).
+    """
+    with SWISSEPH_LOCK:
+        swis_eph.set_ephe_path(ephe_path)
+
+
+@instrumented('ephemeris')
 def calculate_ecliptic_longitude(planet_name, jd, location_latitude, location_longitude):
     """
     Calculates the ecliptic longitude of a specified planet or Lunar Node for a given Julian Day (JD).
@@ -124,41 +267,119 @@ def calculate_ecliptic_longitude(planet_name, jd, location_latitude, location_lo
     - float: Ecliptic longitude of the planet or Lunar Node in degrees.
     """
 
-    PLANETS = {
-        'Sun': swis_eph.SUN,
-        'Moon': swis_eph.MOON,
-        'Mercury': swis_eph.MERCURY,
-        'Venus': swis_eph.VENUS,
-        'Mars': swis_eph.MARS,
-        'Jupiter': swis_eph.JUPITER,
-        'Saturn': swis_eph.SATURN,
-        'North Node': swis_eph.MEAN_NODE  # or swis_eph.TRUE_NODE
-    }
-
     if planet_name not in PLANETS and planet_name != 'South Node':
         raise ValueError(
             f"'{planet_name}' is not a recognized planet or Lunar Node.")
 
-    # Set the topocentric flag and location
+    chebyshev_ephemeris = _chebyshev_ephemeris
+    if chebyshev_ephemeris is not None and chebyshev_ephemeris.covers(
+            jd, location_latitude, location_longitude):
+        return chebyshev_ephemeris.ecliptic_longitude(planet_name, jd)
+
+    # Set the topocentric flag and location, and calculate before another thread can move it
     flag = swis_eph.FLG_TOPOCTR
-    swis_eph.set_topo(location_longitude, location_latitude, 0)
-
-    if planet_name == 'South Node':
-        # Calculate North Node and adjust for South Node
-        north_node_data, _ = swis_eph.calc_ut(jd, swis_eph.MEAN_NODE, flag)
-        north_node_longitude = north_node_data[0]  # Extract the longitude
-        ecliptic_longitude = (north_node_longitude + 180) % 360
-    else:
-        planet_id = PLANETS[planet_name]
-        planet_data, _ = swis_eph.calc_ut(jd, planet_id, flag)
-        ecliptic_longitude = planet_data[0]  # Extract the longitude
+    with SWISSEPH_LOCK:
+        set_topocentric_location(location_latitude, location_longitude)
+
+        if planet_name == 'South Node':
+            # Calculate North Node and adjust for South Node
+            north_node_data, _ = swis_eph.calc_ut(jd, PLANETS['North Node'], flag)
+            north_node_longitude = north_node_data[0]  # Extract the longitude
+            ecliptic_longitude = (north_node_longitude + 180) % 360
+        else:
+            planet_id = PLANETS[planet_name]
+            planet_data, _ = swis_eph.calc_ut(jd, planet_id, flag)
+            ecliptic_longitude = planet_data[0]  # Extract the longitude
 
     return ecliptic_longitude
 
 
-def calculate_ascendant(jd, location_latitude, location_longitude, house_system_code):
+@instrumented('ephemeris')
+def calculate_ecliptic_positions(jds, planet_names, location_latitude, location_longitude):
     """
-    Calculates the Ascendant degrees for a given Julian Day and location.
+    Calculates the topocentric ecliptic positions and speeds of several planets or Lunar Nodes
+    for several Julian Days at once. The observer location is set once for the whole batch,
+    and the South Node is derived from the North Node rather than calculated separately.
+    When an installed Chebyshev ephemeris covers every Julian Day and the location, the
+    positions are evaluated from it instead.
+
+    Parameters:
+    - jds (float or array-like): One or more Julian Days for which to perform the calculation.
+    - planet_names (list): Names of the planets or Lunar Nodes (e.g., ['Sun', 'Moon', 'North Node', 'South Node']).
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+
+    Returns:
+    - numpy.ndarray: An array of shape (n_jd, n_body, 6) holding, for each Julian Day and body,
+                     the ecliptic longitude, latitude, distance (AU), and the daily speeds
+                     in longitude, latitude and distance.
+    """
+    chebyshev_ephemeris = _chebyshev_ephemeris
+    if chebyshev_ephemeris is not None and chebyshev_ephemeris.covers(
+            jds, location_latitude, location_longitude):
+        return chebyshev_ephemeris.positions(jds, planet_names)
+
+    return _calculate_positions(
+        jds, planet_names, POSITION_FLAGS, location_latitude, location_longitude)
+
+
+def _calculate_positions(jds, planet_names, flags, location_latitude=None, location_longitude=None,
+                         altitude=0, node_id=PLANETS['North Node'], ephe_path=None):
+    # Shared by calculate_ecliptic_positions and ephemeris.Ephemeris. The observer location
+    # and ephemeris path, when given, are set and used under SWISSEPH_LOCK
+    jds = np.atleast_1d(np.asarray(jds, dtype=np.float64))
+
+    for planet_name in planet_names:
+        if planet_name not in PLANETS and planet_name != 'South Node':
+            raise ValueError(
+                f"'{planet_name}' is not a recognized planet or Lunar Node.")
+
+    # Each body is calculated once, even if it is requested more than once. The South Node
+    # is taken from the North Node's result
+    body_names = []
+    for planet_name in planet_names:
+        body_name = 'North Node' if planet_name == 'South Node' else planet_name
+        if body_name not in body_names:
+            body_names.append(body_name)
+
+    calc_ut = swis_eph.calc_ut
+    body_ids = [node_id if body_name == 'North Node' else PLANETS[body_name]
+                for body_name in body_names]
+    body_data = np.empty((len(jds), len(body_ids), 6), dtype=np.float64)
+    with SWISSEPH_LOCK:
+        if ephe_path is not None:
+            set_ephemeris_path(ephe_path)
+        if flags & swis_eph.FLG_TOPOCTR:
+            set_topocentric_location(location_latitude, location_longitude, altitude)
+
+        for jd_index, jd in enumerate(jds.tolist()):
+            row = body_data[jd_index]
+            for body_index, body_id in enumerate(body_ids):
+                row[body_index] = calc_ut(jd, body_id, flags)[0]
+
+    positions = np.empty((len(jds), len(planet_names), 6), dtype=np.float64)
+    for planet_index, planet_name in enumerate(planet_names):
+        if planet_name == 'South Node':
+            north_node = body_data[:, body_names.index('North Node')]
+            south_node = positions[:, planet_index]
+            # The South Node is opposite the North Node, mirrored in latitude
+            south_node[:] = north_node
+            south_node[:, 0] = (north_node[:, 0] + 180) % 360
+            south_node[:, 1] = -north_node[:, 1]
+            south_node[:, 4] = -north_node[:, 4]
+        else:
+            positions[:, planet_index] = body_data[:, body_names.index(planet_name)]
+
+    return positions
+
+
+@instrumented('houses')
+def compute_houses(jd, location_latitude, location_longitude, house_system_code):
+    """
+    Calculates the house cusps and the chart angles for a given Julian Day and location
+    with a single call to the Swiss Ephemeris. Results are memoized, so the thin helper
+    functions below (Ascendant, Midheaven, Descendant, IC and cusps) share the same
+    ephemeris call for a given chart.
 
     Parameters:
     - jd (float): The Julian Day for the calculation.
@@ -167,17 +388,49 @@ def calculate_ascendant(jd, location_latitude, location_longitude, house_system_
     - house_system_code (str): The code for the house system to use.
 
     Returns:
-    - float: The ecliptic longitude of the Ascendant in degrees.
+    - ChartAngles: An immutable namedtuple with the twelve house cusps and the
+                   ecliptic longitudes of the Ascendant, Midheaven, Descendant,
+                   Imum Coeli, Vertex and the ARMC (sidereal time in degrees).
     """
-    # Calculate the houses using the Swiss Ephemeris library
+    return _compute_houses(float(jd), float(location_latitude), float(location_longitude), house_system_code)
+
+
+@lru_cache(maxsize=HOUSES_CACHE_SIZE)
+@instrumented('houses_calculated')
+def _compute_houses(jd, location_latitude, location_longitude, house_system_code):
     cusps, ascmc = swis_eph.houses(
         jd, location_latitude, location_longitude, house_system_code.encode('utf-8'))
 
-    # The Ascendant is the first house cusp in most house systems
-    # Ascendant is always the first element in the ascmc array
+    # ascmc holds the Ascendant, Midheaven, ARMC and Vertex, in that order
     ascendant = ascmc[0]
+    midheaven = ascmc[1]
+
+    return ChartAngles(
+        cusps=tuple(cusps),
+        ascendant=ascendant,
+        midheaven=midheaven,
+        # The Descendant and IC are 180 degrees opposite the Ascendant and Midheaven
+        descendant=(ascendant + 180) % 360,
+        ic=(midheaven + 180) % 360,
+        vertex=ascmc[3],
+        armc=ascmc[2],
+    )
 
-    return ascendant
+
+def calculate_ascendant(jd, location_latitude, location_longitude, house_system_code):
+    """
+    Calculates the Ascendant degrees for a given Julian Day and location.
+
+    Parameters:
+    - jd (float): The Julian Day for the calculation.
+    - location_latitude (float): The latitude of the location.
+    - location_longitude (float): The longitude of the location.
+    - house_system_code (str): The code for the house system to use.
+
+    Returns:
+    - float: The ecliptic longitude of the Ascendant in degrees.
+    """
+    return compute_houses(jd, location_latitude, location_longitude, house_system_code).ascendant
 
 
 def calculate_midheaven(jd, location_latitude, location_longitude, house_system_code):
@@ -193,14 +446,7 @@ def calculate_midheaven(jd, location_latitude, location_longitude, house_system_
     Returns:
     - float: The ecliptic longitude of the Midheaven in degrees.
     """
-    # Calculate the houses using the Swiss Ephemeris library
-    cusps, ascmc = swis_eph.houses(
-        jd, location_latitude, location_longitude, house_system_code.encode('utf-8'))
-
-    # The Midheaven (MC) is the second element in the ascmc array
-    midheaven = ascmc[1]
-
-    return midheaven
+    return compute_houses(jd, location_latitude, location_longitude, house_system_code).midheaven
 
 
 def calculate_descendant(jd, location_latitude, location_longitude, house_system_code):
@@ -216,17 +462,7 @@ def calculate_descendant(jd, location_latitude, location_longitude, house_system
     Returns:
     - float: The ecliptic longitude of the Descendant in degrees.
     """
-    # Calculate the houses using the Swiss Ephemeris library
-    cusps, ascmc = swis_eph.houses(
-        jd, location_latitude, location_longitude, house_system_code.encode('utf-8'))
-
-    # The Ascendant (ASC) is the first element in the ascmc array
-    ascendant = ascmc[0]
-
-    # The Descendant (DC) is 180 degrees opposite the Ascendant
-    descendant = (ascendant + 180) % 360
-
-    return descendant
+    return compute_houses(jd, location_latitude, location_longitude, house_system_code).descendant
 
 
 def calculate_ic(jd, location_latitude, location_longitude, house_system_code):
@@ -242,17 +478,7 @@ def calculate_ic(jd, location_latitude, location_longitude, house_system_code):
     Returns:
     - float: The ecliptic longitude of the Imum Coeli in degrees.
     """
-    # Calculate the houses using the Swiss Ephemeris library
-    cusps, ascmc = swis_eph.houses(
-        jd, location_latitude, location_longitude, house_system_code.encode('utf-8'))
-
-    # The Midheaven (MC) is the second element in the ascmc array
-    midheaven = ascmc[1]
-
-    # The IC (Imum Coeli) is 180 degrees opposite the Midheaven
-    ic = (midheaven + 180) % 360
-
-    return ic
+    return compute_houses(jd, location_latitude, location_longitude, house_system_code).ic
 
 
 def calculate_house_cusps(jd, location_latitude, location_longitude, house_system_code):
@@ -266,9 +492,7 @@ def calculate_house_cusps(jd, location_latitude, location_longitude, house_syste
         house_system_code (str): Code of the house system to use.
 
     Returns:
-        list: A list of floats representing the ecliptic longitudes of the twelve house cusps, including the Ascendant.
+        tuple: A tuple of floats representing the ecliptic longitudes of the twelve house cusps, including the Ascendant.
     """
-    cusps, ascmc = swis_eph.houses(
-        jd, location_latitude, location_longitude, house_system_code.encode('utf-8'))
-    # The first value in the cusps array is the Ascendant, which is also the cusp of the first house
-    return cusps
+    # The first value in the cusps tuple is the Ascendant, which is also the cusp of the first house
+    return compute_houses(jd, location_latitude, location_longitude, house_system_code).cusps
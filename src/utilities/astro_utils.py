@@ -1,5 +1,142 @@
 import datetime
 
+import numpy as np
+
+
+# The twelve zodiac signs in order; a sign's index times 30 is the longitude where it begins
+ZODIAC_SIGNS = ('Aries', 'Taurus', 'Gemini', 'Cancer', 'Leo', 'Virgo',
+                'Libra', 'Scorpio', 'Sagittarius', 'Capricorn', 'Aquarius', 'Pisces')
+
+# The seven traditional planets. Bound and decan rulers are coded by their index in this tuple
+TRADITIONAL_PLANETS = ('Sun', 'Moon', 'Mercury', 'Venus', 'Mars', 'Jupiter', 'Saturn')
+
+# Ptolemaic bounds of each sign, as (start degree, end degree, ruler)
+PTOLEMAIC_BOUNDS = {
+    'Aries': [
+        (0, 6, 'Jupiter'),
+        (6, 14, 'Venus'),
+        (14, 21, 'Mercury'),
+        (21, 26, 'Mars'),
+        (26, 30, 'Saturn')
+    ],
+    'Taurus': [
+        (0, 8, 'Venus'),
+        (8, 15, 'Mercury'),
+        (15, 22, 'Jupiter'),
+        (22, 26, 'Saturn'),
+        (26, 30, 'Mars'),
+    ],
+    'Gemini': [
+        (0, 7, 'Mercury'),
+        (7, 14, 'Jupiter'),
+        (14, 21, 'Venus'),
+        (21, 25, 'Saturn'),
+        (25, 30, 'Mars'),
+    ],
+    'Cancer': [
+        (0, 6, 'Mars'),
+        (6, 13, 'Jupiter'),
+        (13, 20, 'Mercury'),
+        (20, 27, 'Venus'),
+        (27, 30, 'Saturn'),
+    ],
+    'Leo': [
+        (0, 6, 'Saturn'),
+        (6, 13, 'Mercury'),
+        (13, 19, 'Venus'),
+        (19, 25, 'Jupiter'),
+        (25, 30, 'Mars'),
+    ],
+    'Virgo': [
+        (0, 7, 'Mercury'),
+        (7, 13, 'Venus'),
+        (13, 18, 'Jupiter'),
+        (18, 24, 'Saturn'),
+        (24, 30, 'Mars'),
+    ],
+    'Libra': [
+        (0, 6, 'Saturn'),
+        (6, 11, 'Venus'),
+        (11, 19, 'Jupiter'),
+        (19, 24, 'Mercury'),
+        (24, 30, 'Mars'),
+    ],
+    'Scorpio': [
+        (0, 6, 'Mars'),
+        (6, 14, 'Jupiter'),
+        (14, 21, 'Venus'),
+        (21, 27, 'Mercury'),
+        (27, 30, 'Saturn'),
+    ],
+    'Sagittarius': [
+        (0, 8, 'Jupiter'),
+        (8, 14, 'Venus'),
+        (14, 19, 'Mercury'),
+        (19, 25, 'Saturn'),
+        (25, 30, 'Mars'),
+    ],
+    'Capricorn': [
+        (0, 6, 'Venus'),
+        (6, 12, 'Mercury'),
+        (12, 19, 'Jupiter'),
+        (19, 25, 'Mars'),
+        (25, 30, 'Saturn'),
+    ],
+    'Aquarius': [
+        (0, 6, 'Saturn'),
+        (6, 12, 'Mercury'),
+        (12, 20, 'Venus'),
+        (20, 25, 'Jupiter'),
+        (25, 30, 'Mars'),
+    ],
+    'Pisces': [
+        (0, 8, 'Venus'),
+        (8, 14, 'Jupiter'),
+        (14, 20, 'Mercury'),
+        (20, 26, 'Mars'),
+        (26, 30, 'Saturn'),
+    ]
+}
+
+# Decans (faces) of each sign in the Chaldean order, as (ruler, start degree, end degree)
+TRADITIONAL_DECANS = {
+    'Aries': [('Mars', 0, 10), ('Sun', 10, 20), ('Venus', 20, 30)],
+    'Taurus': [('Mercury', 0, 10), ('Moon', 10, 20), ('Saturn', 20, 30)],
+    'Gemini': [('Jupiter', 0, 10), ('Mars', 10, 20), ('Sun', 20, 30)],
+    'Cancer': [('Venus', 0, 10), ('Mercury', 10, 20), ('Moon', 20, 30)],
+    'Leo': [('Saturn', 0, 10), ('Jupiter', 10, 20), ('Mars', 20, 30)],
+    'Virgo': [('Sun', 0, 10), ('Venus', 10, 20), ('Mercury', 20, 30)],
+    'Libra': [('Moon', 0, 10), ('Saturn', 10, 20), ('Jupiter', 20, 30)],
+    'Scorpio': [('Mars', 0, 10), ('Sun', 10, 20), ('Venus', 20, 30)],
+    'Sagittarius': [('Mercury', 0, 10), ('Moon', 10, 20), ('Saturn', 20, 30)],
+    'Capricorn': [('Jupiter', 0, 10), ('Mars', 10, 20), ('Sun', 20, 30)],
+    'Aquarius': [('Venus', 0, 10), ('Mercury', 10, 20), ('Moon', 20, 30)],
+    'Pisces': [('Saturn', 0, 10), ('Jupiter', 10, 20), ('Mars', 20, 30)]
+}
+
+
+def _build_degree_table():
+    # One row per whole degree of the zodiac: sign index, bound ruler index, decan ruler index
+    table = np.empty((360, 3), dtype=np.int8)
+    for sign_index, sign in enumerate(ZODIAC_SIGNS):
+        for start, end, ruler in PTOLEMAIC_BOUNDS[sign]:
+            table[sign_index * 30 + start:sign_index * 30 + end, 1] = TRADITIONAL_PLANETS.index(ruler)
+        for ruler, start, end in TRADITIONAL_DECANS[sign]:
+            table[sign_index * 30 + start:sign_index * 30 + end, 2] = TRADITIONAL_PLANETS.index(ruler)
+        table[sign_index * 30:sign_index * 30 + 30, 0] = sign_index
+    table.setflags(write=False)
+    return table
+
+
+# Precomputed classification of every whole degree of the zodiac, indexed by int(longitude).
+# Columns are the sign index (into ZODIAC_SIGNS), and the bound and decan ruler indices
+# (into TRADITIONAL_PLANETS). Bound and decan borders all fall on whole degrees
+DEGREE_TABLE = _build_degree_table()
+
+_SIGN_INDICES = {sign: index for index, sign in enumerate(ZODIAC_SIGNS)}
+_BOUND_RULERS = tuple(TRADITIONAL_PLANETS[index] for index in DEGREE_TABLE[:, 1].tolist())
+_DECAN_RULERS = tuple(TRADITIONAL_PLANETS[index] for index in DEGREE_TABLE[:, 2].tolist())
+
 
 def get_zodiac_sign(ecliptic_longitude):
     """
@@ -11,28 +148,12 @@ def get_zodiac_sign(ecliptic_longitude):
     Returns:
     - str: The name of the zodiac sign that corresponds to the given ecliptic longitude.
     """
-    zodiac_signs = [
-        ("Aries", 0, 30),
-        ("Taurus", 30, 60),
-        ("Gemini", 60, 90),
-        ("Cancer", 90, 120),
-        ("Leo", 120, 150),
-        ("Virgo", 150, 180),
-        ("Libra", 180, 210),
-        ("Scorpio", 210, 240),
-        ("Sagittarius", 240, 270),
-        ("Capricorn", 270, 300),
-        ("Aquarius", 300, 330),
-        ("Pisces", 330, 360)
-    ]
-
     # Normalize the ecliptic longitude to the range [0, 360)
     ecliptic_longitude %= 360
 
-    # Find the zodiac sign corresponding to the ecliptic longitude
-    for sign, start_degree, end_degree in zodiac_signs:
-        if start_degree <= ecliptic_longitude < end_degree:
-            return sign
+    # Each sign spans 30 degrees. The extra modulo guards against tiny negative
+    # longitudes, which round up to exactly 360 above
+    return ZODIAC_SIGNS[int(ecliptic_longitude // 30) % 12]
 
 
 def get_sign_degrees(ecliptic_longitude):
@@ -60,32 +181,16 @@ def get_sign_degrees(ecliptic_longitude):
     ValueError: Invalid ecliptic longitude
     """
 
-    zodiac_signs = [
-        ("Aries", 0, 30),
-        ("Taurus", 30, 60),
-        ("Gemini", 60, 90),
-        ("Cancer", 90, 120),
-        ("Leo", 120, 150),
-        ("Virgo", 150, 180),
-        ("Libra", 180, 210),
-        ("Scorpio", 210, 240),
-        ("Sagittarius", 240, 270),
-        ("Capricorn", 270, 300),
-        ("Aquarius", 300, 330),
-        ("Pisces", 330, 360)
-    ]
-
     # Normalize ecliptic longitude if it is 360 degrees
     if ecliptic_longitude >= 360:
         ecliptic_longitude %= 360
 
-    # Find the zodiac sign and calculate the degree within that sign
-    for sign, start, end in zodiac_signs:
-        if start <= ecliptic_longitude < end:
-            return ecliptic_longitude - start
+    # Handle invalid longitude values (negative, NaN or non-numeric)
+    if not 0 <= ecliptic_longitude < 360:
+        raise ValueError("Invalid ecliptic longitude")
 
-    # Handle invalid longitude values
-    raise ValueError("Invalid ecliptic longitude")
+    # The degree within the sign is what is left past the sign's 30 degree boundary
+    return ecliptic_longitude - (ecliptic_longitude // 30) * 30
 
 
 def is_day_chart(sun_longitude, ascendant_longitude):
@@ -158,99 +263,10 @@ def get_ptolemaic_bound_ruler(sign, degree):
     Note:
     The bounds are defined based on the Ptolemaic system and vary for each sign. 
     """
-    bounds = {
-        'Aries': [
-            (0, 6, 'Jupiter'),
-            (6, 14, 'Venus'),
-            (14, 21, 'Mercury'),
-            (21, 26, 'Mars'),
-            (26, 30, 'Saturn')
-        ],
-        'Taurus': [
-            (0, 8, 'Venus'),
-            (8, 15, 'Mercury'),
-            (15, 22, 'Jupiter'),
-            (22, 26, 'Saturn'),
-            (26, 30, 'Mars'),
-        ],
-        'Gemini': [
-            (0, 7, 'Mercury'),
-            (7, 14, 'Jupiter'),
-            (14, 21, 'Venus'),
-            (21, 25, 'Saturn'),
-            (25, 30, 'Mars'),
-        ],
-        'Cancer': [
-            (0, 6, 'Mars'),
-            (6, 13, 'Jupiter'),
-            (13, 20, 'Mercury'),
-            (20, 27, 'Venus'),
-            (27, 30, 'Saturn'),
-        ],
-        'Leo': [
-            (0, 6, 'Saturn'),
-            (6, 13, 'Mercury'),
-            (13, 19, 'Venus'),
-            (19, 25, 'Jupiter'),
-            (25, 30, 'Mars'),
-        ],
-        'Virgo': [
-            (0, 7, 'Mercury'),
-            (7, 13, 'Venus'),
-            (13, 18, 'Jupiter'),
-            (18, 24, 'Saturn'),
-            (24, 30, 'Mars'),
-        ],
-        'Libra': [
-            (0, 6, 'Saturn'),
-            (6, 11, 'Venus'),
-            (11, 19, 'Jupiter'),
-            (19, 24, 'Mercury'),
-            (24, 30, 'Mars'),
-        ],
-        'Scorpio': [
-            (0, 6, 'Mars'),
-            (6, 14, 'Jupiter'),
-            (14, 21, 'Venus'),
-            (21, 27, 'Mercury'),
-            (27, 30, 'Saturn'),
-        ],
-        'Sagittarius': [
-            (0, 8, 'Jupiter'),
-            (8, 14, 'Venus'),
-            (14, 19, 'Mercury'),
-            (19, 25, 'Saturn'),
-            (25, 30, 'Mars'),
-        ],
-        'Capricorn': [
-            (0, 6, 'Venus'),
-            (6, 12, 'Mercury'),
-            (12, 19, 'Jupiter'),
-            (19, 25, 'Mars'),
-            (25, 30, 'Saturn'),
-        ],
-        'Aquarius': [
-            (0, 6, 'Saturn'),
-            (6, 12, 'Mercury'),
-            (12, 20, 'Venus'),
-            (20, 25, 'Jupiter'),
-            (25, 30, 'Mars'),
-        ],
-        'Pisces': [
-            (0, 8, 'Venus'),
-            (8, 14, 'Jupiter'),
-            (14, 20, 'Mercury'),
-            (20, 26, 'Mars'),
-            (26, 30, 'Saturn'),
-        ]
-    }
-
-    # Check if the sign is in the dictionary
-    if sign in bounds:
-        # Iterate over the bounds for the given sign
-        for lower_bound, upper_bound, ruler in bounds[sign]:
-            if lower_bound <= degree < upper_bound:
-                return ruler
+    # Look up the degree in the precomputed table, if the sign and degree are valid
+    sign_index = _SIGN_INDICES.get(sign)
+    if sign_index is not None and 0 <= degree < 30:
+        return _BOUND_RULERS[sign_index * 30 + int(degree)]
 
     # If the sign is not found or degree is out of bounds, return an error message
     return "Invalid sign or degree"
@@ -269,27 +285,56 @@ def get_traditional_decan(sign, sign_degrees):
     Returns None if the sign is not recognized or if the degree is out of bounds.
     """
 
-    decans = {
-        'Aries': [('Mars', 0, 10), ('Sun', 10, 20), ('Venus', 20, 30)],
-        'Taurus': [('Mercury', 0, 10), ('Moon', 10, 20), ('Saturn', 20, 30)],
-        'Gemini': [('Jupiter', 0, 10), ('Mars', 10, 20), ('Sun', 20, 30)],
-        'Cancer': [('Venus', 0, 10), ('Mercury', 10, 20), ('Moon', 20, 30)],
-        'Leo': [('Saturn', 0, 10), ('Jupiter', 10, 20), ('Mars', 20, 30)],
-        'Virgo': [('Sun', 0, 10), ('Venus', 10, 20), ('Mercury', 20, 30)],
-        'Libra': [('Moon', 0, 10), ('Saturn', 10, 20), ('Jupiter', 20, 30)],
-        'Scorpio': [('Mars', 0, 10), ('Sun', 10, 20), ('Venus', 20, 30)],
-        'Sagittarius': [('Mercury', 0, 10), ('Moon', 10, 20), ('Saturn', 20, 30)],
-        'Capricorn': [('Jupiter', 0, 10), ('Mars', 10, 20), ('Sun', 20, 30)],
-        'Aquarius': [('Venus', 0, 10), ('Mercury', 10, 20), ('Moon', 20, 30)],
-        'Pisces': [('Saturn', 0, 10), ('Jupiter', 10, 20), ('Mars', 20, 30)]
-    }
-
-    for ruler, start, end in decans.get(sign, []):
-        if start <= sign_degrees < end:
-            return ruler  # Returning only the ruler of the decan
+    # Look up the degree in the precomputed table, if the sign and degree are valid
+    sign_index = _SIGN_INDICES.get(sign)
+    if sign_index is not None and 0 <= sign_degrees < 30:
+        return _DECAN_RULERS[sign_index * 30 + int(sign_degrees)]
     return None
 
 
+def classify_longitude(ecliptic_longitude):
+    """
+    Classifies a single ecliptic longitude by zodiac sign, Ptolemaic bound and traditional decan
+    with one table lookup.
+
+    Parameters:
+    - ecliptic_longitude (float): The ecliptic longitude in degrees.
+
+    Returns:
+    - tuple: The sign name, the sign degrees, the bound ruler and the decan ruler
+             (e.g., ('Aries', 15.2, 'Mercury', 'Sun')).
+    """
+    ecliptic_longitude %= 360
+    # A tiny negative longitude rounds up to exactly 360 above, which is 0 degrees Aries
+    if ecliptic_longitude >= 360:
+        ecliptic_longitude = 0.0
+    degree_index = int(ecliptic_longitude)
+    sign_index = degree_index // 30
+
+    return (ZODIAC_SIGNS[sign_index], ecliptic_longitude - sign_index * 30,
+            _BOUND_RULERS[degree_index], _DECAN_RULERS[degree_index])
+
+
+def classify_longitudes(ecliptic_longitudes):
+    """
+    Classifies many ecliptic longitudes at once by zodiac sign, Ptolemaic bound and traditional
+    decan. The results are integer codes: signs index into ZODIAC_SIGNS, and bound and decan
+    rulers index into TRADITIONAL_PLANETS.
+
+    Parameters:
+    - ecliptic_longitudes (array-like): Ecliptic longitudes in degrees, of any shape.
+
+    Returns:
+    - tuple: Three int8 arrays with the same shape as the input: the sign index, the bound
+             ruler index and the decan ruler index of each longitude.
+    """
+    ecliptic_longitudes = np.asarray(ecliptic_longitudes, dtype=np.float64)
+    degree_index = np.floor(ecliptic_longitudes % 360).astype(np.intp) % 360
+    classification = DEGREE_TABLE[degree_index]
+
+    return classification[..., 0], classification[..., 1], classification[..., 2]
+
+
 def get_house_system_code(house_system_name):
     """
     Converts a house system name to the corresponding Swiss Ephemeris code.
@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+from geopy.adapters import AioHTTPAdapter
+from geopy.exc import GeocoderRateLimited, GeocoderTimedOut, GeocoderUnavailable
+from geopy.geocoders import Nominatim
+from utilities.geocode_cache import get_default_geocode_cache, normalize_place_name
+
+
+# Nominatim's usage policy allows at most one request per second
+# (https://operations.osmfoundation.org/policies/nominatim/)
+NOMINATIM_REQUESTS_PER_SECOND = 1.0
+
+# Number of times a query is retried after a timeout, an unavailable server or a rate limit
+GEOCODE_MAX_RETRIES = 2
+
+# Seconds to wait before the first retry; each further retry waits twice as long
+GEOCODE_RETRY_DELAY = 2.0
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket: tokens are added at a steady rate up to a capacity, and each
+    request takes one, waiting until one is available. Waiting requests are served in order.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        Parameters:
+        - rate (float): Tokens added per second, i.e. the sustained request rate.
+        - capacity (int): The most tokens that can be saved up, i.e. the largest burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncGeocoder:
+    """
+    An asyncio Nominatim client for resolving many places at once. Queries are sent as fast
+    as the token bucket allows, never faster than Nominatim's usage policy, with the waiting
+    overlapping the requests in flight. A place that is already being looked up is not queried
+    again: later callers wait for the same result. Results are written to the geocoding cache,
+    and places already in the cache are never queried.
+
+    Use it as an async context manager, which opens and closes the HTTP session:
+
+        async with AsyncGeocoder() as geocoder:
+            locations = await geocoder.geocode_many([('Paris', 'France'), ('Lima', 'Peru')])
+    """
+
+    def __init__(self, cache=None, rate=NOMINATIM_REQUESTS_PER_SECOND, burst=1,
+                 domain='nominatim.openstreetmap.org', scheme='https',
+                 user_agent="AstrologyAppProject", timeout=10, max_retries=GEOCODE_MAX_RETRIES):
+        """
+        Parameters:
+        - cache (GeocodeCache): The geocoding cache to use. Defaults to the shared on-disk cache.
+        - rate (float): Maximum queries per second.
+        - burst (int): Maximum number of queries sent at once after a quiet period.
+        - domain (str): Host (and port) of the Nominatim server, e.g. 'localhost:8080' for a
+                        local Nominatim or a stand-in server in tests.
+        - scheme (str): 'https' or 'http'.
+        - user_agent (str): The User-Agent Nominatim's usage policy requires.
+        - timeout (float): Seconds to wait for each response.
+        - max_retries (int): Retries after a timeout, an unavailable server or a rate limit.
+        """
+        self.cache = cache if cache is not None else get_default_geocode_cache()
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._geolocator = Nominatim(
+            user_agent=user_agent, domain=domain, scheme=scheme, timeout=timeout,
+            adapter_factory=AioHTTPAdapter)
+        self._in_flight = {}
+        self.statistics = {'cache_hits': 0, 'queries': 0, 'coalesced': 0, 'retries': 0}
+
+    async def __aenter__(self):
+        await self._geolocator.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._geolocator.__aexit__(exc_type, exc_value, traceback)
+
+    async def geocode(self, city, country):
+        """
+        Looks up the coordinates of a city, like get_coordinates.
+
+        Parameters:
+        - city (str): The city's name.
+        - country (str): The country's name.
+
+        Returns:
+        - list: A list of locations with latitude, longitude and address attributes, or None
+                if no matches are found.
+        """
+        locations = self.cache.lookup(city, country)
+        if locations is not None:
+            self.statistics['cache_hits'] += 1
+            return locations
+
+        key = normalize_place_name(city, country)
+        query = self._in_flight.get(key)
+        if query is not None:
+            self.statistics['coalesced'] += 1
+        else:
+            query = self._in_flight[key] = asyncio.ensure_future(self._query(city, country))
+            query.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Cancelling one caller must not cancel the query the other callers are waiting for
+        return await asyncio.shield(query)
+
+    async def geocode_many(self, places, return_exceptions=False):
+        """
+        Looks up many places concurrently.
+
+        Parameters:
+        - places (iterable): (city, country) pairs.
+        - return_exceptions (bool): If True, a place whose lookup fails gets the exception as
+                                    its result instead of the failure stopping the whole batch.
+
+        Returns:
+        - list: The result of geocode for each place, in the same order.
+        """
+        return await asyncio.gather(
+            *(self.geocode(city, country) for city, country in places),
+            return_exceptions=return_exceptions)
+
+    async def _query(self, city, country):
+        delay = GEOCODE_RETRY_DELAY
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            self.statistics['queries'] += 1
+            try:
+                locations = await self._geolocator.geocode(
+                    f"{city}, {country}", exactly_one=False, language='en')
+                break
+            except (GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited) as error:
+                if attempt == self.max_retries:
+                    raise
+                self.statistics['retries'] += 1
+                await asyncio.sleep(getattr(error, 'retry_after', None) or delay)
+                delay *= 2
+
+        if locations:
+            self.cache.store(city, country, locations)
+        return locations or None
+
+
+def geocode_places(places, return_exceptions=False, **options):
+    """
+    Looks up many places with an AsyncGeocoder, for callers that are not themselves async.
+
+    Parameters:
+    - places (iterable): (city, country) pairs.
+    - return_exceptions (bool): If True, failed lookups give their exception as the result.
+    - options: Further keyword arguments for AsyncGeocoder (e.g., domain='localhost:8080').
+
+    Returns:
+    - list: The locations found for each place, or None where nothing was found.
+    """
+    async def run():
+        async with AsyncGeocoder(**options) as geocoder:
+            return await geocoder.geocode_many(places, return_exceptions)
+
+    return asyncio.run(run())
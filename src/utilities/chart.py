@@ -0,0 +1,428 @@
+import struct
+from enum import IntEnum
+
+import numpy as np
+from utilities.astro_calculations import ChartAngles, compute_houses
+from utilities.astro_utils import TRADITIONAL_PLANETS, ZODIAC_SIGNS, classify_longitudes
+from utilities.dignity_utils import (
+    DIGNITY_NAMES, ESSENTIAL_DIGNITIES, MOTION_STATES, calculate_motion_states, score_dignities)
+from utilities.ephemeris_backend import get_ephemeris_backend
+
+
+# The bodies of a chart, in the order of the Planet enum; the first seven are TRADITIONAL_PLANETS
+CHART_BODIES = TRADITIONAL_PLANETS + ('North Node', 'South Node')
+
+
+class Planet(IntEnum):
+    """
+    The bodies of a chart. The values index the per-body columns of Chart and ChartBatch.
+    Planet() also accepts the body names used in the rest of this software, e.g. Planet('Mars').
+    """
+    SUN = 0
+    MOON = 1
+    MERCURY = 2
+    VENUS = 3
+    MARS = 4
+    JUPITER = 5
+    SATURN = 6
+    NORTH_NODE = 7
+    SOUTH_NODE = 8
+
+    @property
+    def label(self):
+        """The body's name as used in the rest of this software (e.g., 'North Node')."""
+        return CHART_BODIES[self]
+
+    @classmethod
+    def _missing_(cls, value):
+        if value in CHART_BODIES:
+            return cls(CHART_BODIES.index(value))
+        return None
+
+
+# The seven traditional planets, which have dignities, bounds, decans and motion states
+TRADITIONAL_PLANET_COUNT = len(TRADITIONAL_PLANETS)
+
+# Layout of one chart. A Chart is a view of one such record and a ChartBatch an array of them.
+# Per-body columns are indexed by Planet; the traditional planet columns stop at Saturn.
+# 'angles' holds the ascendant, midheaven, descendant, IC, vertex and ARMC, as in ChartAngles
+CHART_DTYPE = np.dtype([
+    ('jd', np.float64),
+    ('latitude', np.float64),
+    ('longitude', np.float64),
+    ('house_system', 'S1'),
+    ('day_chart', np.bool_),
+    ('positions', np.float64, (len(CHART_BODIES), 6)),
+    ('signs', np.int8, (len(CHART_BODIES),)),
+    ('bounds', np.int8, (TRADITIONAL_PLANET_COUNT,)),
+    ('decans', np.int8, (TRADITIONAL_PLANET_COUNT,)),
+    ('motions', np.int8, (TRADITIONAL_PLANET_COUNT,)),
+    ('dignity_flags', np.uint8, (TRADITIONAL_PLANET_COUNT,)),
+    ('dignity_scores', np.int16, (TRADITIONAL_PLANET_COUNT,)),
+    ('cusps', np.float64, (12,)),
+    ('angles', np.float64, (6,)),
+])
+
+# Version of the binary chart record written by Chart.to_bytes and to chart archives. It
+# changes whenever CHART_DTYPE does, so records written by an older layout are rejected
+# rather than misread
+CHART_RECORD_VERSION = 1
+
+# CHART_DTYPE with every field little-endian: the layout of binary chart records, which
+# read the same on any machine. On little-endian machines it equals CHART_DTYPE
+CHART_RECORD_DTYPE = CHART_DTYPE.newbyteorder('<')
+
+# Prefix of a record written by Chart.to_bytes: the record version
+_RECORD_PREFIX = struct.Struct('<H')
+
+
+class Chart:
+    """
+    A calculated horary chart: the positions and speeds of the planets and Lunar Nodes, their
+    signs, bounds, decans, motion and essential dignities, and the house cusps and angles.
+    The data is one CHART_DTYPE record, so a Chart can be pickled, cached or handed to a
+    ChartBatch without copying its fields one by one. Body accessors take a Planet or a body
+    name (e.g., 'Mars').
+    """
+    __slots__ = ('record',)
+
+    def __init__(self, record):
+        """
+        Parameters:
+        - record (numpy.ndarray): A 0-dimensional CHART_DTYPE array, e.g. a row of a ChartBatch.
+        """
+        self.record = record
+
+    @classmethod
+    def calculate(cls, jd, location_latitude, location_longitude, house_system_code, backend=None):
+        """
+        Calculates a chart.
+
+        Parameters:
+        - jd (float): The Julian Day of the chart.
+        - location_latitude (float): Geographic latitude of the observation point in degrees.
+        - location_longitude (float): Geographic longitude of the observation point in degrees.
+        - house_system_code (str): The code for the house system to use.
+        - backend (EphemerisBackend): Where the positions come from. Defaults to the
+                                      configured backend (see configure_ephemeris_backend).
+
+        Returns:
+        - Chart: The calculated chart.
+        """
+        return ChartBatch.calculate(
+            [jd], location_latitude, location_longitude, house_system_code, backend)[0]
+
+    def __repr__(self):
+        return (f"Chart(jd={self.jd}, latitude={self.latitude}, longitude={self.longitude}, "
+                f"house_system='{self.house_system}')")
+
+    def __getstate__(self):
+        return self.record.copy()
+
+    def __setstate__(self, state):
+        self.record = state
+
+    @property
+    def jd(self):
+        return float(self.record['jd'])
+
+    @property
+    def latitude(self):
+        return float(self.record['latitude'])
+
+    @property
+    def longitude(self):
+        return float(self.record['longitude'])
+
+    @property
+    def house_system(self):
+        return self.record['house_system'].item().decode()
+
+    @property
+    def day_chart(self):
+        return bool(self.record['day_chart'])
+
+    @property
+    def angles(self):
+        """The house cusps and angles, as returned by compute_houses."""
+        return ChartAngles(tuple(self.record['cusps'].tolist()), *self.record['angles'].tolist())
+
+    @property
+    def dignity_total(self):
+        """The sum of the traditional planets' essential dignity points."""
+        return int(self.record['dignity_scores'].sum())
+
+    def ecliptic_longitude(self, planet):
+        return float(self.record['positions'][Planet(planet), 0])
+
+    def speed(self, planet):
+        """The body's daily speed in longitude in degrees."""
+        return float(self.record['positions'][Planet(planet), 3])
+
+    def sign(self, planet):
+        return ZODIAC_SIGNS[self.record['signs'][Planet(planet)]]
+
+    def sign_degrees(self, planet):
+        return self.ecliptic_longitude(planet) % 30
+
+    def bound(self, planet):
+        """The ruler of the Ptolemaic bound a traditional planet is in."""
+        return TRADITIONAL_PLANETS[self.record['bounds'][Planet(planet)]]
+
+    def decan(self, planet):
+        """The ruler of the traditional decan a traditional planet is in."""
+        return TRADITIONAL_PLANETS[self.record['decans'][Planet(planet)]]
+
+    def motion(self, planet):
+        """The motion of a traditional planet, as a name from MOTION_STATES."""
+        return MOTION_STATES[self.record['motions'][Planet(planet)]]
+
+    def dignity_flags(self, planet):
+        """The DIGNITY_* bitmask of a traditional planet, as from score_dignities."""
+        return int(self.record['dignity_flags'][Planet(planet)])
+
+    def dignities(self, planet):
+        """The names of a traditional planet's dignities and debilities, from DIGNITY_NAMES."""
+        flags = self.dignity_flags(planet)
+        return [name for flag, name in DIGNITY_NAMES if flags & flag]
+
+    def dignity_score(self, planet):
+        """A traditional planet's essential dignity points, as from score_dignities."""
+        return int(self.record['dignity_scores'][Planet(planet)])
+
+    def is_peregrine(self, planet):
+        """Whether a traditional planet has none of the five essential dignities."""
+        return not self.dignity_flags(planet) & ESSENTIAL_DIGNITIES
+
+    def to_dict(self):
+        """
+        Returns the chart as a JSON-serializable dict, with the bodies keyed by name.
+        """
+        bodies = {}
+        for planet in Planet:
+            body = {
+                'longitude': self.ecliptic_longitude(planet),
+                'speed': self.speed(planet),
+                'sign': self.sign(planet),
+                'sign_degrees': self.sign_degrees(planet),
+            }
+            if planet < TRADITIONAL_PLANET_COUNT:
+                body.update(
+                    bound=self.bound(planet),
+                    decan=self.decan(planet),
+                    motion=self.motion(planet),
+                    dignities=self.dignities(planet),
+                    peregrine=self.is_peregrine(planet),
+                    dignity_score=self.dignity_score(planet),
+                )
+            bodies[planet.label] = body
+
+        angles = self.angles
+        return {
+            'jd': self.jd,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'house_system': self.house_system,
+            'day_chart': self.day_chart,
+            'bodies': bodies,
+            'angles': {
+                'ascendant': angles.ascendant,
+                'midheaven': angles.midheaven,
+                'descendant': angles.descendant,
+                'ic': angles.ic,
+            },
+            'house_cusps': list(angles.cusps),
+            'dignity_total': self.dignity_total,
+        }
+
+    def to_bytes(self):
+        """
+        Returns the chart as a binary chart record: the record version as a little-endian
+        uint16, followed by the CHART_RECORD_DTYPE record.
+        """
+        return (_RECORD_PREFIX.pack(CHART_RECORD_VERSION)
+                + self.record.astype(CHART_RECORD_DTYPE).tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Reads a binary chart record written by to_bytes.
+
+        Parameters:
+        - data (bytes): The record.
+
+        Returns:
+        - Chart: The chart, in a copy of the record it can modify.
+        """
+        if len(data) != _RECORD_PREFIX.size + CHART_RECORD_DTYPE.itemsize:
+            raise ValueError(f"A chart record is {_RECORD_PREFIX.size + CHART_RECORD_DTYPE.itemsize} "
+                             f"bytes long, not {len(data)}.")
+        (version,) = _RECORD_PREFIX.unpack_from(data)
+        if version != CHART_RECORD_VERSION:
+            raise ValueError(f"Unsupported chart record version {version}; "
+                             f"this version reads version {CHART_RECORD_VERSION}.")
+        record = np.frombuffer(data, dtype=CHART_RECORD_DTYPE, offset=_RECORD_PREFIX.size)
+        return cls(record.astype(CHART_DTYPE).reshape(()))
+
+
+class ChartBatch:
+    """
+    Many charts stored column by column in one CHART_DTYPE structured array. Columns such as
+    all the charts' longitudes are plain NumPy views, and the whole batch can be handed to
+    another process or written out as a single buffer.
+    """
+    __slots__ = ('records',)
+
+    def __init__(self, records):
+        """
+        Parameters:
+        - records (numpy.ndarray): A 1-dimensional CHART_DTYPE array.
+        """
+        if records.dtype != CHART_DTYPE:
+            raise ValueError("ChartBatch records must have the CHART_DTYPE layout.")
+        self.records = records
+
+    @classmethod
+    def calculate(cls, jds, location_latitudes, location_longitudes, house_system_code,
+                  backend=None):
+        """
+        Calculates many charts. Charts at the same location share one ephemeris call, and the
+        signs, bounds, decans and dignities of all charts are looked up in single array
+        operations.
+
+        Parameters:
+        - jds (array-like): The Julian Day of each chart.
+        - location_latitudes (float or array-like): The latitude of each chart's location, or
+                                                    one latitude for all of them.
+        - location_longitudes (float or array-like): The longitude of each chart's location,
+                                                     or one longitude for all of them.
+        - house_system_code (str): The code for the house system to use.
+        - backend (EphemerisBackend): Where the positions come from. Defaults to the
+                                      configured backend (see configure_ephemeris_backend).
+
+        Returns:
+        - ChartBatch: The calculated charts, in the order of jds.
+        """
+        if backend is None:
+            backend = get_ephemeris_backend()
+
+        jds = np.atleast_1d(np.asarray(jds, dtype=np.float64))
+        records = np.zeros(len(jds), dtype=CHART_DTYPE)
+        records['jd'] = jds
+        records['latitude'] = location_latitudes
+        records['longitude'] = location_longitudes
+        records['house_system'] = house_system_code
+
+        # One ephemeris call per distinct location
+        locations, location_index = np.unique(
+            np.stack([records['latitude'], records['longitude']], axis=-1),
+            axis=0, return_inverse=True)
+        location_index = location_index.reshape(-1)
+        for index, (latitude, longitude) in enumerate(locations.tolist()):
+            rows = np.flatnonzero(location_index == index)
+            positions = backend.positions(jds[rows], CHART_BODIES, latitude, longitude)
+            records['positions'][rows] = positions
+            records['motions'][rows] = calculate_motion_states(
+                jds[rows], TRADITIONAL_PLANETS, latitude, longitude,
+                positions=positions[:, :TRADITIONAL_PLANET_COUNT], backend=backend)
+
+        for row, (jd, latitude, longitude) in enumerate(
+                zip(jds.tolist(), records['latitude'].tolist(), records['longitude'].tolist())):
+            chart_angles = compute_houses(jd, latitude, longitude, house_system_code)
+            records['cusps'][row] = chart_angles.cusps
+            records['angles'][row] = chart_angles[1:]
+
+        longitudes = records['positions'][..., 0]
+        ascendants = records['angles'][:, 0]
+        records['day_chart'] = _is_day_chart(longitudes[:, Planet.SUN], ascendants)
+
+        signs, bounds, decans = classify_longitudes(longitudes)
+        records['signs'] = signs
+        records['bounds'] = bounds[:, :TRADITIONAL_PLANET_COUNT]
+        records['decans'] = decans[:, :TRADITIONAL_PLANET_COUNT]
+
+        dignities = score_dignities(longitudes[:, :TRADITIONAL_PLANET_COUNT], records['day_chart'])
+        records['dignity_flags'] = dignities.flags
+        records['dignity_scores'] = dignities.scores
+
+        return cls(records)
+
+    @classmethod
+    def from_charts(cls, charts):
+        """
+        Gathers charts into a batch.
+
+        Parameters:
+        - charts (iterable): Chart objects.
+
+        Returns:
+        - ChartBatch: The batch, in the order of the charts.
+        """
+        return cls(np.array([chart.record for chart in charts], dtype=CHART_DTYPE))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ChartBatch(self.records[index])
+        # A 0-dimensional view, so the Chart shares the batch's memory
+        return Chart(self.records[index, ...])
+
+    def __iter__(self):
+        for index in range(len(self.records)):
+            yield self[index]
+
+    def __getstate__(self):
+        return self.records
+
+    def __setstate__(self, state):
+        self.records = state
+
+    def ecliptic_longitudes(self, planet=None):
+        """
+        The ecliptic longitudes of one body in every chart, or of all bodies as an
+        (n_chart, n_body) array if no planet is given.
+        """
+        longitudes = self.records['positions'][..., 0]
+        return longitudes if planet is None else longitudes[:, Planet(planet)]
+
+    def speeds(self, planet=None):
+        """
+        The daily speeds in longitude of one body in every chart, or of all bodies.
+        """
+        speeds = self.records['positions'][..., 3]
+        return speeds if planet is None else speeds[:, Planet(planet)]
+
+    def dignity_totals(self):
+        """The sum of the traditional planets' essential dignity points of each chart."""
+        return self.records['dignity_scores'].sum(axis=-1)
+
+    def ascendants(self):
+        """The ecliptic longitude of the Ascendant of each chart."""
+        return self.records['angles'][:, 0]
+
+    def midheavens(self):
+        """The ecliptic longitude of the Midheaven of each chart."""
+        return self.records['angles'][:, 1]
+
+    def house_positions(self, planet=None):
+        """
+        The house (1-12) one body is in in every chart, or all bodies as an (n_chart, n_body)
+        array if no planet is given. A body is in a house from its cusp up to the next cusp.
+        """
+        cusps = self.records['cusps']
+        widths = (np.roll(cusps, -1, axis=-1) - cusps) % 360
+        longitudes = self.ecliptic_longitudes()
+        distances = (longitudes[..., np.newaxis] - cusps[:, np.newaxis, :]) % 360
+        houses = (np.argmax(distances < widths[:, np.newaxis, :], axis=-1) + 1).astype(np.int8)
+        return houses if planet is None else houses[:, Planet(planet)]
+
+
+def _is_day_chart(sun_longitudes, ascendant_longitudes):
+    # Vectorized is_day_chart
+    descendant_longitudes = (ascendant_longitudes + 180) % 360
+    return np.where(
+        ascendant_longitudes < descendant_longitudes,
+        (ascendant_longitudes <= sun_longitudes) & (sun_longitudes < descendant_longitudes),
+        (sun_longitudes < descendant_longitudes) | (sun_longitudes >= ascendant_longitudes))
@@ -0,0 +1,216 @@
+import fcntl
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from numpy.lib.format import descr_to_dtype, dtype_to_descr
+from utilities.chart import CHART_DTYPE, CHART_RECORD_DTYPE, CHART_RECORD_VERSION, Chart, ChartBatch
+
+
+# First bytes of every chart archive file
+CHART_ARCHIVE_MAGIC = b'PTOLCHRT'
+
+# Version of the archive file layout: a header, the record layout as JSON, padding, and then
+# the binary chart records back to back with nothing in between
+CHART_ARCHIVE_VERSION = 1
+
+# Records start at a multiple of this many bytes from the start of the file, so the first one
+# is aligned however the archive is memory-mapped
+ARCHIVE_DATA_ALIGNMENT = 64
+
+# magic, archive version, record version, record size, offset of the first record, and
+# length of the JSON record layout that follows the header
+_ARCHIVE_HEADER = struct.Struct('<8sHHIII')
+
+
+class ChartArchive:
+    """
+    An append-only file of binary chart records (see Chart.to_bytes). After a short header,
+    the file is a plain array of CHART_RECORD_DTYPE records, so it can be memory-mapped and
+    scanned as a NumPy structured array without parsing, e.g. to find every archived chart
+    with the Moon in Cancer:
+
+        records = ChartArchive('charts.ptca').records()
+        moon_in_cancer = records[records['signs'][:, Planet.MOON] == 3]
+
+    Appends hold an exclusive flock on the file, so several processes can append to the same
+    archive. Readers take no lock and only see whole records. A record cut short by an
+    interrupted append is cut off by the next append, before it writes, so it never shifts
+    the records after it.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a chart archive, creating it if it does not exist.
+
+        Parameters:
+        - path (str): Path of the archive file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            with _file_lock(self._fd):
+                if os.fstat(self._fd).st_size == 0:
+                    _write_all(self._fd, _archive_header())
+            self.record_version, self.dtype, self.data_offset = _read_header(path, self._fd)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Closes the archive for appending. Arrays returned by records stay readable.
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __len__(self):
+        size = os.stat(self.path).st_size
+        return max(size - self.data_offset, 0) // self.dtype.itemsize
+
+    def append(self, charts):
+        """
+        Adds charts to the end of the archive.
+
+        Parameters:
+        - charts (Chart, ChartBatch or numpy.ndarray): A chart, a batch, or CHART_DTYPE records.
+
+        Returns:
+        - int: The number of charts added.
+        """
+        if self.record_version != CHART_RECORD_VERSION or self.dtype != CHART_RECORD_DTYPE:
+            raise ValueError(f"{self.path} holds chart records of version {self.record_version}; "
+                             f"only version {CHART_RECORD_VERSION} records can be added.")
+
+        if isinstance(charts, Chart):
+            records = charts.record.reshape(1)
+        elif isinstance(charts, ChartBatch):
+            records = charts.records
+        else:
+            records = np.asarray(charts).reshape(-1)
+        if records.dtype != CHART_DTYPE:
+            raise ValueError("Archived charts must have the CHART_DTYPE layout.")
+        if not len(records):
+            return 0
+
+        data = records.astype(CHART_RECORD_DTYPE).tobytes()
+        with self._lock:
+            if self._fd is None:
+                raise ValueError(f"The chart archive {self.path} is closed.")
+            with _file_lock(self._fd):
+                # Every append holds the lock, so a partial record at the end can only have
+                # been left by an append that was interrupted
+                size = os.fstat(self._fd).st_size
+                itemsize = self.dtype.itemsize
+                complete = self.data_offset + (size - self.data_offset) // itemsize * itemsize
+                if size > complete:
+                    os.ftruncate(self._fd, complete)
+                _write_all(self._fd, data)
+        return len(records)
+
+    def records(self):
+        """
+        Memory-maps the charts archived so far. Charts appended later are not included.
+
+        Returns:
+        - numpy.ndarray: A read-only 1-dimensional array of the archive's record layout,
+                         CHART_RECORD_DTYPE for current archives.
+        """
+        count = len(self)
+        if not count:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.data_offset,
+                         shape=(count,))
+
+    def batch(self):
+        """
+        Returns:
+        - ChartBatch: The charts archived so far, backed by the memory-mapped file on
+                      little-endian machines and read-only.
+        """
+        if self.record_version != CHART_RECORD_VERSION or self.dtype != CHART_RECORD_DTYPE:
+            raise ValueError(f"{self.path} holds chart records of version {self.record_version}, "
+                             f"which ChartBatch does not read.")
+        records = self.records()
+        if records.dtype != CHART_DTYPE:
+            # A big-endian machine, where the records are converted to its byte order
+            records = records.astype(CHART_DTYPE)
+        return ChartBatch(records)
+
+
+def read_chart_archive(path):
+    """
+    Memory-maps the records of a chart archive without opening it for appending.
+
+    Parameters:
+    - path (str): Path of the archive file.
+
+    Returns:
+    - numpy.ndarray: A read-only array of the archived records, as ChartArchive.records.
+    """
+    with open(path, 'rb') as archive_file:
+        _, dtype, data_offset = _read_header(path, archive_file.fileno())
+    count = max(os.stat(path).st_size - data_offset, 0) // dtype.itemsize
+    if not count:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(count,))
+
+
+def _archive_header():
+    # The header of a new archive of CHART_RECORD_VERSION records, padded to the first record
+    layout = json.dumps(dtype_to_descr(CHART_RECORD_DTYPE)).encode()
+    length = _ARCHIVE_HEADER.size + len(layout)
+    data_offset = -(-length // ARCHIVE_DATA_ALIGNMENT) * ARCHIVE_DATA_ALIGNMENT
+    header = _ARCHIVE_HEADER.pack(CHART_ARCHIVE_MAGIC, CHART_ARCHIVE_VERSION, CHART_RECORD_VERSION,
+                                  CHART_RECORD_DTYPE.itemsize, data_offset, len(layout))
+    return header + layout + bytes(data_offset - length)
+
+
+def _read_header(path, fd):
+    # Returns the record version, record layout and offset of the first record of an archive
+    header = os.pread(fd, _ARCHIVE_HEADER.size, 0)
+    if len(header) < _ARCHIVE_HEADER.size or not header.startswith(CHART_ARCHIVE_MAGIC):
+        raise ValueError(f"{path} is not a chart archive.")
+    (_, archive_version, record_version, record_size,
+     data_offset, layout_length) = _ARCHIVE_HEADER.unpack(header)
+    if archive_version != CHART_ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported chart archive version {archive_version} in {path}.")
+
+    layout = os.pread(fd, layout_length, _ARCHIVE_HEADER.size)
+    dtype = descr_to_dtype(_as_descr(json.loads(layout)))
+    if dtype.itemsize != record_size:
+        raise ValueError(f"The record layout of {path} does not match its record size.")
+    return record_version, dtype, data_offset
+
+
+def _as_descr(layout):
+    # JSON turns the (name, format, shape) tuples of a dtype description into lists
+    return [tuple(tuple(item) if isinstance(item, list) else item for item in field)
+            for field in layout]
+
+
+@contextmanager
+def _file_lock(fd):
+    # Holds an exclusive lock on the whole archive file, shared with every other process
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
@@ -0,0 +1,268 @@
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from utilities.astro_calculations import POSITION_FLAGS
+from utilities.chart import CHART_DTYPE, Chart
+from utilities.ephemeris_backend import get_ephemeris_backend
+
+
+# Where the on-disk chart cache lives unless a path is given explicitly
+DEFAULT_CHART_CACHE_PATH = os.environ.get(
+    'PTOLEMY_CHART_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ptolemy', 'charts.sqlite'))
+
+# Charts whose times round to the same second, and whose locations round to the same
+# ten-thousandth of a degree (about 11 meters), share a cache entry
+CHART_CACHE_TIME_QUANTUM = 1 / 86400
+CHART_CACHE_LOCATION_PRECISION = 4
+
+# Number of charts kept in memory, and on disk
+CHART_CACHE_MEMORY_SIZE = 4096
+CHART_CACHE_DISK_SIZE = 1000000
+
+# Fraction of the on-disk entries removed at once when the cache is full, so eviction does
+# not run on every store
+CHART_CACHE_EVICTION_FRACTION = 0.1
+
+# Number of disk hits whose last use is kept in memory before it is written out. The times
+# are written together, with the next store or once this many have gathered, so reading a
+# chart from disk does not cost a write transaction of its own
+CHART_CACHE_TOUCH_BATCH = 256
+
+# Changes whenever the chart record layout does, so records of an older layout are never read
+_CHART_LAYOUT = hashlib.blake2b(str(CHART_DTYPE.descr).encode(), digest_size=8).digest()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def chart_cache_key(jd, location_latitude, location_longitude, house_system_code,
+                    flags=POSITION_FLAGS, backend_name='swisseph'):
+    """
+    Builds the key under which a chart is cached: a digest of the quantized time and location,
+    the house system code, the ephemeris flags and backend, and the chart record layout.
+
+    Parameters:
+    - jd (float): The Julian Day of the chart.
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+    - house_system_code (str): The house system code, as from get_house_system_code.
+    - flags (int): The Swiss Ephemeris flags the positions are calculated with.
+    - backend_name (str): The cache_name of the EphemerisBackend the positions come from,
+                          which tells apart, e.g., exact Swiss Ephemeris positions from those
+                          of an installed Chebyshev ephemeris.
+
+    Returns:
+    - bytes: A 16 byte key.
+    """
+    scale = 10 ** CHART_CACHE_LOCATION_PRECISION
+    quantized = struct.pack(
+        '<qqq1sq', round(jd / CHART_CACHE_TIME_QUANTUM), round(location_latitude * scale),
+        round(location_longitude * scale), house_system_code.encode(), flags)
+    return hashlib.blake2b(
+        quantized + backend_name.encode() + _CHART_LAYOUT, digest_size=16).digest()
+
+
+class ChartCache:
+    """
+    A two-tier cache of calculated charts. Recently used charts are kept in memory in an LRU
+    order, and every chart is also stored in SQLite as its raw CHART_DTYPE record, so charts
+    survive restarts and are shared between processes. Both tiers are bounded; the disk tier
+    evicts its least recently used charts in batches.
+    """
+
+    def __init__(self, path=DEFAULT_CHART_CACHE_PATH, memory_size=CHART_CACHE_MEMORY_SIZE,
+                 disk_size=CHART_CACHE_DISK_SIZE):
+        """
+        Parameters:
+        - path (str): Path of the SQLite database file. Use ':memory:' for a throwaway cache,
+                      or None for the in-memory tier only.
+        - memory_size (int): Number of charts kept in memory.
+        - disk_size (int): Number of charts kept on disk.
+        """
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.statistics = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._connection = None
+
+        if path is not None:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS charts (
+                    key BLOB PRIMARY KEY,
+                    record BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS charts_last_used ON charts (last_used);
+            ''')
+            self._connection.commit()
+            self._disk_count = self._connection.execute('SELECT COUNT(*) FROM charts').fetchone()[0]
+
+    def get_chart(self, jd, location_latitude, location_longitude, house_system_code):
+        """
+        Returns the chart for a time, place and house system, calculating it with
+        Chart.calculate and the configured ephemeris backend only if it is not cached.
+
+        Parameters:
+        - jd (float): The Julian Day of the chart.
+        - location_latitude (float): Geographic latitude of the observation point in degrees.
+        - location_longitude (float): Geographic longitude of the observation point in degrees.
+        - house_system_code (str): The code for the house system to use.
+
+        Returns:
+        - Chart: The chart. Its record is read-only, since it is shared with the cache.
+        """
+        backend = get_ephemeris_backend()
+        key = chart_cache_key(jd, location_latitude, location_longitude, house_system_code,
+                              backend_name=backend.cache_name)
+        chart = self.lookup(key)
+        if chart is None:
+            chart = Chart.calculate(
+                jd, location_latitude, location_longitude, house_system_code, backend)
+            chart = self.store(key, chart)
+        return chart
+
+    def lookup(self, key):
+        """
+        Looks up a chart by its chart_cache_key, first in memory and then on disk.
+
+        Parameters:
+        - key (bytes): The chart's key.
+
+        Returns:
+        - Chart: The cached chart, or None if it is not cached.
+        """
+        with self._lock:
+            chart = self._memory.get(key)
+            if chart is not None:
+                self._memory.move_to_end(key)
+                self.statistics['memory_hits'] += 1
+                return chart
+
+            row = None
+            if self._connection is not None:
+                row = self._connection.execute(
+                    'SELECT record FROM charts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.statistics['misses'] += 1
+                return None
+
+            self._touched[key] = time.time()
+            if len(self._touched) >= CHART_CACHE_TOUCH_BATCH:
+                self._write_touches()
+                self._connection.commit()
+            self.statistics['disk_hits'] += 1
+            chart = Chart(np.frombuffer(row[0], dtype=CHART_DTYPE).reshape(()))
+            self._remember(key, chart)
+            return chart
+
+    def store(self, key, chart):
+        """
+        Adds a chart to both tiers of the cache.
+
+        Parameters:
+        - key (bytes): The chart's key, as from chart_cache_key.
+        - chart (Chart): The chart.
+
+        Returns:
+        - Chart: The cached, read-only copy of the chart.
+        """
+        record = chart.record.copy()
+        record.flags.writeable = False
+        chart = Chart(record)
+
+        with self._lock:
+            self._remember(key, chart)
+            if self._connection is not None:
+                # The last uses of the charts read since the last store are written first, so
+                # eviction sees them
+                self._write_touches()
+                now = time.time()
+                inserted = self._connection.execute(
+                    'INSERT OR IGNORE INTO charts VALUES (?, ?, ?)',
+                    (key, record.tobytes(), now)).rowcount
+                if not inserted:
+                    self._connection.execute(
+                        'UPDATE charts SET record = ?, last_used = ? WHERE key = ?',
+                        (record.tobytes(), now, key))
+                self._disk_count += inserted
+                if self._disk_count > self.disk_size:
+                    self._evict()
+                self._connection.commit()
+        return chart
+
+    def clear(self):
+        """
+        Removes every chart from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._connection is not None:
+                self._connection.execute('DELETE FROM charts')
+                self._connection.commit()
+                self._disk_count = 0
+
+    def close(self):
+        """
+        Writes out the last uses of the charts read from disk, and closes the underlying
+        database connection.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._write_touches()
+                self._connection.commit()
+                self._connection.close()
+                self._connection = None
+
+    def _remember(self, key, chart):
+        self._memory[key] = chart
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        # Remove the least recently used charts, down to below the size limit
+        count = self._disk_count - self.disk_size + int(self.disk_size * CHART_CACHE_EVICTION_FRACTION)
+        evicted = self._connection.execute(
+            'DELETE FROM charts WHERE key IN '
+            '(SELECT key FROM charts ORDER BY last_used LIMIT ?)', (count,)).rowcount
+        self._disk_count = self._connection.execute('SELECT COUNT(*) FROM charts').fetchone()[0]
+        self.statistics['evictions'] += evicted
+
+    def _write_touches(self):
+        # Writes the last uses of the charts read from disk, in the caller's transaction
+        if self._touched:
+            self._connection.executemany(
+                'UPDATE charts SET last_used = ? WHERE key = ?',
+                [(last_used, key) for key, last_used in self._touched.items()])
+            self._touched.clear()
+
+
+def get_default_chart_cache():
+    """
+    Returns the process-wide chart cache, opening it on first use. The database path is
+    taken from the PTOLEMY_CHART_CACHE environment variable, or ~/.cache/ptolemy/charts.sqlite.
+
+    Returns:
+    - ChartCache: The shared chart cache.
+    """
+    global _default_cache
+
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ChartCache(DEFAULT_CHART_CACHE_PATH)
+    return _default_cache
@@ -0,0 +1,380 @@
+import asyncio
+import cProfile
+import glob
+import json
+import os
+import pstats
+import sqlite3
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import count, islice, repeat
+
+import numpy as np
+import swisseph as swis_eph
+from utilities.astro_calculations import calculate_custom_julian_days, get_coordinates
+from utilities.astro_utils import get_house_system_code, get_planetary_ruler_of_the_day
+from utilities.chart import Chart, ChartBatch
+from utilities.chart_archive import ChartArchive
+from utilities.ephemeris import ephemeris_process_pool, init_process_ephemeris
+from utilities.ephemeris_backend import configure_ephemeris_backend
+from utilities.geocode_cache import get_default_geocode_cache, normalize_place_name
+from utilities.instrumentation import stage_timer
+from utilities.timezone_utils import (
+    LOCAL_TIME_UNKNOWN_TIMEZONE, configure_timezone_lookup, get_timezone_finder)
+
+
+DEFAULT_HOUSE_SYSTEM = 'Placidus'
+
+# Number of question records a batch worker calculates at a time
+DEFAULT_CHUNK_SIZE = 256
+
+# How each LOCAL_TIME_* flag from timezone_utils is reported
+LOCAL_TIME_STATUS = ('ok', 'ambiguous', 'nonexistent', 'unknown timezone')
+
+# Fields of a question record that give the local time when there is no 'datetime' field
+LOCAL_TIME_FIELDS = ('year', 'month', 'day', 'hour', 'minute', 'second')
+
+# The ChartArchive a batch worker appends its charts to, opened by _init_chart_worker
+_worker_archive = None
+
+# Exceptions that fail a single record instead of the whole batch: bad input, charts the
+# Swiss Ephemeris cannot calculate (e.g. Placidus houses near the poles), and a geocoding or
+# chart cache that is locked by another process or broken. geopy's errors are added by
+# _record_errors once geopy is imported
+RECORD_ERRORS = (KeyError, TypeError, ValueError, swis_eph.Error, sqlite3.Error)
+
+
+def compute_charts(records, house_system=DEFAULT_HOUSE_SYSTEM, offline=False, chart_cache=None,
+                   archive=None, geocode_errors=None):
+    """
+    Calculates the horary charts of many question records. Each record is a dict with
+    - 'city' and 'country', or 'latitude' and 'longitude' (or 'lat' and 'lon'),
+    - 'datetime', the local date and time as ISO 8601 (e.g., '2024-03-01T14:30:00'), or the
+      separate fields 'year', 'month', 'day', 'hour', 'minute' and 'second',
+    - optionally 'id', which is copied to the result, and 'house_system', a house system name
+      as accepted by get_house_system_code.
+    Values may be strings, as read from CSV files. The local times of all records are converted
+    to Julian Days in one call.
+
+    Parameters:
+    - records (list): The question records.
+    - house_system (str): House system name for records that do not give one.
+    - offline (bool): If True, cities are only looked up in the geocoding cache.
+    - chart_cache (ChartCache): Optional cache the charts are looked up in and added to.
+    - archive (ChartArchive): Optional archive the calculated charts are appended to, in one
+                              write, in the order of the records.
+    - geocode_errors (dict): Optional messages of places whose lookup already failed, keyed
+                             by normalize_place_name. Records for these places get the
+                             message as their error and are not looked up again.
+
+    Returns:
+    - list: One JSON-serializable dict per record, in the same order. A record that cannot be
+            calculated, or whose place cannot be looked up, gives a dict with its 'id' and an
+            'error' message instead.
+    """
+    results = [None] * len(records)
+    charts = [] if archive is not None else None
+    valid_rows = []
+    prepared = []
+    for row, record in enumerate(records):
+        try:
+            prepared.append(_prepare_record(record, house_system, offline, geocode_errors))
+            valid_rows.append(row)
+        except _record_errors() as error:
+            results[row] = _error_result(record, error)
+
+    if prepared:
+        local_times, latitudes, longitudes = zip(*[(item[1], item[2], item[3]) for item in prepared])
+        jds, local_time_flags = calculate_custom_julian_days(
+            np.array(local_times, dtype='datetime64[s]'), latitudes, longitudes)
+
+        for row, item, jd, local_time_flag in zip(
+                valid_rows, prepared, jds.tolist(), local_time_flags.tolist()):
+            try:
+                if local_time_flag == LOCAL_TIME_UNKNOWN_TIMEZONE:
+                    raise ValueError(
+                        f"Could not determine the timezone for the location: {item[2]}, {item[3]}")
+                results[row] = _compute_chart(item, jd, local_time_flag, chart_cache, charts)
+            except _record_errors() as error:
+                results[row] = _error_result(records[row], error)
+
+    if charts:
+        archive.append(ChartBatch.from_charts(charts))
+
+    return results
+
+
+def compute_chart(record, house_system=DEFAULT_HOUSE_SYSTEM, offline=False, chart_cache=None):
+    """
+    Calculates the horary chart of a single question record, as described in compute_charts.
+
+    Parameters:
+    - record (dict): The question record.
+    - house_system (str): House system name if the record does not give one.
+    - offline (bool): If True, cities are only looked up in the geocoding cache.
+    - chart_cache (ChartCache): Optional cache the chart is looked up in and added to.
+
+    Returns:
+    - dict: The JSON-serializable chart, or the record's 'id' and an 'error' message.
+    """
+    return compute_charts([record], house_system, offline, chart_cache)[0]
+
+
+def _record_errors():
+    # geopy is only imported once a place is geocoded, and only then can its errors occur
+    geopy_errors = sys.modules.get('geopy.exc')
+    if geopy_errors is None:
+        return RECORD_ERRORS
+    return RECORD_ERRORS + (geopy_errors.GeopyError,)
+
+
+def _has_coordinates(record):
+    return record.get('latitude', record.get('lat')) not in (None, '')
+
+
+def _prepare_record(record, house_system, offline, geocode_errors=None):
+    # Resolves the record's location, local time and house system
+    if _has_coordinates(record):
+        latitude = float(record.get('latitude', record.get('lat')))
+        longitude = float(record.get('longitude', record.get('lon')))
+        address = None
+    else:
+        if geocode_errors:
+            message = geocode_errors.get(normalize_place_name(record['city'], record['country']))
+            if message is not None:
+                raise ValueError(message)
+        locations = get_coordinates(record['city'], record['country'], offline=offline)
+        if not locations:
+            raise ValueError(f"Location not found: {record['city']}, {record['country']}")
+        # Like the interactive app, take Nominatim's best match when a name is ambiguous
+        location = locations[0]
+        latitude, longitude, address = location.latitude, location.longitude, location.address
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"Invalid coordinates: {latitude}, {longitude}")
+
+    if record.get('datetime'):
+        local_time = np.datetime64(record['datetime'], 's')
+    else:
+        local_time = np.datetime64(
+            '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}'.format(
+                *(int(record.get(field) or 0) for field in LOCAL_TIME_FIELDS)), 's')
+
+    house_system_name = record.get('house_system') or house_system
+    house_system_code = get_house_system_code(house_system_name)
+
+    return record, local_time, latitude, longitude, address, house_system_name, house_system_code
+
+
+def _compute_chart(item, jd, local_time_flag, chart_cache, charts=None):
+    (record, local_time, latitude, longitude, address,
+     house_system_name, house_system_code) = item
+
+    if chart_cache is not None:
+        chart = chart_cache.get_chart(jd, latitude, longitude, house_system_code)
+    else:
+        chart = Chart.calculate(jd, latitude, longitude, house_system_code)
+    if charts is not None:
+        charts.append(chart)
+
+    with stage_timer('format'):
+        local_date = local_time.astype(object)
+        result = {
+            'id': record.get('id'),
+            'local_time': str(local_time),
+            'local_time_status': LOCAL_TIME_STATUS[local_time_flag],
+            'address': address,
+            'ruler_of_the_day': get_planetary_ruler_of_the_day(
+                local_date.year, local_date.month, local_date.day),
+        }
+        result.update(chart.to_dict())
+        result['house_system'] = house_system_name
+    return result
+
+
+def _error_result(record, error):
+    record_id = record.get('id') if isinstance(record, dict) else None
+    return {'id': record_id, 'error': str(error)}
+
+
+def stream_chart_json(records, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, ordered=True,
+                      max_pending=None, house_system=DEFAULT_HOUSE_SYSTEM, offline=False,
+                      ephe_path=None, timezone_in_memory=False, ephemeris_backend=None,
+                      profile_dir=None, archive_path=None):
+    """
+    Calculates the charts of a stream of question records in a pool of worker processes and
+    yields them as JSON lines. Records are read lazily and sent to the workers in chunks, and
+    no more than max_pending chunks are in flight at once, so memory use stays bounded however
+    long the stream is.
+
+    Parameters:
+    - records (iterable): Question records, as described in compute_charts.
+    - workers (int): Number of worker processes. Defaults to the number of CPUs; 0 calculates
+                     in this process.
+    - chunk_size (int): Number of records sent to a worker at a time.
+    - ordered (bool): If True, results come out in the order of the records. If False, each
+                      chunk's results come out as soon as it is done, which keeps the workers
+                      busy when some chunks are slower than others.
+    - max_pending (int): Maximum number of chunks in flight. Defaults to four per worker.
+    - house_system (str): House system name for records that do not give one.
+    - offline (bool): If True, cities are only looked up in the geocoding cache. Otherwise
+                      the places of each chunk that are not cached are looked up in this
+                      process, by one AsyncGeocoder at Nominatim's rate limit, before the
+                      chunk is sent to a worker, and the workers only read the cache.
+    - ephe_path (str): Directory of the Swiss Ephemeris data files.
+    - timezone_in_memory (bool): If True, each worker loads the timezone data into memory.
+    - ephemeris_backend (str): Name of the EphemerisBackend the workers calculate positions
+                               with. Defaults to the PTOLEMY_EPHEMERIS_BACKEND environment
+                               variable, or 'swisseph'.
+    - profile_dir (str): If given, each chunk is run under cProfile in its worker and the
+                         statistics are written to this directory as chunk-<n>.pstats, for
+                         merge_chunk_profiles. Chunk profiles left there by an earlier run
+                         are removed first.
+    - archive_path (str): If given, the calculated charts are appended to the ChartArchive at
+                          this path, which is created if it does not exist. Each chunk's
+                          charts are appended in one write when it is done, so with ordered
+                          False or several workers the archive is not in the order of the
+                          records.
+
+    Yields:
+    - str: One JSON object per record, without a trailing newline.
+    """
+    chunks = _chunked(records, chunk_size)
+    if offline:
+        chunks = zip(chunks, repeat(None))
+    else:
+        chunks = _geocoded_chunks(chunks)
+
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+        # Chunk profiles of an earlier run would otherwise be merged with this run's
+        for stale_path in glob.glob(os.path.join(profile_dir, 'chunk-*.pstats')):
+            os.remove(stale_path)
+        profile_paths = (os.path.join(profile_dir, f'chunk-{index:06d}.pstats')
+                         for index in count())
+    else:
+        profile_paths = repeat(None)
+
+    if archive_path is not None:
+        # Created here, so a bad path fails before any chart is calculated
+        ChartArchive(archive_path).close()
+
+    if workers == 0:
+        _init_chart_worker(ephe_path, timezone_in_memory, ephemeris_backend, archive_path)
+        for (chunk, geocode_errors), profile_path in zip(chunks, profile_paths):
+            yield from _compute_chunk_json(chunk, house_system, True, profile_path, geocode_errors)
+        return
+
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 4 * workers
+    with ephemeris_process_pool(workers, ephe_path, _init_chart_worker,
+                                (None, timezone_in_memory, ephemeris_backend,
+                                 archive_path)) as executor:
+        pending = deque()
+
+        def submit_until_full():
+            for (chunk, geocode_errors), profile_path in zip(chunks, profile_paths):
+                pending.append(executor.submit(
+                    _compute_chunk_json, chunk, house_system, True, profile_path, geocode_errors))
+                if len(pending) >= max_pending:
+                    break
+
+        submit_until_full()
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                yield from future.result()
+            submit_until_full()
+
+
+def _chunked(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _geocoded_chunks(chunks):
+    # Looks up the places of each chunk that are not in the geocoding cache, all with one
+    # AsyncGeocoder so the whole batch keeps to Nominatim's rate limit, and yields each chunk
+    # with the messages of the places whose lookup failed
+    loop = geocoder = None
+    try:
+        for chunk in chunks:
+            places = {}
+            for record in chunk:
+                if (isinstance(record, dict) and not _has_coordinates(record)
+                        and record.get('city') and record.get('country')):
+                    places.setdefault(normalize_place_name(record['city'], record['country']),
+                                      (record['city'], record['country']))
+
+            geocode_errors = {}
+            if places:
+                if geocoder is None:
+                    # geopy and aiohttp are only imported when a batch has places to look up
+                    from utilities.async_geocoder import AsyncGeocoder
+                    loop = asyncio.new_event_loop()
+                    geocoder = AsyncGeocoder()
+                    loop.run_until_complete(geocoder.__aenter__())
+                results = loop.run_until_complete(
+                    geocoder.geocode_many(places.values(), return_exceptions=True))
+                geocode_errors = {key: f"Geocoding failed: {result!r}"
+                                  for key, result in zip(places, results)
+                                  if isinstance(result, Exception)}
+            yield chunk, geocode_errors
+    finally:
+        if geocoder is not None:
+            loop.run_until_complete(geocoder.__aexit__(None, None, None))
+        if loop is not None:
+            loop.close()
+
+
+def _init_chart_worker(ephe_path, timezone_in_memory, ephemeris_backend=None, archive_path=None):
+    # Loads the ephemeris path and backend, timezone data and geocoding cache, and opens the
+    # chart archive, once per worker
+    global _worker_archive
+    init_process_ephemeris(ephe_path)
+    configure_ephemeris_backend(ephemeris_backend)
+    if timezone_in_memory:
+        configure_timezone_lookup(in_memory=True)
+    get_timezone_finder()
+    get_default_geocode_cache()
+    _worker_archive = ChartArchive(archive_path) if archive_path is not None else None
+
+
+def merge_chunk_profiles(profile_dir):
+    """
+    Combines the per-chunk profiles stream_chart_json wrote into one.
+
+    Parameters:
+    - profile_dir (str): The directory given to stream_chart_json as profile_dir.
+
+    Returns:
+    - pstats.Stats: The combined statistics, or None if the directory holds no chunk profiles.
+    """
+    paths = sorted(glob.glob(os.path.join(profile_dir, 'chunk-*.pstats')))
+    return pstats.Stats(*paths) if paths else None
+
+
+def _compute_chunk_json(chunk, house_system, offline, profile_path=None, geocode_errors=None):
+    # Results are serialized in the worker, so the parent process only writes them out
+    def compute():
+        return [json.dumps(result) for result in compute_charts(
+            chunk, house_system, offline, archive=_worker_archive, geocode_errors=geocode_errors)]
+
+    if profile_path is None:
+        return compute()
+
+    profile = cProfile.Profile()
+    results = profile.runcall(compute)
+    profile.dump_stats(profile_path)
+    return results
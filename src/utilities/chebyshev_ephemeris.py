@@ -0,0 +1,274 @@
+import hashlib
+import struct
+from collections import namedtuple
+
+import numpy as np
+from numpy.polynomial import chebyshev
+from utilities import astro_calculations
+from utilities.astro_calculations import POSITION_FLAGS, PLANETS, _calculate_positions
+
+
+# Bodies a Chebyshev ephemeris holds, in file order. The South Node is derived from the
+# North Node, as in calculate_ecliptic_positions
+CHEBYSHEV_BODIES = ('Sun', 'Moon', 'Mercury', 'Venus', 'Mars', 'Jupiter', 'Saturn', 'North Node')
+
+# Length in days of the segments each body's positions are fitted over. With
+# CHEBYSHEV_DEGREE these keep the topocentric longitudes within 1e-5 degrees of the Swiss
+# Ephemeris; the Moon moves fastest, and its topocentric parallax changes within a day
+CHEBYSHEV_SEGMENT_DAYS = {
+    'Sun': 2.0,
+    'Moon': 1.0,
+    'Mercury': 2.0,
+    'Venus': 2.0,
+    'Mars': 2.0,
+    'Jupiter': 2.0,
+    'Saturn': 2.0,
+    'North Node': 16.0,
+}
+
+# Degree of the polynomial fitted over each segment
+CHEBYSHEV_DEGREE = 12
+
+# Number of days calculated with the Swiss Ephemeris at a time while building a file
+_BUILD_CHUNK_DAYS = 366
+
+# File header: magic, version, Swiss Ephemeris flags, polynomial degree, body count, start and
+# end Julian Days, and the observer latitude, longitude and altitude. A table with each body's
+# Swiss Ephemeris identifier, segment length, segment count and data offset follows
+_MAGIC = b'PTOLCHEB'
+_VERSION = 1
+_HEADER = struct.Struct('<8sIiII5d')
+_BODY_ENTRY = struct.Struct('<idQQ')
+
+# Coefficient sets per segment: longitude (unwrapped), latitude and distance
+_COMPONENTS = 3
+
+# Maximum differences of a Chebyshev ephemeris from the Swiss Ephemeris, as reported by
+# ChebyshevEphemeris.check_accuracy: longitude and latitude in degrees, distance in AU and
+# longitude speed in degrees per day
+ChebyshevError = namedtuple('ChebyshevError', ['longitude', 'latitude', 'distance', 'speed'])
+
+
+def build_chebyshev_ephemeris(path, start_jd, end_jd, location_latitude, location_longitude,
+                              degree=CHEBYSHEV_DEGREE, segment_days=None):
+    """
+    Precomputes the topocentric positions of the seven traditional planets and the mean
+    Lunar Node over a date range as Chebyshev polynomial segments, and writes them to a file
+    that ChebyshevEphemeris memory-maps. Each segment is fitted to Swiss Ephemeris positions
+    at the Chebyshev nodes of its interval, so building takes degree + 1 calculations per
+    segment and body (a few seconds per year with the Moshier ephemeris).
+
+    Parameters:
+    - path (str): Path of the file to write.
+    - start_jd (float): The first Julian Day the file covers.
+    - end_jd (float): The last Julian Day the file covers.
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+    - degree (int): Degree of the polynomial fitted over each segment.
+    - segment_days (dict): Segment length in days per body name, overriding
+                           CHEBYSHEV_SEGMENT_DAYS.
+
+    Returns:
+    - ChebyshevEphemeris: The new file, opened.
+    """
+    if not end_jd > start_jd:
+        raise ValueError("The end of the date range must be after its start.")
+    segment_days = {**CHEBYSHEV_SEGMENT_DAYS, **(segment_days or {})}
+
+    # Each body's coefficients start on a 64 byte boundary after the header and body table
+    offset = _HEADER.size + _BODY_ENTRY.size * len(CHEBYSHEV_BODIES)
+    body_entries = []
+    for body_name in CHEBYSHEV_BODIES:
+        days = float(segment_days[body_name])
+        segment_count = int(np.ceil((end_jd - start_jd) / days))
+        offset = -(-offset // 64) * 64
+        body_entries.append((PLANETS[body_name], days, segment_count, offset))
+        offset += segment_count * _COMPONENTS * (degree + 1) * 8
+
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(
+            _MAGIC, _VERSION, POSITION_FLAGS, degree, len(CHEBYSHEV_BODIES), start_jd, end_jd,
+            location_latitude, location_longitude, 0.0))
+        for entry in body_entries:
+            file.write(_BODY_ENTRY.pack(*entry))
+        file.truncate(offset)
+
+    # Chebyshev nodes of the first kind on [-1, 1]
+    nodes = np.cos(np.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))
+    for body_name, (_, days, segment_count, body_offset) in zip(CHEBYSHEV_BODIES, body_entries):
+        coefficients = np.memmap(path, dtype='<f8', mode='r+', offset=body_offset,
+                                 shape=(segment_count, _COMPONENTS, degree + 1))
+        chunk_segments = max(int(_BUILD_CHUNK_DAYS // days), 1)
+        for first in range(0, segment_count, chunk_segments):
+            segments = np.arange(first, min(first + chunk_segments, segment_count))
+            segment_starts = start_jd + segments * days
+            jds = segment_starts[:, np.newaxis] + (nodes + 1) / 2 * days
+            positions = _calculate_positions(
+                jds.reshape(-1), [body_name], POSITION_FLAGS, location_latitude,
+                location_longitude)[:, 0, :3].reshape(len(segments), degree + 1, _COMPONENTS)
+            # Longitudes are fitted unwrapped, so a segment crossing 0 Aries stays smooth
+            positions[..., 0] = np.unwrap(positions[..., 0], period=360, axis=1)
+            fitted = chebyshev.chebfit(
+                nodes, positions.transpose(1, 0, 2).reshape(degree + 1, -1), degree)
+            coefficients[segments] = fitted.reshape(
+                degree + 1, len(segments), _COMPONENTS).transpose(1, 2, 0)
+        coefficients.flush()
+        del coefficients
+
+    return ChebyshevEphemeris(path)
+
+
+class ChebyshevEphemeris:
+    """
+    A memory-mapped file of precomputed Chebyshev polynomial segments, written by
+    build_chebyshev_ephemeris, for one observer location and date range. Positions and speeds
+    are evaluated for whole arrays of Julian Days with NumPy, which for range scans is much
+    faster than calling the Swiss Ephemeris once per time and body.
+
+    Installed with use_chebyshev_ephemeris, it is used by calculate_ecliptic_longitude and
+    calculate_ecliptic_positions for the times and location it covers; other calculations
+    still go to the Swiss Ephemeris.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+        - path (str): Path of a file written by build_chebyshev_ephemeris.
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            header = file.read(_HEADER.size)
+            (magic, version, self.flags, self.degree, body_count, self.start_jd, self.end_jd,
+             self.latitude, self.longitude, self.altitude) = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{path} is not a version {_VERSION} Chebyshev ephemeris file.")
+            body_table = file.read(_BODY_ENTRY.size * body_count)
+            body_entries = list(_BODY_ENTRY.iter_unpack(body_table))
+
+        # The fit is determined by the header and body table: the time range, location, flags,
+        # degree and segment lengths. Files built with the same ones share an identifier
+        self.identifier = hashlib.blake2b(header + body_table, digest_size=8).hexdigest()
+
+        body_names = {body_id: name for name, body_id in PLANETS.items()}
+        self._segments = {}
+        for body_id, days, segment_count, offset in body_entries:
+            coefficients = np.memmap(path, dtype='<f8', mode='r', offset=offset,
+                                     shape=(segment_count, _COMPONENTS, self.degree + 1))
+            self._segments[body_names[body_id]] = (days, coefficients)
+
+    def covers(self, jds, location_latitude, location_longitude):
+        """
+        Tells whether positions for these times and this location can be taken from the file.
+
+        Parameters:
+        - jds (float or array-like): One or more Julian Days.
+        - location_latitude (float): Geographic latitude of the observation point in degrees.
+        - location_longitude (float): Geographic longitude of the observation point in degrees.
+
+        Returns:
+        - bool: True if the location is the file's and every Julian Day is within its range.
+        """
+        if location_latitude != self.latitude or location_longitude != self.longitude:
+            return False
+        jds = np.asarray(jds, dtype=np.float64)
+        # NaN Julian Days fail both comparisons
+        return bool(jds.size) and bool(jds.min() >= self.start_jd and jds.max() <= self.end_jd)
+
+    def positions(self, jds, planet_names):
+        """
+        Evaluates the topocentric ecliptic positions and speeds of several planets or Lunar
+        Nodes, like calculate_ecliptic_positions, for Julian Days within the file's range.
+
+        Parameters:
+        - jds (float or array-like): One or more Julian Days.
+        - planet_names (list): Names of the planets or Lunar Nodes (e.g., ['Sun', 'South Node']).
+
+        Returns:
+        - numpy.ndarray: An array of shape (n_jd, n_body, 6) holding, for each Julian Day and
+                         body, the ecliptic longitude, latitude, distance (AU), and the daily
+                         speeds in longitude, latitude and distance.
+        """
+        jds = np.atleast_1d(np.asarray(jds, dtype=np.float64))
+        positions = np.empty((len(jds), len(planet_names), 6), dtype=np.float64)
+        evaluated = {}
+        for planet_index, planet_name in enumerate(planet_names):
+            body_name = 'North Node' if planet_name == 'South Node' else planet_name
+            if body_name not in self._segments:
+                raise ValueError(f"'{planet_name}' is not a recognized planet or Lunar Node.")
+            if body_name not in evaluated:
+                evaluated[body_name] = self._evaluate(body_name, jds)
+            position = positions[:, planet_index]
+            position[:] = evaluated[body_name]
+            if planet_name == 'South Node':
+                # The South Node is opposite the North Node, mirrored in latitude
+                position[:, 0] += 180
+                position[:, 1] *= -1
+                position[:, 4] *= -1
+            position[:, 0] %= 360
+        return positions
+
+    def ecliptic_longitude(self, planet_name, jd):
+        """
+        Evaluates the ecliptic longitude of a planet or Lunar Node, like
+        calculate_ecliptic_longitude, for a Julian Day within the file's range.
+
+        Parameters:
+        - planet_name (str): Name of the planet or Lunar Node.
+        - jd (float): The Julian Day.
+
+        Returns:
+        - float: Ecliptic longitude in degrees.
+        """
+        return float(self.positions(jd, [planet_name])[0, 0, 0])
+
+    def check_accuracy(self, sample_count=1000, seed=0):
+        """
+        Compares the file with the Swiss Ephemeris at random times within its range.
+
+        Parameters:
+        - sample_count (int): Number of times compared.
+        - seed (int): Seed of the random times, so checks can be repeated.
+
+        Returns:
+        - dict: The ChebyshevError of each body, by name: the largest differences found.
+        """
+        jds = np.random.default_rng(seed).uniform(self.start_jd, self.end_jd, sample_count)
+        body_names = list(self._segments)
+        expected = _calculate_positions(jds, body_names, self.flags, self.latitude, self.longitude,
+                                        self.altitude)
+        errors = np.abs(self.positions(jds, body_names) - expected)
+        errors[..., 0] = np.minimum(errors[..., 0], 360 - errors[..., 0])
+        largest = errors.max(axis=0)
+        return {body_name: ChebyshevError(*(float(value) for value in largest[body_index, [0, 1, 2, 3]]))
+                for body_index, body_name in enumerate(body_names)}
+
+    def _evaluate(self, body_name, jds):
+        # Longitude, latitude and distance, and their daily speeds, from each Julian Day's segment
+        days, coefficients = self._segments[body_name]
+        scaled = (jds - self.start_jd) / days
+        segments = np.clip(scaled.astype(np.int64), 0, len(coefficients) - 1)
+        t = 2 * (scaled - segments) - 1
+        # Coefficients first and times last, so chebval broadcasts over components and times
+        selected = coefficients[segments].transpose(2, 1, 0)
+        values = chebyshev.chebval(t, selected, tensor=False)
+        speeds = chebyshev.chebval(t, chebyshev.chebder(selected), tensor=False) * (2 / days)
+        return np.concatenate([values, speeds]).T
+
+
+def use_chebyshev_ephemeris(ephemeris):
+    """
+    Installs a Chebyshev ephemeris for calculate_ecliptic_longitude and
+    calculate_ecliptic_positions in this process, or removes it. Times and locations the
+    file does not cover are still calculated with the Swiss Ephemeris.
+
+    Parameters:
+    - ephemeris (ChebyshevEphemeris or str): The ephemeris, or the path of its file. None
+                                             removes the installed one.
+
+    Returns:
+    - ChebyshevEphemeris: The installed ephemeris, or None.
+    """
+    if isinstance(ephemeris, str):
+        ephemeris = ChebyshevEphemeris(ephemeris)
+    astro_calculations._chebyshev_ephemeris = ephemeris
+    return ephemeris
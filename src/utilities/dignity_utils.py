@@ -1,5 +1,166 @@
 
-import swisseph as swis_eph
+from collections import namedtuple
+
+import numpy as np
+from utilities.astro_calculations import calculate_ecliptic_positions
+from utilities.astro_utils import (
+    DEGREE_TABLE, TRADITIONAL_PLANETS, ZODIAC_SIGNS, classify_longitudes)
+from utilities.instrumentation import instrumented
+
+
+# Signs ruled by each planet in the traditional rulership system
+TRADITIONAL_DOMICILES = {
+    'Sun': ['Leo'],
+    'Moon': ['Cancer'],
+    'Mercury': ['Gemini', 'Virgo'],
+    'Venus': ['Taurus', 'Libra'],
+    'Mars': ['Aries', 'Scorpio'],
+    'Jupiter': ['Sagittarius', 'Pisces'],
+    'Saturn': ['Capricorn', 'Aquarius'],
+}
+
+# Exaltation sign and super exaltation degree of each planet
+TRADITIONAL_EXALTATIONS = {
+    'Sun': ('Aries', 19),
+    'Moon': ('Taurus', 3),
+    'Mercury': ('Virgo', 15),
+    'Venus': ('Pisces', 27),
+    'Mars': ('Capricorn', 28),
+    'Jupiter': ('Cancer', 15),
+    'Saturn': ('Libra', 21),
+}
+
+# Triplicity rulers of each sign, as (day ruler, night ruler)
+TRIPLICITY_RULERS = {
+    'Aries': ('Sun', 'Jupiter'),
+    'Taurus': ('Venus', 'Moon'),
+    'Gemini': ('Saturn', 'Mercury'),
+    'Cancer': ('Mars', 'Mars'),
+    'Leo': ('Sun', 'Jupiter'),
+    'Virgo': ('Venus', 'Moon'),
+    'Libra': ('Saturn', 'Mercury'),
+    'Scorpio': ('Mars', 'Mars'),
+    'Sagittarius': ('Sun', 'Jupiter'),
+    'Capricorn': ('Venus', 'Moon'),
+    'Aquarius': ('Saturn', 'Mercury'),
+    'Pisces': ('Mars', 'Mars'),
+}
+
+# Signs of detriment of each planet, opposite its domiciles
+TRADITIONAL_DETRIMENTS = {
+    'Sun': ['Aquarius'],
+    'Moon': ['Capricorn'],
+    'Mercury': ['Sagittarius', 'Pisces'],
+    'Venus': ['Aries', 'Scorpio'],
+    'Mars': ['Taurus', 'Libra'],
+    'Jupiter': ['Gemini', 'Virgo'],
+    'Saturn': ['Cancer', 'Leo']
+}
+
+# Sign of fall of each planet, opposite its exaltation
+TRADITIONAL_FALLS = {
+    'Sun': 'Libra',
+    'Moon': 'Scorpio',
+    'Mercury': 'Pisces',
+    'Venus': 'Virgo',
+    'Mars': 'Cancer',
+    'Jupiter': 'Capricorn',
+    'Saturn': 'Aries',
+}
+
+# Bit flags of the essential dignity bitmask
+DIGNITY_DOMICILE = 1
+DIGNITY_EXALTATION = 2
+DIGNITY_SUPER_EXALTATION = 4
+DIGNITY_TRIPLICITY = 8
+DIGNITY_BOUND = 16
+DIGNITY_DECAN = 32
+DIGNITY_DETRIMENT = 64
+DIGNITY_FALL = 128
+
+# Names of the dignity flags, in the order they are reported
+DIGNITY_NAMES = (
+    (DIGNITY_DOMICILE, 'Domicile'),
+    (DIGNITY_EXALTATION, 'Exaltation'),
+    (DIGNITY_SUPER_EXALTATION, 'Super Exaltation'),
+    (DIGNITY_TRIPLICITY, 'Triplicity'),
+    (DIGNITY_BOUND, 'Bound'),
+    (DIGNITY_DECAN, 'Decan'),
+    (DIGNITY_DETRIMENT, 'Detriment'),
+    (DIGNITY_FALL, 'Fall'),
+)
+
+# Dignities that keep a planet from being peregrine
+ESSENTIAL_DIGNITIES = (DIGNITY_DOMICILE | DIGNITY_EXALTATION | DIGNITY_TRIPLICITY
+                       | DIGNITY_BOUND | DIGNITY_DECAN)
+
+# Essential dignity points from William Lilly's table in Christian Astrology.
+# Super exaltation has no points of its own
+LILLY_DIGNITY_SCORES = {
+    DIGNITY_DOMICILE: 5,
+    DIGNITY_EXALTATION: 4,
+    DIGNITY_TRIPLICITY: 3,
+    DIGNITY_BOUND: 2,
+    DIGNITY_DECAN: 1,
+    DIGNITY_DETRIMENT: -5,
+    DIGNITY_FALL: -4,
+}
+LILLY_PEREGRINE_SCORE = -5
+
+# Codes for the motion of a planet, as returned by classify_motion
+MOTION_DIRECT = 0
+MOTION_RETROGRADE = 1
+MOTION_STATIONARY_RETROGRADE = 2  # About to turn retrograde
+MOTION_STATIONARY_DIRECT = 3  # About to turn direct
+MOTION_STATES = ('Direct', 'Retrograde', 'Stationary Retrograde', 'Stationary Direct')
+
+# Daily speed in longitude, in degrees, under which a planet is considered stationary
+STATIONARY_SPEED_THRESHOLD = 0.02
+
+# Result of score_dignities
+DignityScores = namedtuple('DignityScores', ['flags', 'scores', 'peregrine', 'chart_total'])
+
+
+def _build_dignity_tables():
+    # Bitmask and score of every planet at every whole degree of the zodiac, by sect.
+    # Axes are (planet, sign, degree within sign, sect), where sect 0 is night and 1 is day
+    flags = np.zeros((len(TRADITIONAL_PLANETS), 12, 30, 2), dtype=np.uint8)
+    for planet_index, planet in enumerate(TRADITIONAL_PLANETS):
+        exaltation_sign, super_exaltation_degree = TRADITIONAL_EXALTATIONS[planet]
+        for sign_index, sign in enumerate(ZODIAC_SIGNS):
+            sign_flags = flags[planet_index, sign_index]
+            if sign in TRADITIONAL_DOMICILES[planet]:
+                sign_flags |= DIGNITY_DOMICILE
+            if sign == exaltation_sign:
+                sign_flags |= DIGNITY_EXALTATION
+                sign_flags[super_exaltation_degree] |= DIGNITY_SUPER_EXALTATION
+            day_ruler, night_ruler = TRIPLICITY_RULERS[sign]
+            if planet == day_ruler:
+                sign_flags[:, 1] |= DIGNITY_TRIPLICITY
+            if planet == night_ruler:
+                sign_flags[:, 0] |= DIGNITY_TRIPLICITY
+            if sign in TRADITIONAL_DETRIMENTS[planet]:
+                sign_flags |= DIGNITY_DETRIMENT
+            if sign == TRADITIONAL_FALLS[planet]:
+                sign_flags |= DIGNITY_FALL
+
+            degrees = DEGREE_TABLE[sign_index * 30:sign_index * 30 + 30]
+            sign_flags[degrees[:, 1] == planet_index] |= DIGNITY_BOUND
+            sign_flags[degrees[:, 2] == planet_index] |= DIGNITY_DECAN
+
+    scores = np.zeros(flags.shape, dtype=np.int8)
+    for flag, score in LILLY_DIGNITY_SCORES.items():
+        scores += np.where(flags & flag, score, 0).astype(np.int8)
+    scores += np.where(flags & ESSENTIAL_DIGNITIES, 0, LILLY_PEREGRINE_SCORE).astype(np.int8)
+
+    flags.setflags(write=False)
+    scores.setflags(write=False)
+    return flags, scores
+
+
+# Precomputed essential dignity bitmask (DIGNITY_* flags) and Lilly score of each traditional
+# planet, indexed by [planet index, sign index, whole degree within sign, sect (0 night, 1 day)]
+DIGNITY_TABLE, DIGNITY_SCORE_TABLE = _build_dignity_tables()
 
 
 def is_planet_in_its_traditional_domicile(planet, planet_sign):
@@ -14,23 +175,8 @@ def is_planet_in_its_traditional_domicile(planet, planet_sign):
     bool: True if the planet is in its traditional domicile, False otherwise.
     """
 
-    planet_rulerships = {
-        'Sun': 'Leo',
-        'Moon': 'Cancer',
-        'Mercury': ['Gemini', 'Virgo'],
-        'Venus': ['Taurus', 'Libra'],
-        'Mars': ['Aries', 'Scorpio'],
-        'Jupiter': ['Sagittarius', 'Pisces'],
-        'Saturn': ['Capricorn', 'Aquarius'],
-    }
-
     # Check if the sign is one of the ruling signs for the planet
-    ruling_signs = planet_rulerships.get(planet)
-    # If the planet rules multiple signs (Mercury, Venus, etc.)
-    if isinstance(ruling_signs, list):
-        return planet_sign in ruling_signs
-    else:
-        return planet_sign == ruling_signs
+    return planet_sign in TRADITIONAL_DOMICILES.get(planet, [])
 
 
 def is_planet_in_its_traditional_exaltation(planet, planet_sign):
@@ -44,18 +190,8 @@ def is_planet_in_its_traditional_exaltation(planet, planet_sign):
     Returns:
     bool: True if the planet is in its traditional exaltation sign, False otherwise.
     """
-    planet_exaltations = {
-        'Sun': 'Aries',
-        'Moon': 'Taurus',
-        'Mercury': 'Virgo',
-        'Venus': 'Pisces',
-        'Mars': 'Capricorn',
-        'Jupiter': 'Cancer',
-        'Saturn': 'Libra',
-    }
-
-    exaltation_sign = planet_exaltations.get(planet)
-    return planet_sign == exaltation_sign
+    exaltation_info = TRADITIONAL_EXALTATIONS.get(planet)
+    return exaltation_info is not None and planet_sign == exaltation_info[0]
 
 
 def is_planet_super_exalted(planet, planet_sign, planet_degree):
@@ -72,19 +208,7 @@ def is_planet_super_exalted(planet, planet_sign, planet_degree):
     Returns:
     - bool: True if the planet is super exalted (in both the correct sign and degree), False otherwise.
     """
-    # Dictionary mapping planets to their exaltation sign and specific super exaltation degree
-    planet_super_exaltations = {
-        'Sun': ('Aries', 19),
-        'Moon': ('Taurus', 3),
-        'Mercury': ('Virgo', 15),
-        'Venus': ('Pisces', 27),
-        'Mars': ('Capricorn', 28),
-        'Jupiter': ('Cancer', 15),
-        'Saturn': ('Libra', 21),
-        # Add other planets if necessary
-    }
-
-    exaltation_info = planet_super_exaltations.get(planet)
+    exaltation_info = TRADITIONAL_EXALTATIONS.get(planet)
     if exaltation_info:
         exaltation_sign, super_exaltation_degree = exaltation_info
         # Truncate the planet_degree to get the integer part
@@ -107,23 +231,8 @@ def is_planet_in_its_triplicity(planet, sign, day_or_night_chart):
     - bool: True if the planet is the triplicity ruler of the sign under the given day/night condition, False otherwise.
     """
 
-    triplicity_rulers = {
-        'Aries': ('Sun', 'Jupiter'),
-        'Taurus': ('Venus', 'Moon'),
-        'Gemini': ('Saturn', 'Mercury'),
-        'Cancer': ('Mars', 'Mars'),
-        'Leo': ('Sun', 'Jupiter'),
-        'Virgo': ('Venus', 'Moon'),
-        'Libra': ('Saturn', 'Mercury'),
-        'Scorpio': ('Mars', 'Mars'),
-        'Sagittarius': ('Sun', 'Jupiter'),
-        'Capricorn': ('Venus', 'Moon'),
-        'Aquarius': ('Saturn', 'Mercury'),
-        'Pisces': ('Mars', 'Mars'),
-    }
-
     # Determine the appropriate ruler based on whether it's a day or night chart
-    ruler = triplicity_rulers[sign][0] if day_or_night_chart else triplicity_rulers[sign][1]
+    ruler = TRIPLICITY_RULERS[sign][0] if day_or_night_chart else TRIPLICITY_RULERS[sign][1]
 
     return planet == ruler
 
@@ -140,21 +249,7 @@ def is_planet_in_its_traditional_detriment(planet, planet_sign):
     - bool: True if the planet is in its traditional detriment, False otherwise.
     """
 
-    planet_detriments = {
-        'Sun': 'Aquarius',
-        'Moon': 'Capricorn',
-        'Mercury': ['Sagittarius', 'Pisces'],
-        'Venus': ['Aries', 'Scorpio'],
-        'Mars': ['Taurus', 'Libra'],
-        'Jupiter': ['Gemini', 'Virgo'],
-        'Saturn': ['Cancer', 'Leo']
-    }
-
-    detriment_signs = planet_detriments.get(planet)
-    if isinstance(detriment_signs, list):
-        return planet_sign in detriment_signs
-    else:
-        return planet_sign == detriment_signs
+    return planet_sign in TRADITIONAL_DETRIMENTS.get(planet, [])
 
 
 def is_planet_in_its_traditional_fall(planet, planet_sign):
@@ -169,18 +264,49 @@ def is_planet_in_its_traditional_fall(planet, planet_sign):
     - bool: True if the planet is in its traditional fall, False otherwise.
     """
 
-    planet_falls = {
-        'Sun': 'Libra',
-        'Moon': 'Scorpio',
-        'Mercury': 'Pisces',
-        'Venus': 'Virgo',
-        'Mars': 'Cancer',
-        'Jupiter': 'Capricorn',
-        'Saturn': 'Aries',
-    }
+    return planet_sign == TRADITIONAL_FALLS.get(planet)
 
-    fall_sign = planet_falls.get(planet)
-    return planet_sign == fall_sign
+
+@instrumented('dignities')
+def score_dignities(longitudes, is_day):
+    """
+    Scores the essential dignity of the seven traditional planets of one or many charts in a
+    single vectorized call, using the precomputed dignity table and William Lilly's points:
+    domicile +5, exaltation +4, triplicity +3, bound +2, decan +1, detriment -5, fall -4,
+    and peregrine -5. A planet is peregrine when it has none of the five essential dignities.
+
+    Parameters:
+    - longitudes (array-like): Ecliptic longitudes in degrees, with a last axis of 7 in the
+                               order of TRADITIONAL_PLANETS (Sun, Moon, Mercury, Venus, Mars,
+                               Jupiter, Saturn). Leading axes index charts.
+    - is_day (bool or array-like): Whether each chart is a day chart, as returned by is_day_chart.
+
+    Returns:
+    - DignityScores: A namedtuple of
+        - flags: uint8 bitmask of DIGNITY_* flags per planet.
+        - scores: Total essential dignity points per planet.
+        - peregrine: Whether each planet is peregrine.
+        - chart_total: The sum of the planets' points for each chart.
+    """
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    if longitudes.shape[-1:] != (len(TRADITIONAL_PLANETS),):
+        raise ValueError(
+            f"Expected the longitudes of the {len(TRADITIONAL_PLANETS)} traditional planets on the last axis.")
+
+    sign_index, _, _ = classify_longitudes(longitudes)
+    degree_index = np.floor(longitudes % 360).astype(np.intp) % 30
+    planet_index = np.arange(len(TRADITIONAL_PLANETS))
+    sect_index = np.asarray(is_day, dtype=np.intp)[..., np.newaxis]
+
+    flags = DIGNITY_TABLE[planet_index, sign_index, degree_index, sect_index]
+    scores = DIGNITY_SCORE_TABLE[planet_index, sign_index, degree_index, sect_index].astype(np.int16)
+
+    return DignityScores(
+        flags=flags,
+        scores=scores,
+        peregrine=(flags & ESSENTIAL_DIGNITIES) == 0,
+        chart_total=scores.sum(axis=-1),
+    )
 
 
 def is_planet_combust(planet_longitude, planet_sign, sun_longitude, sun_sign):
@@ -242,9 +368,9 @@ def is_planet_cazimi(planet_longitude, planet_sign, sun_longitude, sun_sign):
 def is_planet_in_retrograde(planet_name, jd, location_latitude, location_longitude):
     """
     In astrology, a planet is cosidered to be in retrograde when it appears to move 
-    backwards in the sky. This function calculates the planet's position on two 
-    consecutive days and checks if its ecliptic longitude decreases, indicating 
-    retrograde motion.
+    backwards in the sky. This function reads the planet's daily speed in longitude, as
+    calculated by the Swiss Ephemeris together with its position, and checks if it is
+    negative, indicating retrograde motion.
 
     Parameters:
     - planet_name (str): Name of the planet (e.g., 'Mercury', 'Venus', 'Mars').
@@ -255,24 +381,88 @@ def is_planet_in_retrograde(planet_name, jd, location_latitude, location_longitu
     Returns:
     - bool: True if the planet is in retrograde motion, False otherwise.
     """
+    if planet_name not in TRADITIONAL_PLANETS:
+        raise ValueError("Invalid planet name.")
 
-    swis_eph.set_topo(location_longitude, location_latitude, 0)
+    positions = calculate_ecliptic_positions(
+        jd, [planet_name], location_latitude, location_longitude)
 
-    planets = {
-        'Sun': swis_eph.SUN, 'Moon': swis_eph.MOON, 'Mercury': swis_eph.MERCURY,
-        'Venus': swis_eph.VENUS, 'Mars': swis_eph.MARS, 'Jupiter': swis_eph.JUPITER,
-        'Saturn': swis_eph.SATURN
-    }
+    # The fourth value is the daily speed in longitude
+    return bool(positions[0, 0, 3] < 0)
 
-    planet = planets.get(planet_name)
-    if planet is None:
-        raise ValueError("Invalid planet name.")
 
-    # Get the planet's position for the given Julian Day
-    position1, _ = swis_eph.calc_ut(jd, planet)
+def classify_motion(speeds, accelerations=None, stationary_threshold=STATIONARY_SPEED_THRESHOLD):
+    """
+    Classifies the motion of planets from their daily speeds in longitude. A planet moving
+    slower than the threshold is stationary: stationary retrograde when it is slowing down
+    towards retrograde motion, and stationary direct when it is turning back to direct motion.
+
+    Parameters:
+    - speeds (array-like): Daily speeds in longitude in degrees per day, of any shape
+                           (e.g., positions[..., 3] from calculate_ecliptic_positions).
+    - accelerations (array-like): Optional daily change of those speeds. Without it, a slow
+                                  planet still moving forward is taken to be stationary
+                                  retrograde and a slow retrograde planet stationary direct,
+                                  which is wrong in the days just after a station.
+    - stationary_threshold (float): Speed in degrees per day under which a planet is stationary.
+
+    Returns:
+    - numpy.ndarray: An int8 array of MOTION_* codes (index into MOTION_STATES), with the same
+                     shape as speeds.
+    """
+    speeds = np.asarray(speeds, dtype=np.float64)
+    if accelerations is None:
+        # Assume the planet is slowing down, so the sign of its speed is about to change
+        accelerations = -speeds
+    accelerations = np.asarray(accelerations, dtype=np.float64)
+
+    motion = np.where(speeds < 0, MOTION_RETROGRADE, MOTION_DIRECT).astype(np.int8)
+    stationary = np.abs(speeds) < stationary_threshold
+    motion[stationary & (accelerations < 0)] = MOTION_STATIONARY_RETROGRADE
+    motion[stationary & (accelerations >= 0)] = MOTION_STATIONARY_DIRECT
+
+    return motion
 
-    # Get the planet's position for the next day
-    position2, _ = swis_eph.calc_ut(jd + 1, planet)
 
-    # Determine if the planet is in retrograde
-    return position1[0] > position2[0]
+def calculate_motion_states(jds, planet_names, location_latitude, location_longitude,
+                            stationary_threshold=STATIONARY_SPEED_THRESHOLD, positions=None,
+                            backend=None):
+    """
+    Determines whether planets are direct, retrograde, stationary retrograde or stationary direct
+    at one or more Julian Days. The speeds come from the same ephemeris call as the positions;
+    only planets close to a station need their speed calculated again, half a day either side,
+    to tell which way they are turning.
+
+    Parameters:
+    - jds (float or array-like): One or more Julian Days.
+    - planet_names (list): Names of the planets (e.g., ['Mercury', 'Venus', 'Mars']).
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+    - stationary_threshold (float): Speed in degrees per day under which a planet is stationary.
+    - positions (numpy.ndarray): Optional result of calculate_ecliptic_positions for the same
+                                 Julian Days, planets and location, to avoid calculating it again.
+    - backend (EphemerisBackend): Where the positions come from, including those half a day
+                                  either side of a station, so a chart's motion states use one
+                                  ephemeris. Defaults to calculate_ecliptic_positions.
+
+    Returns:
+    - numpy.ndarray: An int8 array of MOTION_* codes of shape (n_jd, n_body).
+    """
+    jds = np.atleast_1d(np.asarray(jds, dtype=np.float64))
+    calculate_positions = calculate_ecliptic_positions if backend is None else backend.positions
+    if positions is None:
+        positions = calculate_positions(jds, planet_names, location_latitude, location_longitude)
+    speeds = positions[..., 3]
+
+    accelerations = np.zeros_like(speeds)
+    near_station = np.abs(speeds) < stationary_threshold
+    station_rows = np.flatnonzero(near_station.any(axis=1))
+    if len(station_rows):
+        station_jds = jds[station_rows]
+        before = calculate_positions(
+            station_jds - 0.5, planet_names, location_latitude, location_longitude)
+        after = calculate_positions(
+            station_jds + 0.5, planet_names, location_latitude, location_longitude)
+        accelerations[station_rows] = after[..., 3] - before[..., 3]
+
+    return classify_motion(speeds, accelerations, stationary_threshold)
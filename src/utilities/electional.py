@@ -0,0 +1,150 @@
+import numpy as np
+from utilities.astro_utils import classify_longitudes
+from utilities.chart import ChartBatch
+
+
+# Default resolution of an electional scan: one minute, in days
+ELECTION_STEP_DAYS = 1 / 1440
+
+# Default spacing of the coarse samples of an electional scan: one hour, in days
+ELECTION_COARSE_STEP_DAYS = 1 / 24
+
+# Longest spacing of the coarse samples, in days. Between the polar circles the Ascendant and
+# the house of every body only move forward through the signs and houses, taking most of a
+# sidereal day to come back to where they were, and the Moon takes days to leave a sign,
+# bound or decan and come back. Within two hours none of the states chart_signature builds
+# can change and change back, so a change between two coarse samples always shows as a
+# difference between their signatures. The one exception is day_chart within a few degrees
+# of the polar circles around midsummer, where the night can be shorter than that
+ELECTION_MAX_COARSE_STEP_DAYS = 1 / 12
+
+# Columns chart_signature can include. Each is a per-chart array of small integers
+SIGNATURE_COLUMNS = ('signs', 'bounds', 'decans', 'motions', 'dignity_flags', 'day_chart',
+                     'houses', 'angle_signs')
+
+
+def chart_signature(batch, *columns):
+    """
+    Builds the discrete state of each chart of a batch from a choice of its columns, for use
+    as the signature of find_elections. A predicate that only depends on these columns cannot
+    change while they stay the same.
+
+    Parameters:
+    - batch (ChartBatch): The charts.
+    - columns (str): Names from SIGNATURE_COLUMNS: the CHART_DTYPE columns 'signs', 'bounds',
+                     'decans', 'motions', 'dignity_flags' and 'day_chart', 'houses' for the
+                     house each body is in, and 'angle_signs' for the signs of the Ascendant
+                     and Midheaven.
+
+    Returns:
+    - numpy.ndarray: An int16 array with one row per chart.
+    """
+    parts = []
+    for column in columns:
+        if column == 'houses':
+            parts.append(batch.house_positions())
+        elif column == 'angle_signs':
+            parts.append(classify_longitudes(batch.records['angles'][:, :2])[0])
+        elif column in SIGNATURE_COLUMNS:
+            parts.append(batch.records[column].reshape(len(batch), -1))
+        else:
+            raise ValueError(f"Unsupported signature column: {column}")
+    return np.concatenate([part.astype(np.int16) for part in parts], axis=1)
+
+
+def find_elections(predicate, start_jd, end_jd, location_latitude, location_longitude,
+                   house_system_code, step=ELECTION_STEP_DAYS, coarse_step=ELECTION_COARSE_STEP_DAYS,
+                   signature=None):
+    """
+    Finds the times in a window when a chart condition holds, e.g. the Moon in Taurus, not
+    in the 6th, 8th or 12th house, with the Ascendant ruler dignified.
+
+    Charts are first calculated every coarse_step, in one batch. Between two coarse samples
+    with the same signature the condition is taken not to change, and nothing more is
+    calculated there. Intervals whose signatures differ are bisected, all of them together in
+    one batch per level, down to the step, so only the times around changes are calculated
+    at full resolution.
+
+    The signature always includes the predicate's own result. By default it also includes
+    every column of chart_signature, so the Moon's and the angles' sign, bound, decan and
+    house changes are all bisected, and no condition on them can start and end unseen
+    between two coarse samples (see ELECTION_MAX_COARSE_STEP_DAYS). A narrower signature
+    calculates fewer charts, and is exact as long as it includes every column the predicate
+    depends on. A predicate on continuous quantities, such as an orb between two planets, is
+    only exact with a signature that changes whenever it can, e.g. the orb rounded to a
+    degree, or with coarse_step equal to step.
+
+    Parameters:
+    - predicate (callable): Takes a ChartBatch and returns a boolean array with one value
+                            per chart.
+    - start_jd (float): The Julian Day the window starts at.
+    - end_jd (float): The Julian Day the window ends at.
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+    - house_system_code (str): The code for the house system to use.
+    - step (float): Resolution of the results, in days.
+    - coarse_step (float): Spacing of the first samples, in days, at most
+                           ELECTION_MAX_COARSE_STEP_DAYS. It is rounded to a whole number of
+                           steps.
+    - signature (callable): Function of a ChartBatch returning a 2-dimensional integer array,
+                            one row per chart, of the state the predicate depends on (e.g.,
+                            lambda batch: chart_signature(batch, 'signs')). Defaults to every
+                            column of chart_signature.
+
+    Returns:
+    - list: (start, end) Julian Day tuples of the intervals in which the condition holds,
+            in time order. The ends are the first and last times found to satisfy the
+            condition, accurate to the step.
+    """
+    if coarse_step > ELECTION_MAX_COARSE_STEP_DAYS:
+        raise ValueError(f"The coarse step of an electional scan can be at most "
+                         f"{ELECTION_MAX_COARSE_STEP_DAYS} days, not {coarse_step}.")
+    if signature is None:
+        def signature(batch):
+            return chart_signature(batch, *SIGNATURE_COLUMNS)
+
+    step_count = int(np.ceil((end_jd - start_jd) / step))
+    coarse_count = max(int(round(coarse_step / step)), 1)
+
+    def evaluate(indices):
+        batch = ChartBatch.calculate(
+            start_jd + indices * step, location_latitude, location_longitude, house_system_code)
+        values = np.asarray(predicate(batch), dtype=bool)
+        state = np.concatenate([values[:, np.newaxis].astype(np.int16),
+                                np.asarray(signature(batch), dtype=np.int16)], axis=1)
+        return values, state
+
+    indices = np.unique(np.append(np.arange(0, step_count, coarse_count), step_count))
+    values, states = evaluate(indices)
+    sampled_indices, sampled_values = [indices], [values]
+
+    # Pairs of neighboring samples whose states differ, and which are more than a step apart
+    changed = (states[:-1] != states[1:]).any(axis=1) & (np.diff(indices) > 1)
+    lows, highs = indices[:-1][changed], indices[1:][changed]
+    low_states, high_states = states[:-1][changed], states[1:][changed]
+
+    while len(lows):
+        middles = (lows + highs) // 2
+        middle_values, middle_states = evaluate(middles)
+        sampled_indices.append(middles)
+        sampled_values.append(middle_values)
+
+        left = (low_states != middle_states).any(axis=1) & (middles - lows > 1)
+        right = (middle_states != high_states).any(axis=1) & (highs - middles > 1)
+        lows = np.concatenate([lows[left], middles[right]])
+        highs = np.concatenate([middles[left], highs[right]])
+        low_states = np.concatenate([low_states[left], middle_states[right]])
+        high_states = np.concatenate([middle_states[left], high_states[right]])
+
+    indices = np.concatenate(sampled_indices)
+    values = np.concatenate(sampled_values)
+    order = np.argsort(indices)
+    indices, values = indices[order], values[order]
+
+    # Runs of samples that satisfy the condition
+    edges = np.diff(np.concatenate([[False], values, [False]]).astype(np.int8))
+    run_starts = indices[edges[:-1] == 1]
+    run_ends = indices[np.flatnonzero(edges[1:] == -1)]
+
+    return [(start_jd + first * step, min(start_jd + last * step, end_jd))
+            for first, last in zip(run_starts.tolist(), run_ends.tolist())]
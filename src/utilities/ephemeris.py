@@ -0,0 +1,172 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import swisseph as swis_eph
+from utilities.astro_calculations import (
+    SWISSEPH_LOCK, _calculate_positions, compute_houses, set_ephemeris_path,
+    set_topocentric_location)
+
+
+# Swiss Ephemeris body identifiers of the two kinds of Lunar Node
+NODE_TYPES = {
+    'mean': swis_eph.MEAN_NODE,
+    'true': swis_eph.TRUE_NODE,
+}
+
+_thread_local = threading.local()
+
+
+class Ephemeris:
+    """
+    A calculation context that owns everything the Swiss Ephemeris otherwise keeps as global
+    state: the observer location, the calculation flags, the ephemeris data path and the kind
+    of Lunar Node. Each calculation sets that state and runs under SWISSEPH_LOCK, so charts for
+    different locations can be calculated from several threads without picking up each other's
+    observer location. The Swiss Ephemeris itself is not re-entrant, so threads take turns; use
+    ephemeris_process_pool to calculate on several cores at once.
+
+    Using an Ephemeris as a context manager (``with ephemeris: ...``) holds the lock for the
+    whole block, so a sequence of calculations is not interleaved with other threads.
+    """
+
+    def __init__(self, latitude, longitude, altitude=0.0, topocentric=True, flags=0,
+                 ephe_path=None, node='mean'):
+        """
+        Parameters:
+        - latitude (float): Geographic latitude of the observation point in degrees.
+        - longitude (float): Geographic longitude of the observation point in degrees.
+        - altitude (float): Altitude of the observation point in meters above sea level.
+        - topocentric (bool): If True, positions are seen from the observation point rather
+                              than from the center of the Earth, as in calculate_ecliptic_longitude.
+        - flags (int): Extra Swiss Ephemeris flags (e.g., swisseph.FLG_SIDEREAL).
+                       Speeds are always calculated.
+        - ephe_path (str): Directory of the Swiss Ephemeris data files. If None, the path
+                           already in use is kept.
+        - node (str): 'mean' or 'true', the kind of Lunar Node to calculate.
+        """
+        if node not in NODE_TYPES:
+            raise ValueError(f"Unsupported node type: {node}")
+
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.altitude = float(altitude)
+        self.flags = flags | swis_eph.FLG_SPEED | (swis_eph.FLG_TOPOCTR if topocentric else 0)
+        self.ephe_path = ephe_path
+        self.node = node
+
+    def __repr__(self):
+        return (f"Ephemeris(latitude={self.latitude}, longitude={self.longitude}, "
+                f"altitude={self.altitude}, flags={self.flags}, node='{self.node}')")
+
+    def __enter__(self):
+        SWISSEPH_LOCK.acquire()
+        if self.ephe_path is not None:
+            set_ephemeris_path(self.ephe_path)
+        if self.flags & swis_eph.FLG_TOPOCTR:
+            set_topocentric_location(self.latitude, self.longitude, self.altitude)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        SWISSEPH_LOCK.release()
+
+    def positions(self, jds, planet_names):
+        """
+        Calculates the ecliptic positions and speeds of planets or Lunar Nodes.
+
+        Parameters:
+        - jds (float or array-like): One or more Julian Days.
+        - planet_names (list): Names of the planets or Lunar Nodes (e.g., ['Sun', 'South Node']).
+
+        Returns:
+        - numpy.ndarray: An array of shape (n_jd, n_body, 6), as from calculate_ecliptic_positions.
+        """
+        return _calculate_positions(
+            jds, planet_names, self.flags, self.latitude, self.longitude, self.altitude,
+            NODE_TYPES[self.node], self.ephe_path)
+
+    def ecliptic_longitude(self, planet_name, jd):
+        """
+        Calculates the ecliptic longitude of a planet or Lunar Node.
+
+        Parameters:
+        - planet_name (str): Name of the planet or Lunar Node (e.g., 'Mars').
+        - jd (float): The Julian Day.
+
+        Returns:
+        - float: Ecliptic longitude in degrees.
+        """
+        return float(self.positions(jd, [planet_name])[0, 0, 0])
+
+    def houses(self, jd, house_system_code):
+        """
+        Calculates the house cusps and chart angles at the observer's location.
+
+        Parameters:
+        - jd (float): The Julian Day.
+        - house_system_code (str): The code for the house system to use.
+
+        Returns:
+        - ChartAngles: As from compute_houses.
+        """
+        return compute_houses(jd, self.latitude, self.longitude, house_system_code)
+
+
+def get_thread_ephemeris(latitude, longitude, **options):
+    """
+    Returns an Ephemeris for a location that is reused by the calling thread, so that a thread
+    calculating many charts for the same place does not build a new context for each one.
+
+    Parameters:
+    - latitude (float): Geographic latitude of the observation point in degrees.
+    - longitude (float): Geographic longitude of the observation point in degrees.
+    - options: Further keyword arguments for Ephemeris (e.g., node='true').
+
+    Returns:
+    - Ephemeris: The calling thread's Ephemeris for these settings.
+    """
+    ephemerides = getattr(_thread_local, 'ephemerides', None)
+    if ephemerides is None:
+        ephemerides = _thread_local.ephemerides = {}
+
+    key = (float(latitude), float(longitude), tuple(sorted(options.items())))
+    ephemeris = ephemerides.get(key)
+    if ephemeris is None:
+        ephemeris = ephemerides[key] = Ephemeris(latitude, longitude, **options)
+    return ephemeris
+
+
+def init_process_ephemeris(ephe_path=None):
+    """
+    Prepares the Swiss Ephemeris in a worker process. Meant as the initializer of a process
+    pool, so that every worker has its own, independent Swiss Ephemeris state.
+
+    Parameters:
+    - ephe_path (str): Directory of the Swiss Ephemeris data files.
+    """
+    if ephe_path is not None:
+        set_ephemeris_path(ephe_path)
+
+
+def ephemeris_process_pool(workers=None, ephe_path=None, initializer=None, initargs=()):
+    """
+    Creates a process pool whose workers each have their own Swiss Ephemeris state, so that
+    charts can be calculated on several cores at once.
+
+    Parameters:
+    - workers (int): Number of worker processes. Defaults to the number of CPUs.
+    - ephe_path (str): Directory of the Swiss Ephemeris data files.
+    - initializer (callable): Optional further initialization to run in each worker.
+    - initargs (tuple): Arguments for the initializer.
+
+    Returns:
+    - concurrent.futures.ProcessPoolExecutor: The process pool.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(ephe_path, initializer, initargs))
+
+
+def _init_worker(ephe_path, initializer, initargs):
+    init_process_ephemeris(ephe_path)
+    if initializer is not None:
+        initializer(*initargs)
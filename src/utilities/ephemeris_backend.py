@@ -0,0 +1,277 @@
+import os
+import threading
+
+import numpy as np
+from utilities import astro_calculations
+from utilities.astro_calculations import (
+    PLANETS, calculate_ecliptic_longitude, calculate_ecliptic_positions)
+from utilities.instrumentation import instrumented
+
+
+# Backend used unless another is configured: 'swisseph' or 'skyfield'
+DEFAULT_EPHEMERIS_BACKEND = os.environ.get('PTOLEMY_EPHEMERIS_BACKEND', 'swisseph')
+
+# JPL kernel the Skyfield backend reads. A bare file name is looked for in the working
+# directory and downloaded there if missing, as Skyfield's load does; DE421 covers 1900-2050
+DEFAULT_SKYFIELD_KERNEL = os.environ.get('PTOLEMY_SKYFIELD_KERNEL', 'de421.bsp')
+
+# Half the interval, in days, over which the Skyfield backend takes the difference of
+# positions for their speeds: one minute, short enough for the Moon's topocentric parallax
+SKYFIELD_SPEED_STEP = 1 / 1440
+
+# Kernel segments of each body. The planets' barycenters are used since every JPL kernel
+# has them; they are within a few thousand kilometers of the planets themselves
+SKYFIELD_TARGETS = {
+    'Sun': 'sun',
+    'Moon': 'moon',
+    'Mercury': 'mercury barycenter',
+    'Venus': 'venus barycenter',
+    'Mars': 'mars barycenter',
+    'Jupiter': 'jupiter barycenter',
+    'Saturn': 'saturn barycenter',
+}
+
+# Mean distance of the Moon in AU, which the Swiss Ephemeris gives as the mean node's distance
+_MEAN_NODE_DISTANCE = 0.0025695552898
+
+_backend = None
+_backend_lock = threading.Lock()
+_kernels = {}
+_kernels_lock = threading.Lock()
+
+
+class EphemerisBackend:
+    """
+    The interface charts get planetary positions through. A backend calculates the topocentric
+    ecliptic positions and speeds of the traditional planets and Lunar Nodes for arrays of
+    Julian Days (UT), in the layout of calculate_ecliptic_positions. House cusps and angles
+    are always calculated with the Swiss Ephemeris.
+    """
+
+    # Name the backend is configured by
+    name = None
+
+    def positions(self, jds, planet_names, location_latitude, location_longitude):
+        """
+        Calculates the topocentric ecliptic positions and speeds of planets or Lunar Nodes.
+
+        Parameters:
+        - jds (float or array-like): One or more Julian Days.
+        - planet_names (list): Names of the planets or Lunar Nodes (e.g., ['Sun', 'South Node']).
+        - location_latitude (float): Geographic latitude of the observation point in degrees.
+        - location_longitude (float): Geographic longitude of the observation point in degrees.
+
+        Returns:
+        - numpy.ndarray: An array of shape (n_jd, n_body, 6) holding, for each Julian Day and
+                         body, the ecliptic longitude, latitude, distance (AU), and the daily
+                         speeds in longitude, latitude and distance.
+        """
+        raise NotImplementedError
+
+    def ecliptic_longitude(self, planet_name, jd, location_latitude, location_longitude):
+        """
+        Calculates the ecliptic longitude of a planet or Lunar Node.
+
+        Parameters:
+        - planet_name (str): Name of the planet or Lunar Node.
+        - jd (float): The Julian Day.
+        - location_latitude (float): Geographic latitude of the observation point in degrees.
+        - location_longitude (float): Geographic longitude of the observation point in degrees.
+
+        Returns:
+        - float: Ecliptic longitude in degrees.
+        """
+        return float(self.positions(jd, [planet_name], location_latitude, location_longitude)[0, 0, 0])
+
+    @property
+    def cache_name(self):
+        """
+        Identifies where the backend's positions currently come from, for chart cache keys.
+        Charts calculated under different cache names are never shared.
+        """
+        return self.name
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class SwissEphemerisBackend(EphemerisBackend):
+    """
+    Positions from the Swiss Ephemeris, through calculate_ecliptic_positions, so an installed
+    Chebyshev ephemeris is used where it applies.
+    """
+
+    name = 'swisseph'
+
+    def positions(self, jds, planet_names, location_latitude, location_longitude):
+        return calculate_ecliptic_positions(jds, planet_names, location_latitude, location_longitude)
+
+    def ecliptic_longitude(self, planet_name, jd, location_latitude, location_longitude):
+        return calculate_ecliptic_longitude(planet_name, jd, location_latitude, location_longitude)
+
+    @property
+    def cache_name(self):
+        # Positions from an installed Chebyshev ephemeris are fitted rather than exact, so
+        # they are cached apart from the Swiss Ephemeris' own, and from other fits
+        chebyshev_ephemeris = astro_calculations._chebyshev_ephemeris
+        if chebyshev_ephemeris is None:
+            return self.name
+        return f'{self.name}+chebyshev:{chebyshev_ephemeris.identifier}'
+
+
+class SkyfieldBackend(EphemerisBackend):
+    """
+    Positions from a JPL kernel with Skyfield. Every Julian Day of a call is evaluated in one
+    vectorized Time array, which makes long time series much faster than calling the Swiss
+    Ephemeris once per time. Positions are apparent, referred to the ecliptic and true equinox
+    of date, like the Swiss Ephemeris defaults. Speeds are central differences over
+    SKYFIELD_SPEED_STEP either side, and the mean Lunar Node, which no kernel has, is
+    calculated from its polynomial (Meeus, Astronomical Algorithms, 47.7) plus the nutation
+    in longitude.
+
+    The kernel is opened once per process and path and shared by every SkyfieldBackend;
+    jplephem memory-maps it, so only the segments used are read from disk.
+    """
+
+    name = 'skyfield'
+
+    def __init__(self, kernel_path=DEFAULT_SKYFIELD_KERNEL):
+        """
+        Parameters:
+        - kernel_path (str): Path or file name of the JPL .bsp kernel.
+        """
+        # Skyfield takes a while to import and only this backend needs it
+        from skyfield.api import load
+
+        self.kernel_path = kernel_path
+        self.kernel = _load_kernel(kernel_path)
+        self.timescale = load.timescale()
+        self._earth = self.kernel['earth']
+        self._targets = {name: self.kernel[target] for name, target in SKYFIELD_TARGETS.items()}
+
+    def __repr__(self):
+        return f"SkyfieldBackend(kernel_path='{self.kernel_path}')"
+
+    @property
+    def cache_name(self):
+        return f'{self.name}:{os.path.basename(self.kernel_path)}'
+
+    @instrumented('ephemeris')
+    def positions(self, jds, planet_names, location_latitude, location_longitude):
+        from skyfield.api import wgs84
+        from skyfield.framelib import ecliptic_frame
+        from skyfield.nutationlib import iau2000b_radians
+
+        jds = np.atleast_1d(np.asarray(jds, dtype=np.float64))
+        for planet_name in planet_names:
+            if planet_name not in PLANETS and planet_name != 'South Node':
+                raise ValueError(
+                    f"'{planet_name}' is not a recognized planet or Lunar Node.")
+
+        # The times themselves, then a step before and after each for the speeds
+        step = SKYFIELD_SPEED_STEP
+        times = self.timescale.ut1_jd(np.concatenate([jds, jds - step, jds + step]))
+        observer = None
+
+        body_data = {}
+        for planet_name in planet_names:
+            body_name = 'North Node' if planet_name == 'South Node' else planet_name
+            if body_name in body_data:
+                continue
+
+            data = np.empty((len(jds), 6), dtype=np.float64)
+            if body_name == 'North Node':
+                # Mean node; it is the same seen from anywhere on Earth
+                t = (times.tt[:len(jds)] - 2451545.0) / 36525
+                longitude = (125.0445479 - 1934.1362891 * t + 0.0020754 * t ** 2
+                             + t ** 3 / 467441 - t ** 4 / 60616000)
+                nutation_longitude = iau2000b_radians(times[:len(jds)])[0]
+                data[:, 0] = (longitude + np.degrees(nutation_longitude)) % 360
+                data[:, 1:] = 0.0
+                data[:, 2] = _MEAN_NODE_DISTANCE
+                data[:, 3] = (-1934.1362891 + 2 * 0.0020754 * t + 3 * t ** 2 / 467441
+                              - 4 * t ** 3 / 60616000) / 36525
+            else:
+                if observer is None:
+                    observer = (self._earth + wgs84.latlon(
+                        location_latitude, location_longitude)).at(times)
+                latitude, longitude, distance = observer.observe(
+                    self._targets[body_name]).apparent().frame_latlon(ecliptic_frame)
+                values = np.stack([longitude.degrees, latitude.degrees, distance.au], axis=-1)
+                now, before, after = values[:len(jds)], values[len(jds):-len(jds)], values[-len(jds):]
+                change = after - before
+                change[:, 0] = (change[:, 0] + 180) % 360 - 180
+                data[:, :3] = now
+                data[:, 3:] = change / (2 * step)
+            body_data[body_name] = data
+
+        positions = np.empty((len(jds), len(planet_names), 6), dtype=np.float64)
+        for planet_index, planet_name in enumerate(planet_names):
+            if planet_name == 'South Node':
+                north_node = body_data['North Node']
+                south_node = positions[:, planet_index]
+                # The South Node is opposite the North Node, mirrored in latitude
+                south_node[:] = north_node
+                south_node[:, 0] = (north_node[:, 0] + 180) % 360
+                south_node[:, 1] = -north_node[:, 1]
+                south_node[:, 4] = -north_node[:, 4]
+            else:
+                positions[:, planet_index] = body_data[planet_name]
+
+        return positions
+
+
+# Backends by the name they are configured by
+EPHEMERIS_BACKENDS = {
+    SwissEphemerisBackend.name: SwissEphemerisBackend,
+    SkyfieldBackend.name: SkyfieldBackend,
+}
+
+
+def configure_ephemeris_backend(name=None, **options):
+    """
+    Chooses the backend charts are calculated with in this process.
+
+    Parameters:
+    - name (str): 'swisseph' or 'skyfield'. Defaults to the PTOLEMY_EPHEMERIS_BACKEND
+                  environment variable, or 'swisseph'.
+    - options: Keyword arguments for the backend (e.g., kernel_path='de440s.bsp').
+
+    Returns:
+    - EphemerisBackend: The backend now in use.
+    """
+    global _backend
+
+    name = name or DEFAULT_EPHEMERIS_BACKEND
+    if name not in EPHEMERIS_BACKENDS:
+        raise ValueError(f"Unsupported ephemeris backend: {name}")
+
+    backend = EPHEMERIS_BACKENDS[name](**options)
+    with _backend_lock:
+        _backend = backend
+    return backend
+
+
+def get_ephemeris_backend():
+    """
+    Returns the backend charts are calculated with, creating the configured one on first use.
+
+    Returns:
+    - EphemerisBackend: The process's backend.
+    """
+    backend = _backend
+    if backend is None:
+        backend = configure_ephemeris_backend()
+    return backend
+
+
+def _load_kernel(kernel_path):
+    # Each kernel is opened once per process
+    from skyfield.api import Loader
+
+    with _kernels_lock:
+        kernel = _kernels.get(kernel_path)
+        if kernel is None:
+            directory, file_name = os.path.split(os.path.abspath(kernel_path))
+            kernel = _kernels[kernel_path] = Loader(directory, verbose=False)(file_name)
+        return kernel
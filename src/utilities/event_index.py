@@ -0,0 +1,307 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import swisseph as swis_eph
+from utilities.astro_calculations import PLANETS, set_ephemeris_path
+from utilities.astro_utils import ZODIAC_SIGNS
+from utilities.dignity_utils import MOTION_STATIONARY_DIRECT, MOTION_STATIONARY_RETROGRADE
+
+
+# Version of the event index file layout, stored in the file and checked when it is loaded
+EVENT_INDEX_VERSION = 1
+
+# The bodies in the index, coded by their index in this tuple. The names are the ones used by
+# calculate_ecliptic_longitude
+EVENT_BODIES = tuple(PLANETS)
+
+# Kinds of events in the index
+EVENT_INGRESS = 0  # The value is the index in ZODIAC_SIGNS of the sign entered
+EVENT_STATION = 1  # The value is MOTION_STATIONARY_RETROGRADE or MOTION_STATIONARY_DIRECT
+EVENT_LUNATION = 2  # The value is LUNATION_NEW_MOON or LUNATION_FULL_MOON. The body is the Moon
+EVENT_KINDS = ('Ingress', 'Station', 'Lunation')
+
+LUNATION_NEW_MOON = 0
+LUNATION_FULL_MOON = 1
+
+# Bodies that have stations. The Sun and Moon are never retrograde, and the mean node always is
+STATION_BODIES = ('Mercury', 'Venus', 'Mars', 'Jupiter', 'Saturn')
+
+# Spacing, in days, of the ephemeris samples in which events are looked for. Every body changes
+# sign, station and lunation at most once per sample interval at this spacing
+EVENT_SAMPLE_DAYS = 1.0
+
+# Precision of the event times, in days (about one second)
+EVENT_TOLERANCE_DAYS = 1e-5
+
+# An event from the index
+Event = namedtuple('Event', ['jd', 'body', 'kind', 'value'])
+
+
+def build_event_index(path, start_year, end_year, workers=None, ephe_path=None):
+    """
+    Precomputes the geocentric sign ingresses of the seven planets and the North Node, the
+    stations of Mercury through Saturn, and the new and full moons over a range of years,
+    and writes them to a compact columnar file. The years are split between worker processes.
+
+    Parameters:
+    - path (str): Path of the index file to write (a NumPy .npz file). '.npz' is added if
+                  the path does not end with it.
+    - start_year (int): The first year in the index.
+    - end_year (int): The last year in the index (included).
+    - workers (int): Number of worker processes. Defaults to the number of CPUs.
+    - ephe_path (str): Optional directory of the Swiss Ephemeris data files.
+
+    Returns:
+    - EventIndex: The index that was written.
+    """
+    # np.savez adds .npz to a path without it, so the index is written and loaded at that path
+    if not path.endswith('.npz'):
+        path += '.npz'
+
+    years = list(range(start_year, end_year + 1))
+    chunks = [(swis_eph.julday(year, 1, 1, 0.0), swis_eph.julday(year + 1, 1, 1, 0.0), ephe_path)
+              for year in years]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        results = list(executor.map(_find_events, chunks))
+
+    columns = [np.concatenate([result[column] for result in results]) for column in range(4)]
+    jd, body, kind, value = columns
+
+    # Sort by body, kind and time, so each kind of event of each body is one contiguous run
+    order = np.lexsort((jd, kind, body))
+    np.savez(path, version=np.int64(EVENT_INDEX_VERSION),
+             start_jd=np.float64(chunks[0][0]), end_jd=np.float64(chunks[-1][1]),
+             jd=jd[order], body=body[order], kind=kind[order], value=value[order])
+
+    return EventIndex(path)
+
+
+class EventIndex:
+    """
+    A queryable index of sign ingresses, stations and lunations, as written by
+    build_event_index. Queries are binary searches over the precomputed event times.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+        - path (str): Path of the index file written by build_event_index.
+        """
+        with np.load(path) as data:
+            if int(data['version']) != EVENT_INDEX_VERSION:
+                raise ValueError(f"Unsupported event index version: {int(data['version'])}")
+            self.start_jd = float(data['start_jd'])
+            self.end_jd = float(data['end_jd'])
+            self.jd = data['jd']
+            self.body = data['body']
+            self.kind = data['kind']
+            self.value = data['value']
+        self._groups = {}
+
+    def next_event(self, body_name, kind, jd, value=None):
+        """
+        Finds the first event of a kind for a body after a given time.
+
+        Parameters:
+        - body_name (str): Name of the planet or North Node (e.g., 'Mars').
+        - kind (int): EVENT_INGRESS, EVENT_STATION or EVENT_LUNATION.
+        - jd (float): The Julian Day after which to search.
+        - value (int): Optional event value to match (e.g., a sign index for ingresses).
+
+        Returns:
+        - Event: The event, or None if there is none before the end of the index.
+        """
+        times = self._group(body_name, kind, value)
+        position = np.searchsorted(times, self._check_range(jd), side='right')
+        if position == len(times):
+            return None
+        return self._event(body_name, kind, value, times, position)
+
+    def previous_event(self, body_name, kind, jd, value=None):
+        """
+        Finds the last event of a kind for a body before a given time.
+
+        Parameters:
+        - body_name (str): Name of the planet or North Node (e.g., 'Mercury').
+        - kind (int): EVENT_INGRESS, EVENT_STATION or EVENT_LUNATION.
+        - jd (float): The Julian Day before which to search.
+        - value (int): Optional event value to match (e.g., a sign index for ingresses).
+
+        Returns:
+        - Event: The event, or None if there is none after the start of the index.
+        """
+        times = self._group(body_name, kind, value)
+        position = np.searchsorted(times, self._check_range(jd), side='left')
+        if position == 0:
+            return None
+        return self._event(body_name, kind, value, times, position - 1)
+
+    def next_ingress(self, body_name, jd, sign=None):
+        """
+        Finds when a body next enters a sign, e.g. when Mars next enters Scorpio.
+
+        Parameters:
+        - body_name (str): Name of the planet or North Node.
+        - jd (float): The Julian Day after which to search.
+        - sign (str or int): Optional sign name, or index as in ZODIAC_SIGNS. Any sign if omitted.
+
+        Returns:
+        - Event: The ingress, or None if there is none before the end of the index.
+        """
+        if isinstance(sign, str):
+            sign = ZODIAC_SIGNS.index(sign)
+        return self.next_event(body_name, EVENT_INGRESS, jd, sign)
+
+    def previous_station(self, body_name, jd, station=None):
+        """
+        Finds when a planet last stationed, e.g. when Mercury last turned retrograde.
+
+        Parameters:
+        - body_name (str): Name of the planet (Mercury to Saturn).
+        - jd (float): The Julian Day before which to search.
+        - station (int): Optional MOTION_STATIONARY_RETROGRADE or MOTION_STATIONARY_DIRECT.
+
+        Returns:
+        - Event: The station, or None if there is none after the start of the index.
+        """
+        return self.previous_event(body_name, EVENT_STATION, jd, station)
+
+    def next_lunation(self, jd, phase=None):
+        """
+        Finds the next new or full moon.
+
+        Parameters:
+        - jd (float): The Julian Day after which to search.
+        - phase (int): Optional LUNATION_NEW_MOON or LUNATION_FULL_MOON.
+
+        Returns:
+        - Event: The lunation, or None if there is none before the end of the index.
+        """
+        return self.next_event('Moon', EVENT_LUNATION, jd, phase)
+
+    def _check_range(self, jd):
+        if not self.start_jd <= jd <= self.end_jd:
+            raise ValueError(
+                f"Julian Day {jd} is outside the event index ({self.start_jd} to {self.end_jd}).")
+        return jd
+
+    def _group(self, body_name, kind, value):
+        # The sorted times of one kind of event of one body, optionally with a given value
+        key = (body_name, kind, value)
+        times = self._groups.get(key)
+        if times is None:
+            mask = (self.body == EVENT_BODIES.index(body_name)) & (self.kind == kind)
+            if value is not None:
+                mask &= self.value == value
+            times = self.jd[mask]
+            self._groups[key] = times
+            self._groups[key + ('value',)] = self.value[mask]
+        return times
+
+    def _event(self, body_name, kind, value, times, position):
+        values = self._groups[(body_name, kind, value, 'value')]
+        return Event(float(times[position]), body_name, kind, int(values[position]))
+
+
+def _find_events(chunk):
+    # Finds the events between two Julian Days. Runs in a worker process
+    start_jd, end_jd, ephe_path = chunk
+    if ephe_path:
+        set_ephemeris_path(ephe_path)
+
+    flag = swis_eph.FLG_SPEED
+    body_ids = [PLANETS[body_name] for body_name in EVENT_BODIES]
+
+    def calculate(time, body_id):
+        return swis_eph.calc_ut(time, body_id, flag)[0]
+
+    times = np.arange(start_jd, end_jd + EVENT_SAMPLE_DAYS / 2, EVENT_SAMPLE_DAYS)
+    times[-1] = min(times[-1], end_jd)
+    samples = np.array([[calculate(time, body_id)[:4] for body_id in body_ids] for time in times.tolist()])
+    longitudes, speeds = samples[..., 0], samples[..., 3]
+
+    events = []
+
+    # Sign ingresses, where the sign changes between samples. The last sample is shared with the
+    # next chunk, so only events before it are kept
+    signs = np.floor(longitudes / 30).astype(int) % 12
+    for sample, body_index in zip(*np.nonzero(signs[:-1] != signs[1:])):
+        old_sign, new_sign = signs[sample, body_index], signs[sample + 1, body_index]
+        # Direct motion crosses into the start of the new sign, retrograde motion into its end
+        boundary = new_sign * 30 if new_sign == (old_sign + 1) % 12 else old_sign * 30
+        body_id = body_ids[body_index]
+
+        def distance(time, body_id=body_id, boundary=boundary):
+            position = calculate(time, body_id)
+            return (position[0] - boundary + 180) % 360 - 180, position[3]
+
+        event_jd = _find_root(distance, times[sample], times[sample + 1])
+        events.append((event_jd, body_index, EVENT_INGRESS, new_sign))
+
+    # Stations, where the speed in longitude changes sign
+    for body_name in STATION_BODIES:
+        body_index = EVENT_BODIES.index(body_name)
+        body_id = body_ids[body_index]
+        body_speeds = speeds[:, body_index]
+        for sample in np.flatnonzero(np.sign(body_speeds[:-1]) != np.sign(body_speeds[1:])):
+            event_jd = _find_root(lambda time, body_id=body_id: (calculate(time, body_id)[3], None),
+                                  times[sample], times[sample + 1])
+            station = (MOTION_STATIONARY_RETROGRADE if body_speeds[sample] > 0
+                       else MOTION_STATIONARY_DIRECT)
+            events.append((event_jd, body_index, EVENT_STATION, station))
+
+    # New and full moons, where the Moon's distance from the Sun, or from opposite it, is zero
+    sun_index, moon_index = EVENT_BODIES.index('Sun'), EVENT_BODIES.index('Moon')
+    for phase, angle in ((LUNATION_NEW_MOON, 0), (LUNATION_FULL_MOON, 180)):
+        elongations = (longitudes[:, moon_index] - longitudes[:, sun_index] - angle + 180) % 360 - 180
+        crossings = ((np.sign(elongations[:-1]) != np.sign(elongations[1:]))
+                     & (np.abs(elongations[:-1]) < 90))
+        for sample in np.flatnonzero(crossings):
+            def elongation(time, angle=angle):
+                sun, moon = calculate(time, swis_eph.SUN), calculate(time, swis_eph.MOON)
+                return (moon[0] - sun[0] - angle + 180) % 360 - 180, moon[3] - sun[3]
+
+            event_jd = _find_root(elongation, times[sample], times[sample + 1])
+            events.append((event_jd, moon_index, EVENT_LUNATION, phase))
+
+    events = [event for event in events if event[0] < end_jd]
+    return (np.array([event[0] for event in events], dtype=np.float64),
+            np.array([event[1] for event in events], dtype=np.int8),
+            np.array([event[2] for event in events], dtype=np.int8),
+            np.array([event[3] for event in events], dtype=np.int8))
+
+
+def _find_root(function, low, high, tolerance=EVENT_TOLERANCE_DAYS):
+    # Finds where a function changes sign between two times. The function returns its value and,
+    # if known, its rate of change, which is used for Newton-Raphson steps. Otherwise, or when a
+    # Newton step leaves the bracket, the Illinois variant of regula falsi is used
+    low_value, _ = function(low)
+    high_value, _ = function(high)
+    side = 0
+
+    for _ in range(100):
+        time = high - high_value * (high - low) / (high_value - low_value)
+        value, rate = function(time)
+        if rate:
+            newton_time = time - value / rate
+            if low < newton_time < high and abs(newton_time - time) < tolerance:
+                return float(newton_time)
+
+        if np.sign(value) == np.sign(low_value):
+            low, low_value = time, value
+            if side == -1:
+                high_value /= 2
+            side = -1
+        else:
+            high, high_value = time, value
+            if side == 1:
+                low_value /= 2
+            side = 1
+
+        if high - low < tolerance or value == 0:
+            return float(time)
+
+    return float(time)
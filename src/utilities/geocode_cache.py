@@ -0,0 +1,260 @@
+import difflib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import namedtuple
+
+
+# Location returned from the cache. It has the same attributes the rest of this software
+# reads from geopy's Location objects
+CachedLocation = namedtuple('CachedLocation', ['address', 'latitude', 'longitude'])
+
+# Where the geocoding cache lives unless a path is given explicitly
+DEFAULT_GEOCODE_CACHE_PATH = os.environ.get(
+    'PTOLEMY_GEOCODE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ptolemy', 'geocode.sqlite'))
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def normalize_place_name(city, country):
+    """
+    Builds the key under which a place is stored in the geocoding cache. Case, accents and
+    repeated whitespace are ignored, so "São Paulo,  Brazil" and "sao paulo, brazil" share a key.
+
+    Parameters:
+    - city (str): The city's name.
+    - country (str): The country's name.
+
+    Returns:
+    - str: The normalized "city, country" key.
+    """
+    return f"{_normalize_text(city)}, {_normalize_text(country)}"
+
+
+def _normalize_text(text):
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def _like_escape(text):
+    # Escape the LIKE wildcards so they match literally
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class GeocodeCache:
+    """
+    A persistent geocoding store backed by SQLite. Places are keyed by their normalized
+    "city, country" name and can be looked up exactly, by prefix, or fuzzily. Exact lookups
+    are also kept in memory, so repeated lookups do not touch the database.
+    """
+
+    def __init__(self, path=DEFAULT_GEOCODE_CACHE_PATH):
+        """
+        Parameters:
+        - path (str): Path of the SQLite database file. Use ':memory:' for a throwaway cache.
+        """
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS places (
+                key TEXT NOT NULL,
+                address TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                source TEXT NOT NULL,
+                UNIQUE (key, latitude, longitude)
+            );
+            CREATE INDEX IF NOT EXISTS places_key ON places (key);
+        ''')
+        self._connection.commit()
+
+    def lookup(self, city, country):
+        """
+        Looks up the locations stored for a city and country.
+
+        Parameters:
+        - city (str): The city's name.
+        - country (str): The country's name.
+
+        Returns:
+        - list: A list of CachedLocation namedtuples, or None if the place is not in the cache.
+        """
+        key = normalize_place_name(city, country)
+        locations = self._memory.get(key)
+        if locations is not None:
+            return list(locations)
+
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT address, latitude, longitude FROM places WHERE key = ? ORDER BY rowid',
+                (key,)).fetchall()
+        if not rows:
+            return None
+
+        locations = [CachedLocation(*row) for row in rows]
+        self._memory[key] = locations
+        return list(locations)
+
+    def lookup_prefix(self, prefix, limit=20):
+        """
+        Finds cached places whose normalized "city, country" key starts with the given text.
+
+        Parameters:
+        - prefix (str): The beginning of a place name (e.g., 'san fr' or 'paris, fr').
+        - limit (int): The maximum number of places to return.
+
+        Returns:
+        - list: A list of (key, CachedLocation) tuples, ordered by key.
+        """
+        pattern = _like_escape(_normalize_text(prefix)) + '%'
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, address, latitude, longitude FROM places "
+                "WHERE key LIKE ? ESCAPE '\\' ORDER BY key LIMIT ?",
+                (pattern, limit)).fetchall()
+        return [(row[0], CachedLocation(*row[1:])) for row in rows]
+
+    def lookup_fuzzy(self, city, country, limit=5, cutoff=0.8):
+        """
+        Finds cached places whose name is close to the given city, within the same country.
+        This catches small spelling differences such as 'Philadelpia' or 'Zurich'/'Zürich'.
+
+        Parameters:
+        - city (str): The city's name, possibly misspelled.
+        - country (str): The country's name.
+        - limit (int): The maximum number of places to return.
+        - cutoff (float): The minimum similarity ratio (0-1) for a place to be returned.
+
+        Returns:
+        - list: A list of (key, CachedLocation) tuples, best match first.
+        """
+        key = normalize_place_name(city, country)
+        country_suffix = ', ' + key.rsplit(', ', 1)[1]
+        pattern = '%' + _like_escape(country_suffix)
+
+        with self._lock:
+            candidates = [row[0] for row in self._connection.execute(
+                "SELECT DISTINCT key FROM places WHERE key LIKE ? ESCAPE '\\'", (pattern,))]
+
+        matches = []
+        for match in difflib.get_close_matches(key, candidates, n=limit, cutoff=cutoff):
+            city_name = match[:-len(country_suffix)]
+            for location in self.lookup(city_name, country):
+                matches.append((match, location))
+        return matches[:limit]
+
+    def store(self, city, country, locations, source='nominatim'):
+        """
+        Writes the locations found for a city and country to the cache.
+
+        Parameters:
+        - city (str): The city's name.
+        - country (str): The country's name.
+        - locations (list): Objects with address, latitude and longitude attributes,
+                            such as geopy Locations or CachedLocation namedtuples.
+        - source (str): Where the locations came from (e.g., 'nominatim' or 'geonames').
+        """
+        key = normalize_place_name(city, country)
+        rows = [(key, location.address, float(location.latitude), float(location.longitude), source)
+                for location in locations]
+
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO places VALUES (?, ?, ?, ?, ?)', rows)
+            self._connection.commit()
+        self._memory.pop(key, None)
+
+    def import_geonames(self, geonames_path, country_info_path=None, min_population=0):
+        """
+        Seeds the cache from a GeoNames gazetteer dump (e.g., cities500.txt or allCountries.txt
+        from download.geonames.org), so that common places resolve without any network access.
+
+        Parameters:
+        - geonames_path (str): Path of the tab-separated GeoNames dump.
+        - country_info_path (str): Optional path of GeoNames' countryInfo.txt, used to key places
+                                   by country name. Without it, places are keyed by the
+                                   two-letter ISO country code (e.g., 'paris, fr').
+        - min_population (int): Places with a smaller population are skipped.
+
+        Returns:
+        - int: The number of cache entries read from the dump (one per name variant).
+        """
+        country_names = {}
+        if country_info_path:
+            with open(country_info_path, encoding='utf-8') as country_info:
+                for line in country_info:
+                    if line.startswith('#') or not line.strip():
+                        continue
+                    columns = line.rstrip('\n').split('\t')
+                    country_names[columns[0]] = columns[4]
+
+        def rows():
+            with open(geonames_path, encoding='utf-8') as geonames:
+                for line in geonames:
+                    columns = line.rstrip('\n').split('\t')
+                    # Only populated places (feature class P) are useful for charts
+                    if len(columns) < 15 or columns[6] != 'P':
+                        continue
+                    if int(columns[14] or 0) < min_population:
+                        continue
+
+                    name, ascii_name, country_code = columns[1], columns[2], columns[8]
+                    country = country_names.get(country_code, country_code)
+                    latitude, longitude = float(columns[4]), float(columns[5])
+                    address = f"{name}, {country}"
+                    for city in {name, ascii_name}:
+                        yield (normalize_place_name(city, country), address, latitude, longitude, 'geonames')
+                        if country != country_code:
+                            yield (normalize_place_name(city, country_code), address, latitude, longitude, 'geonames')
+
+        imported = 0
+        batch = []
+        with self._lock:
+            for row in rows():
+                batch.append(row)
+                if len(batch) >= 10000:
+                    self._connection.executemany(
+                        'INSERT OR IGNORE INTO places VALUES (?, ?, ?, ?, ?)', batch)
+                    imported += len(batch)
+                    batch = []
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO places VALUES (?, ?, ?, ?, ?)', batch)
+            imported += len(batch)
+            self._connection.commit()
+        self._memory.clear()
+
+        return imported
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+def get_default_geocode_cache():
+    """
+    Returns the process-wide geocoding cache, opening it on first use. The database path is
+    taken from the PTOLEMY_GEOCODE_CACHE environment variable, or ~/.cache/ptolemy/geocode.sqlite.
+
+    Returns:
+    - GeocodeCache: The shared geocoding cache.
+    """
+    global _default_cache
+
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = GeocodeCache(DEFAULT_GEOCODE_CACHE_PATH)
+    return _default_cache
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+
+# Whether the chart calculation stages are timed. Off unless PTOLEMY_INSTRUMENTATION is set
+# to 1 or configure_instrumentation turns it on; while off, an instrumented function costs
+# one extra call and flag check
+_enabled = os.environ.get('PTOLEMY_INSTRUMENTATION') == '1'
+
+# Upper bounds in seconds of the latency histogram buckets of every stage, from 10 microseconds
+# (a cached lookup) to 10 seconds (a slow Nominatim query)
+STAGE_LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                         0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages of a chart calculation:
+# - geocode: get_coordinates, cache lookup included
+# - timezone: get_timezone_name
+# - julian_day: calculate_custom_julian_day(s), which include their timezone lookups
+# - ephemeris: planetary positions, from any backend
+# - houses: compute_houses, whether or not the chart is already in its cache
+# - houses_calculated: swisseph.houses, for the charts that are not, so its count against
+#   that of houses gives the cache's hit rate
+# - dignities: score_dignities
+# - format: turning a chart into its JSON result
+STAGES = ('geocode', 'timezone', 'julian_day', 'ephemeris', 'houses', 'houses_calculated',
+          'dignities', 'format')
+
+_NULL_TIMER = nullcontext()
+
+
+class StageMetrics:
+    """
+    Call counts, error counts and latency histograms of the chart calculation stages.
+    """
+
+    def __init__(self, buckets=STAGE_LATENCY_BUCKETS):
+        """
+        Parameters:
+        - buckets (tuple): Ascending upper bounds in seconds of the histogram buckets.
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, seconds, failed=False):
+        """
+        Records one pass through a stage.
+
+        Parameters:
+        - stage (str): The stage's name.
+        - seconds (float): How long it took.
+        - failed (bool): Whether it raised an exception.
+        """
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            stage_metrics = self._stages.get(stage)
+            if stage_metrics is None:
+                # count, errors, total seconds, and the count of each bucket plus one above them
+                stage_metrics = self._stages[stage] = [0, 0, 0.0, [0] * (len(self.buckets) + 1)]
+            stage_metrics[0] += 1
+            stage_metrics[1] += failed
+            stage_metrics[2] += seconds
+            stage_metrics[3][bucket] += 1
+
+    def reset(self):
+        """
+        Forgets everything recorded so far.
+        """
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self):
+        """
+        Returns:
+        - dict: For each stage, the number of passes and errors, the total and mean time, and
+                the cumulative histogram: the number of passes that took at most each bucket's
+                bound, keyed by the bound in seconds ('+Inf' for all of them).
+        """
+        with self._lock:
+            snapshot = {stage: (count, errors, total, list(bucket_counts))
+                        for stage, (count, errors, total, bucket_counts) in self._stages.items()}
+
+        summary = {}
+        for stage, (count, errors, total, bucket_counts) in snapshot.items():
+            histogram = {}
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), bucket_counts):
+                cumulative += bucket_count
+                histogram[str(bound)] = cumulative
+            summary[stage] = {
+                'count': count,
+                'errors': errors,
+                'total_seconds': round(total, 6),
+                'mean_ms': round(total / count * 1000, 4),
+                'histogram': histogram,
+            }
+        return summary
+
+    def to_prometheus(self, prefix='ptolemy'):
+        """
+        Formats the metrics in the Prometheus text exposition format.
+
+        Parameters:
+        - prefix (str): Prefix of the metric names.
+
+        Returns:
+        - str: A ptolemy_stage_seconds histogram and a ptolemy_stage_errors_total counter,
+               labelled by stage.
+        """
+        summary = self.summary()
+        lines = [f"# HELP {prefix}_stage_seconds Time spent in each chart calculation stage.",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, metrics in summary.items():
+            for bound, count in metrics['histogram'].items():
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {metrics["total_seconds"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {metrics["count"]}')
+        lines += [f"# HELP {prefix}_stage_errors_total Chart calculation stage passes that failed.",
+                  f"# TYPE {prefix}_stage_errors_total counter"]
+        for stage, metrics in summary.items():
+            lines.append(f'{prefix}_stage_errors_total{{stage="{stage}"}} {metrics["errors"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# The metrics every instrumented stage of this process records to
+stage_metrics = StageMetrics()
+
+
+def configure_instrumentation(enabled):
+    """
+    Turns the timing of the chart calculation stages on or off for this process.
+
+    Parameters:
+    - enabled (bool): Whether stages are timed.
+    """
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def instrumentation_enabled():
+    """
+    Returns:
+    - bool: Whether the chart calculation stages are being timed.
+    """
+    return _enabled
+
+
+def instrumented(stage):
+    """
+    Decorates a function so each call is recorded in stage_metrics as a pass through a stage,
+    while instrumentation is enabled.
+
+    Parameters:
+    - stage (str): The stage's name, one of STAGES.
+    """
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                stage_metrics.record(stage, time.perf_counter() - start, failed)
+        return wrapper
+    return decorate
+
+
+def stage_timer(stage):
+    """
+    Times a block of code as a pass through a stage, while instrumentation is enabled:
+
+        with stage_timer('format'):
+            ...
+
+    Parameters:
+    - stage (str): The stage's name, one of STAGES.
+
+    Returns:
+    - A context manager.
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _timed(stage)
+
+
+@contextmanager
+def _timed(stage):
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        stage_metrics.record(stage, time.perf_counter() - start, failed)
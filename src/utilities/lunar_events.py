@@ -0,0 +1,165 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from utilities.astro_calculations import calculate_ecliptic_positions
+from utilities.astro_utils import ZODIAC_SIGNS
+from utilities.aspect_utils import PTOLEMAIC_ASPECTS
+
+
+# The planets the Moon can aspect, as used in horary astrology
+MOON_ASPECT_PLANETS = ('Sun', 'Mercury', 'Venus', 'Mars', 'Jupiter', 'Saturn')
+
+# Cached Moon ephemeris segments start at the beginning of a day (in Julian Day terms) and span
+# enough days to always contain the Moon's next sign change, sampled every MOON_SEGMENT_STEP_DAYS
+MOON_SEGMENT_DAYS = 4
+MOON_SEGMENT_STEP_DAYS = 0.125
+
+# Number of (day, location) segments kept in memory
+MOON_SEGMENT_CACHE_SIZE = 256
+
+# An aspect the Moon perfects, as returned in MoonEvents
+MoonAspect = namedtuple('MoonAspect', ['planet', 'aspect', 'jd'])
+
+# Result of calculate_moon_events
+MoonEvents = namedtuple('MoonEvents', ['aspects', 'sign_exit_jd', 'next_sign',
+                                       'void_of_course', 'void_of_course_interval'])
+
+
+def calculate_moon_events(jd, location_latitude, location_longitude):
+    """
+    Finds the aspects the Moon will perfect to the other six traditional planets before it
+    leaves its current sign, and whether it is void of course: making no further Ptolemaic
+    aspect before changing sign. Positions come from a cached, finely sampled ephemeris segment
+    of the Moon and planets, so further charts for the same day and place need no new
+    ephemeris calls; exact times are solved on the segment's cubic Hermite interpolation.
+
+    Parameters:
+    - jd (float): The Julian Day of the chart.
+    - location_latitude (float): Geographic latitude of the observation point in degrees.
+    - location_longitude (float): Geographic longitude of the observation point in degrees.
+
+    Returns:
+    - MoonEvents: A namedtuple with
+        - aspects: MoonAspect namedtuples (planet, aspect name, Julian Day), in time order.
+        - sign_exit_jd: The Julian Day at which the Moon enters the next sign.
+        - next_sign: The name of the next sign.
+        - void_of_course: True if the Moon perfects no aspect before leaving its sign.
+        - void_of_course_interval: (start, end) Julian Days of the Moon's void of course period
+          in its current sign: from the chart time if it is void now, otherwise from its last
+          aspect in the sign, until the sign change.
+    """
+    segment_start = np.floor(jd - 0.5) + 0.5
+    times, longitudes, speeds = _moon_ephemeris_segment(
+        segment_start, float(location_latitude), float(location_longitude))
+
+    # Longitudes are unwrapped, so the Moon's next sign starts at the next multiple of 30
+    moon_longitude, _ = _interpolate(times, longitudes[:, :1], speeds[:, :1], jd)
+    sign_boundary = (np.floor(moon_longitude[0] / 30) + 1) * 30
+    sign_exit_jd = _solve(times, longitudes[:, 0] - sign_boundary, speeds[:, 0], jd, times[-1])
+    if sign_exit_jd is None:
+        raise ValueError("The Moon's sign change is not within the cached ephemeris segment.")
+
+    # Distance of the Moon from each exact aspect to each planet, wrapped to [-180, 180)
+    targets = np.array(sorted({angle % 360 for _, angle in PTOLEMAIC_ASPECTS}
+                              | {-angle % 360 for _, angle in PTOLEMAIC_ASPECTS}), dtype=np.float64)
+    distances = ((longitudes[:, :1, np.newaxis] - longitudes[:, 1:, np.newaxis]
+                  - targets + 180) % 360 - 180)
+    rates = np.broadcast_to((speeds[:, :1] - speeds[:, 1:])[..., np.newaxis], distances.shape)
+
+    # Only the samples that cover the time from the chart to the sign change
+    first = max(np.searchsorted(times, jd, side='right') - 1, 0)
+    last = np.searchsorted(times, sign_exit_jd, side='left')
+    window = slice(first, last + 1)
+    window_distances = distances[window]
+
+    # A sign change in the distance brackets a perfection. Distances near 180 only flip sign
+    # because of the wrap-around
+    crossings = ((np.sign(window_distances[:-1]) != np.sign(window_distances[1:]))
+                 & (np.abs(window_distances[:-1]) < 90) & (np.abs(window_distances[1:]) < 90))
+
+    aspects = []
+    for sample, planet_index, target_index in zip(*np.nonzero(crossings)):
+        sample += first
+        aspect_jd = _solve(times, distances[:, planet_index, target_index],
+                           rates[:, planet_index, target_index], times[sample], times[sample + 1])
+        if aspect_jd is not None and jd < aspect_jd <= sign_exit_jd:
+            angle = min(targets[target_index], 360 - targets[target_index])
+            aspect_name = next(name for name, aspect_angle in PTOLEMAIC_ASPECTS if aspect_angle == angle)
+            aspects.append(MoonAspect(MOON_ASPECT_PLANETS[planet_index], aspect_name, aspect_jd))
+    aspects.sort(key=lambda aspect: aspect.jd)
+
+    void_of_course = not aspects
+    void_start = jd if void_of_course else aspects[-1].jd
+
+    return MoonEvents(
+        aspects=aspects,
+        sign_exit_jd=sign_exit_jd,
+        next_sign=ZODIAC_SIGNS[int(sign_boundary // 30) % 12],
+        void_of_course=void_of_course,
+        void_of_course_interval=(void_start, sign_exit_jd),
+    )
+
+
+@lru_cache(maxsize=MOON_SEGMENT_CACHE_SIZE)
+def _moon_ephemeris_segment(segment_start, location_latitude, location_longitude):
+    # Samples of the Moon (column 0) and the planets it aspects, with unwrapped longitudes
+    times = segment_start + np.arange(
+        0, MOON_SEGMENT_DAYS + MOON_SEGMENT_STEP_DAYS / 2, MOON_SEGMENT_STEP_DAYS)
+    positions = calculate_ecliptic_positions(
+        times, ('Moon',) + MOON_ASPECT_PLANETS, location_latitude, location_longitude)
+
+    longitudes = np.unwrap(positions[..., 0], period=360, axis=0)
+    speeds = positions[..., 3]
+    for array in (times, longitudes, speeds):
+        array.setflags(write=False)
+    return times, longitudes, speeds
+
+
+def _interpolate(times, values, rates, time):
+    # Cubic Hermite interpolation of sampled values and their rates of change at a single time
+    step = times[1] - times[0]
+    index = min(max(int((time - times[0]) // step), 0), len(times) - 2)
+    u = (time - times[index]) / step
+
+    h00 = 2 * u ** 3 - 3 * u ** 2 + 1
+    h10 = u ** 3 - 2 * u ** 2 + u
+    h01 = -2 * u ** 3 + 3 * u ** 2
+    h11 = u ** 3 - u ** 2
+    value = (h00 * values[index] + h10 * step * rates[index]
+             + h01 * values[index + 1] + h11 * step * rates[index + 1])
+
+    d00 = (6 * u ** 2 - 6 * u) / step
+    d10 = 3 * u ** 2 - 4 * u + 1
+    d01 = (-6 * u ** 2 + 6 * u) / step
+    d11 = 3 * u ** 2 - 2 * u
+    rate = (d00 * values[index] + d10 * rates[index]
+            + d01 * values[index + 1] + d11 * rates[index + 1])
+
+    return value, rate
+
+
+def _solve(times, values, rates, low, high, tolerance=1e-7):
+    # Finds where the interpolated values cross zero between two times, with Newton-Raphson
+    # iterations safeguarded by bisection. Returns None if they do not cross zero
+    low_value, _ = _interpolate(times, values, rates, low)
+    high_value, _ = _interpolate(times, values, rates, high)
+    if np.sign(low_value) == np.sign(high_value):
+        return None
+
+    time = (low + high) / 2
+    for _ in range(50):
+        value, rate = _interpolate(times, values, rates, time)
+        if np.sign(value) == np.sign(low_value):
+            low = time
+        else:
+            high = time
+
+        next_time = time - value / rate if rate else (low + high) / 2
+        if not low <= next_time <= high:
+            next_time = (low + high) / 2
+        if abs(next_time - time) < tolerance:
+            return float(next_time)
+        time = next_time
+
+    return float(time)
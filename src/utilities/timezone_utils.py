@@ -0,0 +1,194 @@
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+from utilities.instrumentation import instrumented
+
+
+# Number of decimal places latitudes and longitudes are rounded to before a timezone lookup.
+# 4 decimal places is roughly 11 meters, far below the precision of the timezone borders
+TIMEZONE_CACHE_PRECISION = 4
+
+# Number of distinct rounded locations whose timezone is remembered
+TIMEZONE_CACHE_SIZE = 65536
+
+# Flags describing how a local time was converted to UTC
+LOCAL_TIME_OK = 0
+LOCAL_TIME_AMBIGUOUS = 1  # The local time happened twice, when the clocks went back
+LOCAL_TIME_NONEXISTENT = 2  # The local time never happened, when the clocks went forward
+LOCAL_TIME_UNKNOWN_TIMEZONE = 3  # No timezone could be found for the location
+
+_timezone_finder = None
+_timezone_finder_in_memory = False
+# TimezoneFinder reads its polygon data lazily and is not safe to share between threads
+_timezone_finder_lock = threading.Lock()
+
+
+def configure_timezone_lookup(in_memory=None, precision=None):
+    """
+    Changes how timezones are looked up. The shared TimezoneFinder is recreated on its next
+    use and the cached lookups are cleared.
+
+    Parameters:
+    - in_memory (bool): If True, TimezoneFinder loads all of its polygon data into memory up
+                        front. This costs memory and startup time but makes every lookup
+                        faster, which suits long-running servers.
+    - precision (int): Number of decimal places locations are rounded to before a lookup.
+    """
+    global _timezone_finder, _timezone_finder_in_memory, TIMEZONE_CACHE_PRECISION
+
+    with _timezone_finder_lock:
+        if in_memory is not None:
+            _timezone_finder_in_memory = in_memory
+            _timezone_finder = None
+        if precision is not None:
+            TIMEZONE_CACHE_PRECISION = precision
+        _timezone_at.cache_clear()
+
+
+def get_timezone_cache_precision():
+    """
+    Returns:
+    - int: The number of decimal places locations are rounded to before a timezone lookup,
+           as set by configure_timezone_lookup. Read it through this function rather than
+           importing TIMEZONE_CACHE_PRECISION, which would keep the value at import time.
+    """
+    return TIMEZONE_CACHE_PRECISION
+
+
+def get_timezone_finder():
+    """
+    Returns the TimezoneFinder shared by the whole process, creating it on first use.
+
+    Returns:
+    - TimezoneFinder: The shared TimezoneFinder instance.
+    """
+    global _timezone_finder
+
+    if _timezone_finder is None:
+        with _timezone_finder_lock:
+            if _timezone_finder is None:
+                # timezonefinder is slow to import, and charts given as Julian Days never need it
+                from timezonefinder import TimezoneFinder
+                _timezone_finder = TimezoneFinder(in_memory=_timezone_finder_in_memory)
+    return _timezone_finder
+
+
+@instrumented('timezone')
+def get_timezone_name(lat, lon):
+    """
+    Finds the name of the timezone at a given location. Results are cached per location,
+    rounded to TIMEZONE_CACHE_PRECISION decimal places.
+
+    Parameters:
+    - lat (float): The latitude of the location.
+    - lon (float): The longitude of the location.
+
+    Returns:
+    - str: The IANA timezone name (e.g., 'Europe/London'), or None if none was found.
+    """
+    return _timezone_at(round(float(lat), TIMEZONE_CACHE_PRECISION),
+                        round(float(lon), TIMEZONE_CACHE_PRECISION))
+
+
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def _timezone_at(lat, lon):
+    timezone_finder = get_timezone_finder()
+    with _timezone_finder_lock:
+        return timezone_finder.timezone_at(lat=lat, lng=lon)
+
+
+@lru_cache(maxsize=None)
+def get_pytz_timezone(tz_str):
+    """
+    Returns the pytz timezone object for a timezone name, reusing the same object on every call.
+
+    Parameters:
+    - tz_str (str): The IANA timezone name (e.g., 'Europe/London').
+
+    Returns:
+    - pytz.tzinfo.BaseTzInfo: The timezone object.
+    """
+    import pytz
+
+    return pytz.timezone(tz_str)
+
+
+@lru_cache(maxsize=None)
+def get_utc_offset_table(tz_str):
+    """
+    Builds the table of UTC offset changes of a timezone as NumPy arrays, so that many local
+    times can be converted to UTC at once. The table comes from pytz's transition data.
+
+    Parameters:
+    - tz_str (str): The IANA timezone name (e.g., 'Europe/London').
+
+    Returns:
+    - tuple: Three arrays of equal length: the UTC instants (seconds since 1970-01-01) at which
+             each offset starts, the UTC offsets in seconds, and whether each offset is
+             daylight saving time.
+    """
+    timezone_location = get_pytz_timezone(tz_str)
+
+    transition_times = getattr(timezone_location, '_utc_transition_times', None)
+    if not transition_times:
+        # Fixed offset timezones (e.g., 'UTC' or 'Etc/GMT+5') have no transitions
+        offset = timezone_location.utcoffset(datetime(2000, 1, 1))
+        return (np.array([np.iinfo(np.int64).min], dtype=np.int64),
+                np.array([int(offset.total_seconds())], dtype=np.int64),
+                np.array([False]))
+
+    utc_starts = np.array(transition_times, dtype='datetime64[s]').astype(np.int64)
+    # pytz starts every table at datetime(1, 1, 1); let the first offset apply to all earlier times
+    utc_starts[0] = np.iinfo(np.int64).min
+    offsets = np.array([int(info[0].total_seconds())
+                       for info in timezone_location._transition_info], dtype=np.int64)
+    is_dst = np.array([bool(info[1]) for info in timezone_location._transition_info])
+    return utc_starts, offsets, is_dst
+
+
+def localize_local_times(local_seconds, tz_str):
+    """
+    Converts many naive local times in one timezone to UTC at once, the same way pytz's
+    localize() does by default: ambiguous times (when clocks go back) resolve to standard
+    time, and nonexistent times (when clocks go forward) use the offset in force before the
+    clocks changed.
+
+    Parameters:
+    - local_seconds (numpy.ndarray): Local wall clock times as int64 seconds since 1970-01-01.
+    - tz_str (str): The IANA timezone name of the local times.
+
+    Returns:
+    - tuple: An int64 array of UTC times in seconds since 1970-01-01, and an int8 array of
+             LOCAL_TIME_* flags marking the ambiguous and nonexistent local times.
+    """
+    utc_starts, offsets, is_dst = get_utc_offset_table(tz_str)
+
+    # Each offset is in force over an interval of local wall clock time
+    local_starts = utc_starts + offsets
+    local_starts[0] = np.iinfo(np.int64).min
+    local_ends = np.empty_like(local_starts)
+    local_ends[:-1] = utc_starts[1:] + offsets[:-1]
+    local_ends[-1] = np.iinfo(np.int64).max
+
+    # The last offset whose interval starts at or before each local time
+    index = np.searchsorted(local_starts, local_seconds, side='right') - 1
+    previous = np.maximum(index - 1, 0)
+
+    # A local time inside both this interval and the previous one happened twice
+    in_interval = local_seconds < local_ends[index]
+    ambiguous = in_interval & (index > 0) & (local_seconds < local_ends[previous])
+    # A local time past the end of its interval falls in a gap and never happened
+    nonexistent = ~in_interval
+
+    # Ambiguous times prefer standard time, then the later of the two instants
+    use_previous = ambiguous & ~is_dst[previous] & is_dst[index]
+    chosen = np.where(use_previous, previous, index)
+
+    utc_seconds = local_seconds - offsets[chosen]
+
+    flags = np.full(len(local_seconds), LOCAL_TIME_OK, dtype=np.int8)
+    flags[ambiguous] = LOCAL_TIME_AMBIGUOUS
+    flags[nonexistent] = LOCAL_TIME_NONEXISTENT
+    return utc_seconds, flags